@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+from config import logger
+
+# Provider used for suggestions and movie details: "openai" or "anthropic"
+AI_PROVIDER = os.getenv("AI_PROVIDER", "openai")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Connection pool of the HTTP client shared by each async client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+_providers: Dict[str, Tuple[str, Callable[[bool], Any]]] = {}  # name -> (API key variable, client factory)
+_clients: Dict[Tuple[str, bool], Any] = {}
+_clients_lock = threading.Lock()
+
+def register_provider(name: str, api_key_env: str):
+    """Register a client factory for a provider under name.
+
+    The factory is called with whether an async client is wanted and must
+    import the provider's SDK itself, so only the SDKs of providers that are
+    actually used get imported.
+    """
+    def register(factory: Callable[[bool], Any]) -> Callable[[bool], Any]:
+        _providers[name] = (api_key_env, factory)
+        return factory
+    return register
+
+def require_provider(name: str = AI_PROVIDER) -> None:
+    """Raise ValueError unless name is a registered provider with its API key set; doesn't import its SDK."""
+    if name not in _providers:
+        raise ValueError(f"AI_PROVIDER must be one of: {', '.join(_providers)}")
+    api_key_env = _providers[name][0]
+    if not os.getenv(api_key_env):
+        raise ValueError(f"{api_key_env} environment variable is required when using {name}")
+
+def get_client(name: str = AI_PROVIDER, asynchronous: bool = False) -> Any:
+    """Return the provider's shared sync or async client, creating it on first use."""
+    key = (name, asynchronous)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                require_provider(name)
+                start = time.perf_counter()
+                client = _clients[key] = _providers[name][1](asynchronous)
+                logger.info(f"Created {'async ' if asynchronous else ''}{name} client in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return client
+
+def _async_http_client():
+    """Return a connection-pooled HTTP client, so a worker can keep hundreds
+    of provider calls in flight over reused connections."""
+    import httpx
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        timeout=LLM_TIMEOUT
+    )
+
+@register_provider("openai", "OPENAI_API_KEY")
+def _openai_client(asynchronous: bool):
+    import openai
+    if asynchronous:
+        return openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, http_client=_async_http_client())
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL)
+
+@register_provider("anthropic", "ANTHROPIC_API_KEY")
+def _anthropic_client(asynchronous: bool):
+    import anthropic
+    if asynchronous:
+        return anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=_async_http_client())
+    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
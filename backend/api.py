@@ -1,14 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime
-from threading import Thread
-from typing import Dict
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
-from config import logger, MOVIE_GENRES
+from config import logger, log_sampled, MOVIE_GENRES
 from models import Movie, MovieUpdate, PreferencesUpdate
-from movie_storage import load_movies, save_movies, get_movie_poster
-from movie_generator import generate_single_suggestion
-from movie_analysis import analyze_keywords
+from movie_storage import load_movies, movie_store, VersionConflictError, MOVIE_LISTS
+from movie_posters import find_movie_poster, get_poster_cache, get_poster_variant, poster_response, safe_filename, POSTER_MISSING_TTL
+from movie_generator import generate_single_suggestion, agenerate_single_suggestion, astream_suggestion, replay_suggestion
+from movie_analysis import KeywordStats
+from movie_cache import get_details_cache
+from movie_stream import get_stream_stats
+from movie_metrics import observe, render as render_metrics
+import movie_queue
+from movie_queue import SuggestionPrefetcher, add_to_queue, remove_from_queue, discard_from_queue, clear_queue, get_queue_stats
 
 app = FastAPI()
 
@@ -21,13 +32,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _generate_queued_suggestion(data: Dict, title_index, on_leftover) -> Dict:
+    return generate_single_suggestion(data, reject_duplicates=True, title_index=title_index, keyword_stats=movie_store.keyword_stats, on_leftover=on_leftover)
+
+# Keeps a few suggestions ready so /movies/suggest doesn't wait on the AI provider.
+# Started on the first suggestion request, so idle workers make no AI calls.
+prefetcher = SuggestionPrefetcher(
+    _generate_queued_suggestion,
+    lambda: (load_movies(), movie_store.title_index)
+)
+
+@app.on_event("shutdown")
+def stop_prefetcher():
+    prefetcher.stop()
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Time each request by route; streamed responses are timed until their headers are sent."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")  # Set by the router; the template keeps the label values few
+        observe("movie_tracker_http_request_duration_seconds", time.perf_counter() - start,
+                method=request.method, route=getattr(route, "path", "unmatched"), status=status)
+
+@app.exception_handler(VersionConflictError)
+def version_conflict_handler(request: Request, exc: VersionConflictError):
+    logger.warning(f"Rejected change to {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=409,
+        content={"detail": str(exc), "version": exc.actual}
+    )
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Parse the data version a client based its change on from an If-Match header."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a movie data version")
+
 @app.get("/")
 def read_root():
     return {"status": "Movie Tracker API is running"}
 
+# Filtered and sorted lists for recent /movies queries, so paging through
+# one doesn't filter and sort the library again for every page
+MOVIE_QUERY_CACHE_SIZE = 32
+_movie_queries: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+_movie_queries_lock = Lock()
+
+def _sort_key(sort: str):
+    if sort == "title":
+        return lambda movie: movie["title"].casefold()
+    if sort == "date":
+        return lambda movie: movie.get("added_date") or ""
+    return lambda movie: movie.get("score") or 0
+
+def _matching_movies(data: Dict, list_name: str, q: str, genre: str, sort: Optional[str], order: str) -> List[Dict]:
+    """Return the movies of a list matching q and genre, in the requested order.
+
+    q matches the title, description or a keyword, case-insensitively, and
+    genre must be one of the keywords, as in the frontend's search and filter.
+    """
+    key = (id(data), data.get("version", 0), list_name, q, genre, sort, order)
+    with _movie_queries_lock:
+        if key in _movie_queries:
+            _movie_queries.move_to_end(key)
+            return _movie_queries[key]
+    query = q.casefold()
+    movies = [
+        movie for movie in data[list_name]
+        if (not query
+            or query in movie["title"].casefold()
+            or query in (movie.get("description") or "").casefold()
+            or any(query in keyword.casefold() for keyword in movie.get("keywords") or []))
+        and (not genre or genre in (movie.get("keywords") or []))
+    ]
+    if sort:
+        movies.sort(key=_sort_key(sort), reverse=order == "desc")
+    with _movie_queries_lock:
+        _movie_queries[key] = movies
+        while len(_movie_queries) > MOVIE_QUERY_CACHE_SIZE:
+            _movie_queries.popitem(last=False)
+    return movies
+
 @app.get("/movies")
-def get_movies():
-    return load_movies()
+def get_movies(
+    response: Response,
+    list_name: Optional[str] = Query(None, alias="list"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=0),
+    q: str = "",
+    genre: str = "",
+    sort: Optional[str] = Query(None, pattern="^(title|date|score)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get the movie lists and preferences.
+
+    Without parameters the whole library is returned. Otherwise each list
+    (or only `list`) is filtered by `q` and `genre`, ordered by `sort` and
+    `order`, cut to `offset`/`limit` and reduced to the comma-separated
+    `fields` (the title is always included); `counts` holds each list's
+    number of matches. Use /movies/lookup for a single movie's details.
+    """
+    data = load_movies()
+    etag = f'"{data.get("version", 0)}"'
+    if if_none_match and etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    if list_name is None and not (offset or limit is not None or q or genre or sort or fields):
+        return data
+    if list_name is not None and list_name not in MOVIE_LISTS:
+        raise HTTPException(status_code=400, detail="Invalid list name")
+
+    wanted = {"title", *(f.strip() for f in fields.split(","))} if fields else None
+    result = {"preferences": data["preferences"], "version": data.get("version", 0), "counts": {}}
+    for name in [list_name] if list_name else MOVIE_LISTS:
+        movies = _matching_movies(data, name, q, genre, sort, order)
+        page = movies[offset:offset + limit if limit is not None else None]
+        result["counts"][name] = len(movies)
+        result[name] = page if wanted is None else [{k: v for k, v in movie.items() if k in wanted} for movie in page]
+    return result
+
+@app.get("/movies/lookup")
+def lookup_movie(title: str):
+    """Get everything stored about one movie in the user's lists, with the list holding it."""
+    found = movie_store.find_movie(title)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    list_name, movie = found
+    return {**movie, "is_in_list": True, "list_name": list_name}
 
 @app.get("/genres")
 def get_genres():
@@ -35,10 +177,9 @@ def get_genres():
     return {"genres": MOVIE_GENRES}
 
 @app.put("/preferences")
-def update_preferences(preferences: PreferencesUpdate):
+def update_preferences(preferences: PreferencesUpdate, if_match: Optional[str] = Header(None)):
     """Update genre and keyword preferences."""
     logger.info(f"Updating preferences: {preferences}")
-    data = load_movies()
     
     # Validate genres
     invalid_genres = [g for g in preferences.genres if g not in MOVIE_GENRES]
@@ -46,38 +187,122 @@ def update_preferences(preferences: PreferencesUpdate):
         raise HTTPException(status_code=400, detail=f"Invalid genres: {invalid_genres}")
     
     # Update preferences
-    data["preferences"]["genres"] = preferences.genres
-    data["preferences"]["keywords"] = preferences.keywords
-    data["preferences"]["comments"] = preferences.comments
-    
-    # Save changes
-    save_movies(data)
+    with movie_store.transaction(parse_if_match(if_match)) as tx:
+        tx.set_preferences({
+            "genres": preferences.genres,
+            "keywords": preferences.keywords,
+            "comments": preferences.comments
+        })
     
+    # Queued suggestions were based on the old preferences
+    clear_queue()
     
     return {"status": "success", "message": "Preferences updated successfully"}
 
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _event_stream(events, on_done: Optional[Callable[[Dict], Awaitable[None]]] = None) -> StreamingResponse:
+    """Send astream_suggestion's (event, payload) pairs as Server-Sent Events.
+
+    on_done is awaited with the final suggestion; a failure ends the stream
+    with an "error" event.
+    """
+    async def body():
+        try:
+            async for event, payload in events:
+                if event == "done" and on_done is not None:
+                    await on_done(payload)
+                yield _sse(event, payload)
+        except Exception as e:
+            logger.error(f"Error streaming suggestion: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/movies/suggest")
-def suggest_movie():
-    """Get an AI-powered movie suggestion."""
+async def suggest_movie(stream: bool = False):
+    """Get an AI-powered movie suggestion.
+
+    With stream=true, the suggestion is sent as Server-Sent Events: a
+    "field" event for each field as soon as the AI provider has generated
+    it, "retry" when a candidate already partly sent is dropped, then
+    "done" with the whole suggestion (or "error").
+    """
     logger.info("Received suggestion request")
-    data = load_movies()
+    prefetcher.start()
+    data = await asyncio.to_thread(load_movies)
+    suggestion = remove_from_queue(movie_store.title_index, data)
+    if suggestion:
+        logger.info(f"Returning queued suggestion: {suggestion['title']}")
+        return _event_stream(replay_suggestion(suggestion)) if stream else suggestion
+    
+    if stream:
+        return _event_stream(astream_suggestion(
+            data,
+            reject_duplicates=True,
+            title_index=movie_store.title_index,
+            keyword_stats=movie_store.keyword_stats
+        ))
+    generation = movie_queue.queue_generation
     try:
-        suggestion = generate_single_suggestion(data, reject_duplicates=True)
+        # Other valid candidates from the same round go to the queue for the next request
+        suggestion = await agenerate_single_suggestion(
+            data,
+            reject_duplicates=True,
+            title_index=movie_store.title_index,
+            keyword_stats=movie_store.keyword_stats,
+            on_leftover=lambda s: add_to_queue(s, data, movie_store.title_index, generation)
+        )
         logger.info(f"Returning suggestion: {suggestion['title']}")
         return suggestion
     except Exception as e:
         logger.error(f"Error in suggest_movie: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/movies/suggest/stats")
+def get_suggestion_queue_stats():
+    """Get suggestion queue hit rate and refill latency, and what abandoning duplicates mid-stream saved."""
+    return {**get_queue_stats(), "streaming": get_stream_stats()}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Get hit/miss counters of this worker's caches."""
+    return {"details": get_details_cache().get_stats()}
+
+@app.get("/metrics")
+def get_metrics():
+    """Get latency histograms and counters summed over all workers, in the Prometheus text format."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/movies/details/{title}")
-def get_movie_details(title: str):
-    """Get AI-generated details for a specific movie."""
+async def get_movie_details(title: str, stream: bool = False):
+    """Get AI-generated details for a specific movie.
+
+    With stream=true, the details are sent as Server-Sent Events like
+    /movies/suggest?stream=true.
+    """
     logger.info(f"Getting details for movie: {title}")
-    data = load_movies()
+    if stream:
+        cached = await get_details_cache().aget(title)
+        if cached is not None:
+            return _event_stream(replay_suggestion(cached))
+        return _event_stream(
+            astream_suggestion(load_movies(), title=title),
+            on_done=lambda details: get_details_cache().aput(title, details)
+        )
     try:
-        # Use the same suggestion generation but with a specific title
-        suggestion = generate_single_suggestion(data, title=title, reject_duplicates=False)  # No need to reject duplicates when getting details
-        logger.info(f"Generated details for: {suggestion['title']}")
+        # Use the same suggestion generation but with a specific title. The prompt
+        # only depends on the title, so results are cached.
+        suggestion = await get_details_cache().get_or_create(
+            title,
+            lambda: agenerate_single_suggestion(load_movies(), title=title, reject_duplicates=False)  # No need to reject duplicates when getting details
+        )
+        logger.info(f"Returning details for: {suggestion['title']}")
         return suggestion
     except Exception as e:
         logger.error(f"Error getting movie details: {str(e)}", exc_info=True)
@@ -90,50 +315,107 @@ from pydantic import BaseModel
 class RelatedMovieRequest(BaseModel):
     previous_suggestions: List[str]
 
+async def _with_list_info(suggestion: Dict) -> Dict:
+    """Add whether the suggested movie is in one of the user's lists."""
+    found = await asyncio.to_thread(movie_store.find_movie, suggestion["title"])
+    return {
+        **suggestion,
+        "is_in_list": found is not None,
+        "list_name": found[0] if found else None
+    }
+
+def _movies_and_keyword_stats() -> Tuple[Dict, KeywordStats]:
+    """Return the movie data and its keyword statistics; both may read the YAML file, so call in a worker thread."""
+    return load_movies(), movie_store.keyword_stats
+
+# Rounds in a row that may produce no new related movie before a stream gives up
+RELATED_STALL_ROUNDS = 3
+
+async def _stream_related_movies(title: str, previous_suggestions: List[str], count: int):
+    """Yield up to count related movies as NDJSON lines, cached ones first.
+
+    The missing ones are asked for in a single multi-movie request per round;
+    extra movies from a round are cached for later requests.
+    """
+    from movie_cache import aget_unused_recommendations, aadd_recommendation
+    seen = {title, *previous_suggestions}
+    sent = 0
+    for suggestion in (await aget_unused_recommendations(title, previous_suggestions))[:count]:
+        seen.add(suggestion["title"])
+        sent += 1
+        yield json.dumps(await _with_list_info(suggestion)) + "\n"
+    logger.info(f"Streamed {sent} cached related movies for {title}")
+
+    stalled = 0
+    while sent < count and stalled < RELATED_STALL_ROUNDS:
+        leftovers = []
+        try:
+            data, keyword_stats = await asyncio.to_thread(_movies_and_keyword_stats)
+            first = await agenerate_single_suggestion(
+                data=data,
+                title=title,
+                previous_suggestions=sorted(seen),
+                reject_duplicates=False,  # Allow duplicates for related movies
+                keyword_stats=keyword_stats,
+                batch_size=count - sent,
+                on_leftover=leftovers.append
+            )
+        except Exception as e:
+            logger.error(f"Error streaming related movies: {str(e)}", exc_info=True)
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        stalled += 1
+        for suggestion in [first, *leftovers]:
+            if suggestion["title"] in seen:
+                continue
+            seen.add(suggestion["title"])
+            await aadd_recommendation(title, suggestion)
+            if sent < count:
+                stalled = 0
+                sent += 1
+                yield json.dumps(await _with_list_info(suggestion)) + "\n"
+
 @app.post("/movies/related/{title}")
-def get_related_movie(title: str, request: RelatedMovieRequest):
-    """Get a single AI-generated related movie suggestion."""
+async def get_related_movie(title: str, request: RelatedMovieRequest, count: Optional[int] = Query(None, ge=1, le=50)):
+    """Get a single AI-generated related movie suggestion.
+
+    With count, streams up to count related movies as newline-delimited
+    JSON instead, each as soon as it is available.
+    """
     logger.info(f"Getting related movie for: {title}")
     logger.info(f"Previous suggestions: {request.previous_suggestions}")
-    data = load_movies()
+    if count is not None:
+        return StreamingResponse(
+            _stream_related_movies(title, request.previous_suggestions, count),
+            media_type="application/x-ndjson"
+        )
+    data, keyword_stats = await asyncio.to_thread(_movies_and_keyword_stats)
     
     try:
         # Check cache first
-        from movie_cache import get_unused_recommendations, add_recommendation
-        unused = get_unused_recommendations(title, request.previous_suggestions)
+        from movie_cache import aget_unused_recommendations, add_recommendation, aadd_recommendation
+        unused = await aget_unused_recommendations(title, request.previous_suggestions)
         
         if unused:
             suggestion = unused[0]
             logger.info(f"Using cached suggestion: {suggestion['title']}")
         else:
             # Generate new suggestion
-            suggestion = generate_single_suggestion(
+            suggestion = await agenerate_single_suggestion(
                 data=data,
                 title=title,
                 previous_suggestions=request.previous_suggestions,
-                reject_duplicates=False  # Allow duplicates for related movies
+                reject_duplicates=False,  # Allow duplicates for related movies
+                keyword_stats=keyword_stats,
+                # Served to later related requests; written in a worker thread, without waiting
+                on_leftover=lambda s: asyncio.get_running_loop().run_in_executor(None, add_recommendation, title, s)
             )
             # Add to cache
-            add_recommendation(title, suggestion)
+            await aadd_recommendation(title, suggestion)
             logger.info(f"Generated new suggestion: {suggestion['title']}")
         
-        # Check if movie is in any list
-        is_in_list = False
-        list_name = None
-        for lst in ["watched", "want_to_watch", "not_interested", "undecided"]:
-            if any(m["title"] == suggestion["title"] for m in data[lst]):
-                is_in_list = True
-                list_name = lst
-                break
-        
         # Add list info to response
-        response = {
-            **suggestion,
-            "is_in_list": is_in_list,
-            "list_name": list_name
-        }
-        
-        return response
+        return await _with_list_info(suggestion)
         
     except Exception as e:
         logger.error(f"Error getting related movie: {str(e)}", exc_info=True)
@@ -141,24 +423,12 @@ def get_related_movie(title: str, request: RelatedMovieRequest):
 
 
 @app.post("/movies/{list_name}")
-def add_movie(list_name: str, movie: Movie):
+def add_movie(list_name: str, movie: Movie, if_match: Optional[str] = Header(None)):
     logger.info(f"Adding movie {movie.title} to {list_name}")
-    if list_name not in ["watched", "want_to_watch", "not_interested", "undecided"]:
+    if list_name not in MOVIE_LISTS:
         logger.error(f"Invalid list name: {list_name}")
         raise HTTPException(status_code=400, detail="Invalid list name")
     
-    data = load_movies()
-    
-    # Check if movie already exists in any list
-    all_movies = []
-    for lst in data.values():
-        if isinstance(lst, list):  # Skip non-list values like preferences
-            all_movies.extend([m["title"] for m in lst])
-    
-    if movie.title in all_movies:
-        logger.warning(f"Movie {movie.title} already exists in a list")
-        raise HTTPException(status_code=400, detail="Movie already exists in a list")
-    
     new_movie = {
         "title": movie.title,
         "added_date": datetime.now().strftime("%Y-%m-%d"),
@@ -177,117 +447,114 @@ def add_movie(list_name: str, movie: Movie):
         new_movie["score"] = movie.score
         new_movie["date_watched"] = datetime.now().strftime("%Y-%m-%d")
     
-    data[list_name].append(new_movie)
-    save_movies(data)
+    with movie_store.transaction(parse_if_match(if_match)) as tx:
+        # Check if movie already exists in any list
+        if tx.find_movie(movie.title):
+            logger.warning(f"Movie {movie.title} already exists in a list")
+            raise HTTPException(status_code=400, detail="Movie already exists in a list")
+        
+        tx.add_movie(list_name, new_movie)
+    discard_from_queue(movie.title)
     logger.info(f"Successfully added {movie.title} to {list_name}")
     return {"status": "success", "message": "Movie added successfully"}
 
 @app.delete("/movies/{title}")
-def delete_movie(title: str):
+def delete_movie(title: str, if_match: Optional[str] = Header(None)):
     logger.info(f"Deleting movie: {title}")
-    data = load_movies()
     
-    # Find and remove the movie from all lists
-    found = False
-    for list_name, movies in data.items():
-        if isinstance(movies, list):  # Skip non-list values like preferences
-            for i, movie in enumerate(movies):
-                if movie["title"] == title:
-                    data[list_name].pop(i)
-                    found = True
-                    logger.info(f"Removed {title} from {list_name}")
-                    break
-        if found:
-            break
+    with movie_store.transaction(parse_if_match(if_match)) as tx:
+        # Find and remove the movie from whichever list holds it
+        removed = tx.remove_movie(title)
+        if removed is None:
+            logger.warning(f"Movie not found for deletion: {title}")
+            raise HTTPException(status_code=404, detail="Movie not found")
+        logger.info(f"Removed {title} from {removed[0]}")
     
-    if not found:
-        logger.warning(f"Movie not found for deletion: {title}")
-        raise HTTPException(status_code=404, detail="Movie not found")
-    
-    save_movies(data)
     logger.info(f"Successfully deleted movie: {title}")
     return {"status": "success", "message": "Movie deleted successfully"}
 
 from urllib.parse import unquote
 
 @app.get("/movies/poster/{title}")
-async def get_poster(title: str):
-    """Get movie poster image with caching."""
+async def get_poster(title: str, size: Optional[int] = Query(None, ge=1), if_none_match: Optional[str] = Header(None)):
+    """Get movie poster image with caching.
+
+    With size, serves a resized WebP variant at least size pixels wide
+    (up to the largest of POSTER_SIZES).
+    """
     decoded_title = unquote(title)
-    logger.info(f"Getting poster for movie: {decoded_title}")
+    log_sampled("get_poster", f"Getting poster for movie: {decoded_title}")
     
-    # Try with full title first (including year)
-    response = get_movie_poster(decoded_title)
-    if response:
-        return response
-    
-    # If that fails, try without the year
-    base_title = decoded_title.split('(')[0].strip()
-    response = get_movie_poster(base_title)
-    if response:
-        return response
+    # Tries the full title first (including year), then without the year
+    path = await find_movie_poster(decoded_title)
+    if path:
+        return poster_response(await get_poster_variant(path, size), if_none_match)
         
-    raise HTTPException(status_code=404, detail="Poster not found")
+    # When OMDB has no poster, let the browser remember the miss as long as the server does
+    headers = None
+    base_title = decoded_title.split('(')[0].strip()
+    poster_cache = get_poster_cache()
+    if poster_cache.is_missing(safe_filename(decoded_title)) and poster_cache.is_missing(safe_filename(base_title)):
+        headers = {"Cache-Control": f"public, max-age={int(POSTER_MISSING_TTL)}"}
+    raise HTTPException(status_code=404, detail="Poster not found", headers=headers)
 
 @app.get("/movies/keywords")
-def get_keyword_analysis():
-    """Get analysis of liked and disliked keywords."""
+def get_keyword_analysis(limit: Optional[int] = Query(None, ge=1)):
+    """Get analysis of liked and disliked keywords, most frequent first.
+
+    Served from the storage engine's keyword stats, which are updated as
+    movies change; limit returns only the top keywords of each side.
+    """
     logger.info("Getting keyword analysis")
-    data = load_movies()
-    analysis = analyze_keywords(data)
+    analysis = movie_store.keyword_stats.as_dict(limit)
     logger.info(f"Keyword analysis - Liked: {len(analysis['liked'])}, Disliked: {len(analysis['disliked'])}")
     return analysis
 
 @app.put("/movies")
-def update_movie(update: MovieUpdate):
+def update_movie(update: MovieUpdate, if_match: Optional[str] = Header(None)):
     logger.info(f"Updating movie: {update.title}")
-    data = load_movies()
-    
-    # Find the movie in all lists
-    found = False
-    for list_name, movies in data.items():
-        if not isinstance(movies, list):  # Skip non-list values like preferences
-            continue
-        for i, movie in enumerate(movies):
-            if movie["title"] == update.title:
-                found = True
-                if update.new_list:
-                    # Move to new list
-                    new_movie = {
-                        "title": movie["title"],
-                        "added_date": datetime.now().strftime("%Y-%m-%d"),
-                        "keywords": movie.get("keywords", []),  # Preserve keywords when moving
-                        "description": movie.get("description"),  # Preserve description when moving
-                        "credits": movie.get("credits"),  # Preserve credits when moving
-                        "score": movie.get("score") if list_name == "watched" else None  # Preserve score if moving within watched list
-                    }
-                    
-                    if update.new_list == "watched":
-                        if update.new_score is None:
-                            logger.error(f"No score provided for watched movie: {update.title}")
-                            raise HTTPException(status_code=400, detail="Score is required for watched movies")
-                        new_movie["score"] = update.new_score
-                        new_movie["date_watched"] = datetime.now().strftime("%Y-%m-%d")
-                    
-                    data[update.new_list].append(new_movie)
-                    data[list_name].pop(i)
-                    logger.info(f"Moved {update.title} from {list_name} to {update.new_list}")
-                elif update.new_score is not None and list_name == "watched":
-                    # Update score
-                    if not (0 <= update.new_score <= 10):
-                        logger.error(f"Invalid score for movie {update.title}: {update.new_score}")
-                        raise HTTPException(status_code=400, detail="Score must be between 0 and 10")
-                    movie["score"] = update.new_score
-                    logger.info(f"Updated score for {update.title} to {update.new_score}")
-                break
-        if found:
-            break
+    if update.new_list and update.new_list not in MOVIE_LISTS:
+        logger.error(f"Invalid list name: {update.new_list}")
+        raise HTTPException(status_code=400, detail="Invalid list name")
     
-    if not found:
-        logger.warning(f"Movie not found for update: {update.title}")
-        raise HTTPException(status_code=404, detail="Movie not found")
+    with movie_store.transaction(parse_if_match(if_match)) as tx:
+        # Find the movie in all lists
+        found = tx.find_movie(update.title)
+        if not found:
+            logger.warning(f"Movie not found for update: {update.title}")
+            raise HTTPException(status_code=404, detail="Movie not found")
+        list_name, movie = found
+        
+        if update.new_list:
+            # Move to new list
+            new_movie = {
+                "title": movie["title"],
+                "added_date": datetime.now().strftime("%Y-%m-%d"),
+                "keywords": movie.get("keywords", []),  # Preserve keywords when moving
+                "description": movie.get("description"),  # Preserve description when moving
+                "credits": movie.get("credits"),  # Preserve credits when moving
+                "score": movie.get("score") if list_name == "watched" else None  # Preserve score if moving within watched list
+            }
+            
+            if update.new_list == "watched":
+                if update.new_score is None:
+                    logger.error(f"No score provided for watched movie: {update.title}")
+                    raise HTTPException(status_code=400, detail="Score is required for watched movies")
+                new_movie["score"] = update.new_score
+                new_movie["date_watched"] = datetime.now().strftime("%Y-%m-%d")
+            
+            tx.remove_movie(update.title)
+            tx.add_movie(update.new_list, new_movie)
+            logger.info(f"Moved {update.title} from {list_name} to {update.new_list}")
+        elif update.new_score is not None and list_name == "watched":
+            # Update score
+            if not (0 <= update.new_score <= 10):
+                logger.error(f"Invalid score for movie {update.title}: {update.new_score}")
+                raise HTTPException(status_code=400, detail="Score must be between 0 and 10")
+            tx.update_movie(update.title, {"score": update.new_score})
+            logger.info(f"Updated score for {update.title} to {update.new_score}")
     
-    save_movies(data)
+    discard_from_queue(update.title)
     logger.info(f"Successfully updated movie: {update.title}")
     return {"status": "success", "message": "Movie updated successfully"}
 
@@ -0,0 +1,93 @@
+"""Benchmark: sync vs. async suggestion generation against the stub LLM server.
+
+Starts stub_llm_server.py, then issues the same number of concurrent
+movie-details generations through generate_single_suggestion on a 40-thread
+pool (the size of Starlette's default threadpool) and through
+agenerate_single_suggestion on the event loop.
+
+Usage:
+    python bench_async_llm.py [--requests 400] [--latency 2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent
+THREADPOOL_SIZE = 40
+
+def start_stub(port: int, latency: float) -> subprocess.Popen:
+    """Start the stub LLM server and wait until it accepts requests."""
+    server = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "stub_llm_server.py"), "--port", str(port), "--latency", str(latency)]
+    )
+    for _ in range(100):
+        try:
+            requests.post(f"http://127.0.0.1:{port}/v1/chat/completions", json={}, timeout=latency + 5)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Stub LLM server did not start")
+
+def report(name: str, latencies: list, elapsed: float) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:6} {len(latencies)} requests in {elapsed:6.2f}s  "
+          f"{len(latencies) / elapsed:7.1f} req/s  p50 {statistics.median(latencies):6.2f}s  p99 {p99:6.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400, help="concurrent generations")
+    parser.add_argument("--latency", type=float, default=2.0, help="stub response delay in seconds")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1/"
+    os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))  # Keep prompt logs out of the repo
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    from movie_generator import agenerate_single_suggestion, generate_single_suggestion
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("config").setLevel(logging.WARNING)
+
+    data = {"watched": [], "want_to_watch": [], "not_interested": [], "undecided": [],
+            "preferences": {"genres": [], "keywords": [], "comments": None}}
+    server = start_stub(args.port, args.latency)
+    try:
+        def timed_sync(i):
+            start = time.perf_counter()
+            generate_single_suggestion(data, title=f"Movie {i}")
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(THREADPOOL_SIZE) as pool:
+            sync_latencies = list(pool.map(timed_sync, range(args.requests)))
+        report("sync", sync_latencies, time.perf_counter() - start)
+
+        async def timed_async(i):
+            start = time.perf_counter()
+            await agenerate_single_suggestion(data, title=f"Movie {i}")
+            return time.perf_counter() - start
+
+        async def run_async():
+            return await asyncio.gather(*(timed_async(i) for i in range(args.requests)))
+
+        start = time.perf_counter()
+        async_latencies = asyncio.run(run_async())
+        report("async", async_latencies, time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
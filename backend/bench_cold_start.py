@@ -0,0 +1,105 @@
+"""Benchmark: cold start of a backend worker (importing api), tracked over time.
+
+Imports the module in fresh interpreters with ``python -X importtime``,
+prints the median wall time and import time with the slowest top-level
+imports, and appends the result to a history file (with the commit it was
+measured on) so startup regressions show up next to earlier runs. Runs on
+a tree with uncommitted changes are printed but not recorded, since no
+commit describes what they measured.
+
+Usage:
+    python bench_cold_start.py [--runs 7] [--module api] [--history cold_start_history.jsonl] [--no-record]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+SDKS = ("openai", "anthropic")
+
+def import_once(module: str, cwd: str) -> tuple:
+    """Import module in a new interpreter; return (wall ms, {package: import ms including its own imports})."""
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stub")}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    lines = [line[len("import time:"):].split("|") for line in result.stderr.splitlines()
+             if line.startswith("import time:") and "cumulative" not in line]
+    # Lines come after the modules they import, indented two spaces per level: walking
+    # them backwards, each package's time is counted where it is first imported
+    imports, ancestors = {}, []
+    for _, cumulative, name in reversed(lines):
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        package = name.strip().split(".")[0]
+        del ancestors[depth:]
+        if package not in ancestors:
+            imports[package] = imports.get(package, 0) + int(cumulative) / 1000
+        ancestors.append(package)
+    return wall_ms, imports
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time")
+    parser.add_argument("--module", default="api", help="module a worker imports")
+    parser.add_argument("--history", type=Path, default=BACKEND_DIR / "cold_start_history.jsonl")
+    parser.add_argument("--no-record", action="store_true", help="don't append the result to the history")
+    args = parser.parse_args()
+
+    cwd = tempfile.mkdtemp(prefix="movie_bench_")  # Caches and logs created on import stay out of the repo
+    runs = [import_once(args.module, cwd) for _ in range(args.runs + 1)][1:]  # The first run warms the OS file cache
+    wall_ms = statistics.median(wall for wall, _ in runs)
+    imports = {name: statistics.median(run[1].get(name, 0) for run in runs) for name in runs[-1][1]}
+    import_ms = imports.get(args.module, 0)
+    sdks = [name for name in SDKS if name in runs[-1][1]]
+
+    print(f"{args.module}: wall {wall_ms:.0f} ms, import {import_ms:.0f} ms (median of {args.runs}); "
+          f"provider SDKs imported: {', '.join(sdks) or 'none'}")
+    slowest = sorted((item for item in imports.items() if item[0] != args.module), key=lambda item: -item[1])
+    for name, ms in slowest[:8]:
+        print(f"  {name:24} {ms:7.1f} ms")
+
+    record = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "module": args.module,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(import_ms, 1),
+        "sdks": sdks,
+    }
+    history = []
+    if args.history.exists():
+        history = [json.loads(line) for line in args.history.read_text().splitlines() if line.strip()]
+    previous = next((r for r in reversed(history) if r["module"] == args.module), None)
+    if previous:
+        print(f"previous run ({previous['commit']}, {previous['date']}): wall {previous['wall_ms']:.0f} ms, "
+              f"import {previous['import_ms']:.0f} ms -> {wall_ms - previous['wall_ms']:+.0f} ms wall")
+    if args.no_record:
+        return
+    if record["commit"].endswith("-dirty") or record["commit"] == "unknown":
+        print(f"not recorded in {args.history}: commit your changes first (tree is {record['commit']})")
+        return
+    with args.history.open("a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"recorded in {args.history}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark: abandoning duplicate candidates mid-stream vs. waiting for complete responses.
+
+Starts stub_llm_server.py with a per-token delay and a share of duplicate
+answers, then runs the same number of /movies/suggest-style generations
+(generate_single_suggestion with reject_duplicates=True) with
+SUGGESTION_STREAMING off and on, and prints the latency of each mode with
+the output tokens and time the streamed mode recorded as saved.
+
+Usage:
+    python bench_early_abort.py [--suggestions 30] [--latency 0.2] [--token-delay 0.01] [--duplicate-rate 0.6]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from bench_fanout import BACKEND_DIR, report, start_stub
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suggestions", type=int, default=30, help="suggestions to generate per mode")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub delay before the first token in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="stub delay per output token in seconds")
+    parser.add_argument("--duplicate-rate", type=float, default=0.6, help="share of stub answers that are duplicates")
+    parser.add_argument("--port", type=int, default=8902)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1/"
+    os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))  # Keep prompt logs and rejects out of the repo
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    import movie_generator
+    import movie_stream
+    from movie_cache import ensure_cache_dir
+    from stub_llm_server import DUPLICATE_TITLE
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("config").setLevel(logging.ERROR)  # Rejected duplicates are expected here
+    ensure_cache_dir()
+
+    data = {"watched": [{"title": DUPLICATE_TITLE}], "want_to_watch": [], "not_interested": [], "undecided": [],
+            "preferences": {"genres": [], "keywords": [], "comments": None}}
+    server = start_stub(args.port, args.latency, args.duplicate_rate, args.token_delay)
+    try:
+        print(f"Stub latency {args.latency}s + {args.token_delay}s per token, duplicate rate {args.duplicate_rate:.0%}")
+        for name, streaming in (("complete", 0), ("streamed", 1)):
+            movie_generator.SUGGESTION_STREAMING = streaming
+            latencies = []
+            for _ in range(args.suggestions):
+                start = time.perf_counter()
+                movie_generator.generate_single_suggestion(data, reject_duplicates=True, batch_size=1)
+                latencies.append(time.perf_counter() - start)
+            report(name, latencies, 0)
+        stats = movie_stream.get_stream_stats()
+        print(f"streamed: {stats['aborted']} duplicates abandoned, "
+              f"~{stats['tokens_saved_per_request']:.0f} output tokens and ~{stats['ms_saved_per_request']:.0f} ms saved per request "
+              f"(complete answers average {stats['completed_tokens'] / max(stats['completed'], 1):.0f} tokens)")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
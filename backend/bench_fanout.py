@@ -0,0 +1,98 @@
+"""Benchmark: suggestion latency with sequential retries, fan-out and batches.
+
+Starts stub_llm_server.py with a share of duplicate answers, then runs the
+same number of /movies/suggest-style generations (reject_duplicates=True)
+with one candidate per call, with SUGGESTION_FANOUT-style concurrent calls,
+and with SUGGESTION_BATCH_SIZE-style batched calls, counting the valid
+leftover candidates each mode produces.
+
+Usage:
+    python bench_fanout.py [--suggestions 50] [--latency 0.3] [--duplicate-rate 0.6] [--candidates 4]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+def start_stub(port: int, latency: float, duplicate_rate: float, token_delay: float = 0) -> subprocess.Popen:
+    """Start the stub LLM server and wait until it accepts requests."""
+    server = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "stub_llm_server.py"), "--port", str(port),
+         "--latency", str(latency), "--token-delay", str(token_delay), "--duplicate-rate", str(duplicate_rate)]
+    )
+    for _ in range(100):
+        try:
+            requests.post(f"http://127.0.0.1:{port}/v1/chat/completions", json={}, timeout=latency + 5)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Stub LLM server did not start")
+
+def report(name: str, latencies: list, leftovers: int) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:12} p50 {statistics.median(latencies):6.2f}s  p99 {p99:6.2f}s  "
+          f"max {latencies[-1]:6.2f}s  leftovers {leftovers}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suggestions", type=int, default=50, help="suggestions to generate per mode")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub response delay in seconds")
+    parser.add_argument("--duplicate-rate", type=float, default=0.6, help="share of stub answers that are duplicates")
+    parser.add_argument("--candidates", type=int, default=4, help="fan-out / batch size")
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1/"
+    os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))  # Keep prompt logs and rejects out of the repo
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    from movie_cache import ensure_cache_dir
+    from movie_generator import agenerate_single_suggestion
+    from stub_llm_server import DUPLICATE_TITLE
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("config").setLevel(logging.ERROR)  # Rejected duplicates are expected here
+    ensure_cache_dir()
+
+    data = {"watched": [{"title": DUPLICATE_TITLE}], "want_to_watch": [], "not_interested": [], "undecided": [],
+            "preferences": {"genres": [], "keywords": [], "comments": None}}
+    modes = [
+        ("sequential", {"fanout": 1, "batch_size": 1}),
+        ("fanout", {"fanout": args.candidates, "batch_size": 1}),
+        ("batch", {"fanout": 1, "batch_size": args.candidates}),
+    ]
+    server = start_stub(args.port, args.latency, args.duplicate_rate)
+    try:
+        async def run(options):
+            latencies, leftovers = [], []
+            for _ in range(args.suggestions):
+                start = time.perf_counter()
+                await agenerate_single_suggestion(data, reject_duplicates=True, on_leftover=leftovers.append, **options)
+                latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(args.latency * 2)  # Let background fan-out requests finish
+            return latencies, len(leftovers)
+
+        async def run_all():
+            # One event loop for every mode, as the shared async client is bound to it
+            for name, options in modes:
+                report(name, *await run(options))
+
+        print(f"Stub latency {args.latency}s, duplicate rate {args.duplicate_rate:.0%}, candidates {args.candidates}")
+        asyncio.run(run_all())
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
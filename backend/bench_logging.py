@@ -0,0 +1,81 @@
+"""Benchmark: time the request path spends logging prompts.
+
+Compares the previous synchronous prompt dump (a new logs/prompt_<timestamp>.txt
+written before each AI request) with log_prompt, which queues the prompt for
+the background listener writing the compressed prompt archive. Also times
+the previous per-check dump of the recent duplicates against log_sampled.
+The previous variants' log lines now go through the queue as well, so they
+understate what the synchronous file handler used to cost.
+Runs in a temporary directory, so the files written stay out of the repo.
+
+Usage:
+    python bench_logging.py [--calls 2000] [--prompt-kb 6] [--duplicates 20]
+"""
+import argparse
+import atexit
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))
+
+import logging
+from config import console_handler, logger, log_prompt, log_sampled, log_listener
+
+def dump_prompt(prompt: str) -> None:
+    """The previous synchronous prompt dump."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"logs/prompt_{timestamp}.txt"
+    os.makedirs('logs', exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(prompt)
+    logger.info(f"Prompt logged to {filename}")
+
+def dump_duplicates(duplicates: list) -> None:
+    """The previous dump of every recent duplicate on each duplicate found."""
+    logger.info("Recent duplicate movies:")
+    for idx, (dup_title, dup_reason) in enumerate(duplicates, 1):
+        logger.info(f"{idx}. {dup_title} - {dup_reason}")
+
+def time_calls(call, calls: int) -> list:
+    """Return the milliseconds each of calls calls spent on the caller's thread."""
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def report(name: str, times: list) -> None:
+    times = sorted(times)
+    print(f"{name:34} p50 {statistics.median(times):7.3f} ms   p99 {times[int(len(times) * 0.99)]:7.3f} ms   "
+          f"total {sum(times):8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="log calls per variant")
+    parser.add_argument("--prompt-kb", type=int, default=6, help="prompt size in KB")
+    parser.add_argument("--duplicates", type=int, default=20, help="recent duplicates listed per check")
+    args = parser.parse_args()
+
+    console_handler.setLevel(logging.WARNING)  # The terminal would dominate; only the files are compared
+
+    prompt = ("Suggest a movie I haven't seen. " * (args.prompt_kb * 40))[:args.prompt_kb * 1024]
+    duplicates = [(f"Movie {i} (2000)", "Movie already exists in watched list") for i in range(args.duplicates)]
+
+    print(f"{args.calls} calls, {args.prompt_kb} KB prompts, {args.duplicates} recent duplicates")
+    report("prompt: file per prompt (sync)", time_calls(lambda: dump_prompt(prompt), args.calls))
+    report("prompt: log_prompt (queued)", time_calls(lambda: log_prompt(prompt), args.calls))
+    report("duplicates: full dump", time_calls(lambda: dump_duplicates(duplicates), args.calls))
+    report("duplicates: log_sampled", time_calls(
+        lambda: log_sampled("recent_duplicates", f"{len(duplicates)} recent duplicate movies"), args.calls))
+    start = time.perf_counter()
+    atexit.unregister(log_listener.stop)
+    log_listener.stop()  # Wait for the listener to write out the queue
+    print(f"background listener drained the rest of the queue in {(time.perf_counter() - start) * 1000:.0f} ms; "
+          f"{len(os.listdir('logs'))} files in logs/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark and check: the async poster pipeline against fake_omdb_server.py.
+
+Starts the fake OMDB server and drives the API's poster route in-process:
+
+1. Many concurrent requests for one uncached poster share one OMDB lookup
+   and one download.
+2. Many distinct uncached posters are fetched with at most
+   POSTER_CONCURRENCY requests to OMDB in flight, while the event loop
+   stays responsive (its scheduling lag is measured throughout).
+3. A poster OMDB doesn't have is looked up once and then answered from
+   the missing marker.
+
+Usage:
+    python bench_posters.py [--posters 100] [--same 50] [--latency 0.2] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+def start_fake_omdb(port: int, latency: float) -> subprocess.Popen:
+    """Start the fake OMDB server and wait until it accepts requests."""
+    server = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "fake_omdb_server.py"), "--port", str(port), "--latency", str(latency)]
+    )
+    for _ in range(100):
+        try:
+            httpx.delete(f"http://127.0.0.1:{port}/stats")
+            return server
+        except httpx.ConnectError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Fake OMDB server did not start")
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay of a timer scheduled every interval seconds."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"{'PASS' if ok else 'FAIL'}  {name}: {detail}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posters", type=int, default=100, help="distinct posters to fetch at once")
+    parser.add_argument("--same", type=int, default=50, help="concurrent requests for one poster")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake OMDB response delay in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="POSTER_CONCURRENCY for the API")
+    parser.add_argument("--port", type=int, default=8920)
+    args = parser.parse_args()
+
+    omdb_url = f"http://127.0.0.1:{args.port}"
+    os.environ["OMDB_BASE_URL"] = f"{omdb_url}/"
+    os.environ["POSTER_CONCURRENCY"] = str(args.concurrency)
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))  # Scratch poster cache
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    from api import app
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("config").setLevel(logging.WARNING)
+
+    server = start_fake_omdb(args.port, args.latency)
+    try:
+        async def run():
+            results = []
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                async def poster(title):
+                    return (await client.get(f"/movies/poster/{quote(title)}")).status_code
+
+                stats = lambda: httpx.get(f"{omdb_url}/stats").json()
+
+                statuses = await asyncio.gather(*(poster("Shared Movie (1999)") for _ in range(args.same)))
+                lookups = stats()["lookups"].get("Shared Movie", 0)
+                results.append(check(
+                    "single-flight", lookups == 1 and set(statuses) == {200},
+                    f"{args.same} concurrent requests -> {lookups} OMDB lookup(s), statuses {sorted(set(statuses))}"
+                ))
+
+                httpx.delete(f"{omdb_url}/stats")
+                stop = asyncio.Event()
+                lag_task = asyncio.create_task(measure_loop_lag(stop))
+                start = time.perf_counter()
+                statuses = await asyncio.gather(*(poster(f"Movie {i} (2000)") for i in range(args.posters)))
+                elapsed = time.perf_counter() - start
+                stop.set()
+                lag = await lag_task
+                peak = stats()["max_in_flight"]
+                results.append(check(
+                    "concurrency limit", peak <= args.concurrency and set(statuses) == {200},
+                    f"{args.posters} posters in {elapsed:.2f}s, peak {peak} requests in flight (limit {args.concurrency})"
+                ))
+                results.append(check(
+                    "event loop responsive", lag < args.latency,
+                    f"worst loop lag {lag * 1000:.1f} ms while fetching"
+                ))
+
+                start = time.perf_counter()
+                statuses = await asyncio.gather(*(poster(f"Movie {i} (2000)") for i in range(args.posters)))
+                elapsed = time.perf_counter() - start
+                results.append(check(
+                    "cache hits", set(statuses) == {200},
+                    f"{args.posters} cached posters in {elapsed * 1000:.1f} ms"
+                ))
+
+                httpx.delete(f"{omdb_url}/stats")
+                first = await poster("Missing Movie (2001)")
+                second = await poster("Missing Movie (2001)")
+                lookups = sum(stats()["lookups"].values())
+                results.append(check(
+                    "missing posters", first == second == 404 and lookups == 2,
+                    f"two requests -> {lookups} OMDB lookups (with and without the year), statuses {first}, {second}"
+                ))
+            return all(results)
+
+        ok = asyncio.run(run())
+    finally:
+        server.terminate()
+        server.wait()
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
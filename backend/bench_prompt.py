@@ -0,0 +1,66 @@
+"""Benchmark: suggestion prompt size and build time vs. library size.
+
+Builds synthetic libraries and compares the previous way of prompting (every
+title and keyword, with the keyword analysis and prompt rebuilt on each of
+the retries) with SuggestionPrompt under PROMPT_TOKEN_BUDGET (built once
+from maintained keyword stats, then rendered per retry).
+
+Usage:
+    python bench_prompt.py [--sizes 100,1000,10000] [--retries 30] [--budget 3000]
+"""
+import argparse
+import random
+import time
+
+from movie_analysis import MOVIE_LISTS, KeywordStats
+from movie_prompts import PROMPT_TOKEN_BUDGET, SuggestionPrompt
+
+WORDS = ["Night", "Star", "Dark", "Return", "Lost", "City", "Dream", "Fire", "Ghost", "Shadow",
+         "River", "Last", "Iron", "Silent", "Blue", "King", "War", "Love", "Empire", "Storm"]
+KEYWORDS = [f"{a.lower()}-{b.lower()}" for a in WORDS for b in WORDS]
+
+def make_library(size: int) -> dict:
+    """Return movies.yaml-shaped data with size movies, half of them watched."""
+    rng = random.Random(42)
+    data = {list_name: [] for list_name in MOVIE_LISTS}
+    data["preferences"] = {"genres": ["Drama"], "keywords": [], "comments": ""}
+    for i in range(size):
+        list_name = "watched" if i % 2 == 0 else rng.choice(MOVIE_LISTS[1:])
+        movie = {"title": f"The {rng.choice(WORDS)} {rng.choice(WORDS)} {i} ({rng.randint(1950, 2024)})",
+                 "keywords": rng.sample(KEYWORDS, 5)}
+        if list_name == "watched":
+            movie["score"] = rng.randint(1, 10)
+        data[list_name].append(movie)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated library sizes")
+    parser.add_argument("--retries", type=int, default=30, help="attempts per suggestion")
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET, help="prompt token budget")
+    args = parser.parse_args()
+    rejects = [f"Rejected Movie {i} (2001)" for i in range(10)]
+
+    print(f"{'library':>8} | {'full prompt':>12} {'per call':>10} | {'budgeted':>10} {'build':>9} {'per call':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        data = make_library(size)
+        stats = KeywordStats.from_data(data)
+
+        start = time.perf_counter()
+        for _ in range(args.retries):
+            full = SuggestionPrompt(data, keyword_stats=KeywordStats.from_data(data), budget=0).render(rejects)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        prompt = SuggestionPrompt(data, keyword_stats=stats, budget=args.budget)
+        build_ms = (time.perf_counter() - start) * 1000
+        for _ in range(args.retries):
+            budgeted = prompt.render(rejects)
+        call_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{size:>8} | {len(full) // 4:>7} tok {full_ms:>7.1f} ms | {len(budgeted) // 4:>6} tok "
+              f"{build_ms:>6.2f} ms {call_ms:>7.2f} ms")
+    print(f"(per call = building {args.retries} attempts' prompts; tokens estimated at 4 characters each)")
+
+if __name__ == "__main__":
+    main()
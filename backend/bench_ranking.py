@@ -0,0 +1,82 @@
+"""Benchmark: ranking the cached recommendation corpus against the keyword profile.
+
+Fills a scratch recommendation store with synthetic movies, builds a
+keyword profile from a synthetic library, then times CandidateRanker.rank()
+with NumPy and with the plain Python fallback, checks both agree, and
+counts how many of a run of suggestions would be served without asking the
+AI provider.
+
+Usage:
+    python bench_ranking.py [--sizes 1000,10000,50000] [--suggestions 50]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated corpus sizes")
+    parser.add_argument("--suggestions", type=int, default=50, help="suggestions to pick from the largest corpus")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="movie_bench_"))  # Scratch recommendation store
+    import logging
+    import movie_ranking
+    from movie_analysis import KeywordStats, TitleIndex
+    from movie_cache import RecommendationStore
+    from bench_prompt import KEYWORDS, make_library
+    logging.getLogger("config").setLevel(logging.WARNING)
+    numpy = movie_ranking.np
+    if numpy is None:
+        print("NumPy is not installed; only the plain Python fallback is timed")
+
+    data = make_library(2000)
+    # Give the profile a taste: high scores for movies with keywords from the first half
+    for movie in data["watched"]:
+        movie["score"] = 9 if KEYWORDS.index(movie["keywords"][0]) < len(KEYWORDS) // 2 else 3
+    stats = KeywordStats.from_data(data)
+    index = TitleIndex.from_data(data)
+    accept = lambda movie: not index.contains(movie["title"])
+    rng = random.Random(7)
+    for size in (int(s) for s in args.sizes.split(",")):
+        store = RecommendationStore(f"recommendations-{size}.db", legacy_dir=None)
+        with store._connect() as conn:
+            conn.executemany(
+                "INSERT INTO recommendations (source_title, title, data) VALUES (?, ?, ?)",
+                [(f"Source {i % 100}", f"Known Movie {i} (2000)",
+                  json.dumps({"title": f"Known Movie {i} (2000)", "keywords": rng.sample(KEYWORDS, 5)}))
+                 for i in range(size)]
+            )
+        ranker = movie_ranking.CandidateRanker(store)
+        start = time.perf_counter()
+        ranker.rank(stats, accept, 10)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        timings = {}
+        results = {}
+        for name, module in (("numpy", numpy), ("python", None)):
+            if name == "numpy" and numpy is None:
+                continue
+            movie_ranking.np = module
+            ranker._arrays = None
+            ranker.rank(stats, accept, 10)  # Build the arrays
+            start = time.perf_counter()
+            for _ in range(20):
+                results[name] = [round(score, 4) for score, _ in ranker.rank(stats, accept, 10)]
+            timings[name] = (time.perf_counter() - start) * 1000 / 20
+        movie_ranking.np = numpy
+        agree = "" if len(results) < 2 else f", top 10 scores {'match' if results['numpy'] == results['python'] else 'DIFFER'}"
+        print(f"corpus {size:>6}: first load {load_ms:7.1f} ms | rank " +
+              " | ".join(f"{name} {ms:6.2f} ms" for name, ms in timings.items()) + agree)
+
+    served = sum(1 for _ in range(args.suggestions) if ranker.pick(stats, accept)[0] is not None)
+    print(f"{served}/{args.suggestions} suggestions served from the corpus without an AI request "
+          f"(LOCAL_SUGGESTION_MIN_SCORE={movie_ranking.LOCAL_SUGGESTION_MIN_SCORE})")
+    sys.exit(0 if len(set(map(tuple, results.values()))) <= 1 else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Micro-benchmark: duplicate detection with TitleIndex vs. scanning every list.
+
+Builds a synthetic library, then checks a batch of candidate titles (half of
+them duplicates) the way generate_single_suggestion used to, and with the
+shared TitleIndex.
+
+Usage:
+    python bench_title_index.py [--library 10000] [--candidates 100]
+"""
+import argparse
+import random
+import time
+
+from movie_analysis import MOVIE_LISTS, TitleIndex, extract_year, normalize_title, title_keys
+
+WORDS = ["Night", "Star", "Dark", "Return", "Lost", "City", "Dream", "Fire", "Ghost", "Shadow",
+         "River", "Last", "Iron", "Silent", "Blue", "King", "War", "Love", "Empire", "Storm"]
+
+def make_library(size: int) -> dict:
+    """Return movies.yaml-shaped data with size distinct titles."""
+    rng = random.Random(42)
+    data = {list_name: [] for list_name in MOVIE_LISTS}
+    for i in range(size):
+        title = f"The {rng.choice(WORDS)} {rng.choice(WORDS)} {i} ({rng.randint(1950, 2024)})"
+        data[rng.choice(MOVIE_LISTS)].append({"title": title})
+    return data
+
+def scan_lists(data: dict, candidate: str) -> bool:
+    """The previous duplicate check: normalize every stored title for every candidate."""
+    suggested_normalized = normalize_title(candidate)
+    suggested_base, _ = extract_year(candidate)
+    suggested_base_normalized = normalize_title(suggested_base)
+    for list_name in MOVIE_LISTS:
+        for movie in data[list_name]:
+            m_normalized = normalize_title(movie["title"])
+            m_base, _ = extract_year(movie["title"])
+            if suggested_normalized == m_normalized or suggested_base_normalized == normalize_title(m_base):
+                return True
+    return False
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--library", type=int, default=10000, help="titles in the library")
+    parser.add_argument("--candidates", type=int, default=100, help="candidate titles to check")
+    args = parser.parse_args()
+
+    data = make_library(args.library)
+    all_titles = [m["title"] for list_name in MOVIE_LISTS for m in data[list_name]]
+    rng = random.Random(7)
+    candidates = [rng.choice(all_titles) if i % 2 else f"Unknown Movie {i} (2001)" for i in range(args.candidates)]
+
+    scan_hits, scan_time = timed(lambda: [scan_lists(data, c) for c in candidates])
+    title_keys.cache_clear()
+    index, build_time = timed(TitleIndex.from_data, data)
+    index_hits, lookup_time = timed(lambda: [index.contains(c) for c in candidates])
+    _, update_time = timed(lambda: [index.move(t, "watched", "undecided") for t in all_titles[:1000]])
+
+    assert scan_hits == index_hits, "index and scan disagree"
+    per_check = lambda total: total / len(candidates) * 1e6
+    print(f"Library: {args.library} titles, candidates: {len(candidates)} ({sum(index_hits)} duplicates)")
+    print(f"List scan:     {scan_time * 1e3:9.1f} ms total, {per_check(scan_time):9.1f} us/check")
+    print(f"Index build:   {build_time * 1e3:9.1f} ms (once per load)")
+    print(f"Index lookup:  {lookup_time * 1e3:9.3f} ms total, {per_check(lookup_time):9.3f} us/check")
+    print(f"Index update:  {update_time / 1000 * 1e6:9.3f} us per move")
+    print(f"Speedup:       {scan_time / lookup_time:9.0f}x")
+
+if __name__ == "__main__":
+    main()
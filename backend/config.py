@@ -1,29 +1,140 @@
-import os
+import atexit
+import gzip
+import json
 import logging
-from logging.handlers import RotatingFileHandler
-import anthropic
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Tuple
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 # Load environment variables
 load_dotenv(".env")
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Seconds between two logs of the same high-volume message (see log_sampled); 0 logs every one
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "10"))
+# Prompts sent to the AI provider are archived as JSON lines in one file,
+# rotated into gzip-compressed backups. 0 turns prompt capture off.
+LOG_PROMPTS = int(os.getenv("LOG_PROMPTS", "1"))
+PROMPT_ARCHIVE_FILE = os.getenv("PROMPT_ARCHIVE_FILE", "logs/prompts.jsonl")
+PROMPT_ARCHIVE_MAX_BYTES = int(os.getenv("PROMPT_ARCHIVE_MAX_BYTES", str(10 * 1024 * 1024)))
+PROMPT_ARCHIVE_BACKUPS = int(os.getenv("PROMPT_ARCHIVE_BACKUPS", "5"))
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that gzips the files it rotates out and creates its directory on first write.
+
+    Safe to share between the worker processes: every write and rollover
+    holds an exclusive lock on ``<file>.lock``, and a process whose file was
+    rotated by another one reopens it first. Without fcntl (Windows) each
+    process writes its own ``<name>.<pid><ext>`` file instead.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        if fcntl is None:
+            root, ext = os.path.splitext(filename)
+            filename = f"{root}.{os.getpid()}{ext}"
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+            with open(f"{self.baseFilename}.lock", "a") as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)  # Released when the file is closed
+                if self.stream is not None and not self._is_current():
+                    self.stream.close()
+                    self.stream = None  # Reopened by the write
+                super().emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def _is_current(self) -> bool:
+        """Whether the open stream is still the file at baseFilename, i.e. no other process rotated it."""
+        try:
+            return os.path.samestat(os.fstat(self.stream.fileno()), os.stat(self.baseFilename))
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+# Configure logging. Records are put on a queue by the thread that logs them
+# and written to the console and files by a background listener thread, so
+# request handlers never wait on file I/O.
 logger = logging.getLogger(__name__)
+prompt_logger = logging.getLogger("prompts")
+prompt_logger.propagate = False
+
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+console_handler.addFilter(lambda record: record.name != prompt_logger.name)
 
-# Add file handler
-handler = RotatingFileHandler('movie_suggestions.log', maxBytes=10000000, backupCount=5)
+# The application's own log
+handler = RotatingFileHandler('movie_suggestions.log', maxBytes=10000000, backupCount=5, delay=True)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+handler.addFilter(logging.Filter(logger.name))
+
+prompt_handler = CompressingRotatingFileHandler(PROMPT_ARCHIVE_FILE, PROMPT_ARCHIVE_MAX_BYTES, PROMPT_ARCHIVE_BACKUPS)
+prompt_handler.addFilter(logging.Filter(prompt_logger.name))
+
+log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, console_handler, handler, prompt_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # Writes out what is still queued
+
+logging.root.setLevel(logging.INFO)
+logging.root.addHandler(QueueHandler(log_queue))
+prompt_logger.addHandler(QueueHandler(log_queue))
+
+_samples: Dict[str, Tuple[float, int]] = {}  # key -> (time last logged, messages skipped since)
+_samples_lock = threading.Lock()
+
+def log_sampled(key: str, message: str, level: int = logging.INFO) -> None:
+    """Log a high-volume hot-path message at most once every LOG_SAMPLE_INTERVAL seconds per key.
+
+    The line that is logged says how many messages with the same key were
+    skipped since the previous one.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    now = time.monotonic()
+    with _samples_lock:
+        last, skipped = _samples.get(key, (None, 0))
+        if last is not None and now - last < LOG_SAMPLE_INTERVAL:
+            _samples[key] = (last, skipped + 1)
+            return
+        _samples[key] = (now, 0)
+    logger.log(level, f"{message} (+{skipped} more since last logged)" if skipped else message)
+
+def log_prompt(prompt: str, **fields) -> None:
+    """Append a prompt sent to the AI provider to the prompt archive, unless LOG_PROMPTS is 0."""
+    if LOG_PROMPTS:
+        prompt_logger.info(json.dumps({"time": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), **fields, "prompt": prompt}))
 
 # List of all available movie genres
 MOVIE_GENRES = [
-    "Action", "Adventure", "Animation", "Biography", "Comedy", "Crime", 
+    "Action", "Adventure", "Animation", "Biography", "Comedy", "Crime",
     "Documentary", "Drama", "Family", "Fantasy", "Film-Noir", "History",
     "Horror", "Musical", "Mystery", "Romance", "Sci-Fi", "Sport",
     "Thriller", "War", "Western"
 ]
-
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
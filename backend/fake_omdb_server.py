@@ -0,0 +1,85 @@
+"""Local stand-in for the OMDB API and its poster images, for benchmarks.
+
+``GET /?t=<title>`` answers like OMDB with a poster URL on this server,
+except for titles starting with "Missing", which OMDB doesn't know.
+``GET /img/<name>.jpg`` returns a small JPEG after a fixed delay.
+``GET /stats`` reports how often each title was looked up and the most
+requests that were in flight at once; ``DELETE /stats`` resets it.
+
+Usage:
+    python fake_omdb_server.py [--port 8920] [--latency 0.2]
+
+Then point the backend at it with OMDB_BASE_URL=http://127.0.0.1:8920/.
+"""
+import argparse
+import asyncio
+import os
+from collections import Counter
+from urllib.parse import quote
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+LATENCY = float(os.getenv("FAKE_OMDB_LATENCY", "0.2"))
+# Smallest valid JPEG, enough for the browser and the cache
+JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912"
+    "130f141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27393d38323c2e333432ffc0000b080001"
+    "000101011100ffc4001f0000010501010101010100000000000000000102030405060708090a0bffda0008010100003f"
+    "00d2cf20ffd9"
+)
+
+app = FastAPI()
+lookups: Counter = Counter()
+downloads: Counter = Counter()
+in_flight = 0
+max_in_flight = 0
+
+async def _serve(delay: float) -> None:
+    """Count a request as in flight for delay seconds."""
+    global in_flight, max_in_flight
+    in_flight += 1
+    max_in_flight = max(max_in_flight, in_flight)
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        in_flight -= 1
+
+@app.get("/")
+async def omdb(request: Request, t: str, y: str = None):
+    lookups[t] += 1
+    await _serve(LATENCY)
+    if t.startswith("Missing"):
+        return {"Response": "False", "Error": "Movie not found!"}
+    name = quote(f"{t} {y}" if y else t)
+    return {"Title": t, "Year": y, "Response": "True", "Poster": f"{request.base_url}img/{name}.jpg"}
+
+@app.get("/img/{name}")
+async def image(name: str):
+    downloads[name] += 1
+    await _serve(LATENCY)
+    return Response(JPEG, media_type="image/jpeg")
+
+@app.get("/stats")
+def stats():
+    return {"lookups": dict(lookups), "downloads": dict(downloads), "max_in_flight": max_in_flight}
+
+@app.delete("/stats")
+def reset_stats():
+    global max_in_flight
+    lookups.clear()
+    downloads.clear()
+    max_in_flight = 0
+    return {"status": "success"}
+
+def main():
+    global LATENCY
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8920)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds before each response")
+    args = parser.parse_args()
+    LATENCY = args.latency
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
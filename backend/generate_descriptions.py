@@ -1,35 +1,49 @@
-import yaml
+import argparse
+import asyncio
 import json
 import os
 import time
+from pathlib import Path
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-from anthropic import Anthropic
-from movie_storage import load_movies, save_movies
+
+# Checkpoints go straight to disk under the file lock, as the API may be running
+os.environ.setdefault("MOVIE_STORE_FLUSH_DELAY", "0")
+
+import httpx
+from ai_providers import get_client
+from movie_storage import load_movies, movie_store, MOVIE_LISTS
 from config import logger
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+DESCRIPTION_MODEL = "claude-3-5-sonnet-20241022"
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+# Completed descriptions not yet written to movies.yaml, for resuming
+JOURNAL_FILE = Path(os.getenv("DESCRIPTIONS_JOURNAL", "descriptions.journal.jsonl"))
+BATCH_MAX_REQUESTS = 10000  # Requests per message batch
+
+def _description_params(title: str) -> Dict:
+    """Return the messages.create() arguments for a movie's description."""
+    prompt = f"""You are a movie expert. For the movie "{title}", provide a 2-3 sentence description focusing on what makes this movie special and memorable. The description should be informative and engaging, highlighting key aspects like plot elements, themes, or stylistic choices that make the film stand out.
+
+Return ONLY the description text, with no additional formatting or commentary."""
+    return {
+        "model": DESCRIPTION_MODEL,
+        "max_tokens": 200,
+        "temperature": 0.7,
+        "messages": [{
+            "role": "user",
+            "content": prompt
+        }]
+    }
 
 def get_movie_description(title: str) -> str:
     """Get an AI-generated description for a movie."""
     try:
-        prompt = f"""You are a movie expert. For the movie "{title}", provide a 2-3 sentence description focusing on what makes this movie special and memorable. The description should be informative and engaging, highlighting key aspects like plot elements, themes, or stylistic choices that make the film stand out.
+        message = get_client("anthropic").messages.create(**_description_params(title))
 
-Return ONLY the description text, with no additional formatting or commentary."""
-
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=200,
-            temperature=0.7,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
-        
         description = message.content[0].text.strip()
         logger.info(f"Generated description for {title}")
         return description
@@ -38,36 +52,239 @@ Return ONLY the description text, with no additional formatting or commentary.""
         logger.error(f"Error generating description for {title}: {str(e)}")
         return None
 
-def main():
-    # Load current movies
+class TokenBucket:
+    """Allows rate_per_minute requests per minute, with bursts of up to capacity."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class DescriptionJournal:
+    """Append-only record of finished work, so an interrupted run can resume.
+
+    Lines are {"title", "description"} for each generated description,
+    {"batch_id", "custom_ids"} for each submitted message batch and
+    {"batch_id", "collected": true} once a batch's results are in. The
+    journal is removed once everything in it has been written to movies.yaml.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE):
+        self.path = path
+        self.descriptions: Dict[str, str] = {}
+        self.batches: List[Dict] = []
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partly written last line
+                    if entry.get("collected"):
+                        for batch in self.batches:
+                            if batch["batch_id"] == entry["batch_id"]:
+                                batch["collected"] = True
+                    elif "batch_id" in entry:
+                        self.batches.append(entry)
+                    else:
+                        self.descriptions[entry["title"]] = entry["description"]
+            logger.info(f"Resuming: {len(self.descriptions)} descriptions and {len(self.batches)} batches in {path}")
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _append(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def add_description(self, title: str, description: str) -> None:
+        self.descriptions[title] = description
+        self._append({"title": title, "description": description})
+
+    def add_batch(self, batch_id: str, custom_ids: Dict[str, str]) -> None:
+        entry = {"batch_id": batch_id, "custom_ids": custom_ids}
+        self.batches.append(entry)
+        self._append(entry)
+
+    def mark_collected(self, batch_id: str) -> None:
+        for batch in self.batches:
+            if batch["batch_id"] == batch_id:
+                batch["collected"] = True
+        self._append({"batch_id": batch_id, "collected": True})
+
+    @property
+    def pending_batches(self) -> List[Dict]:
+        """Submitted batches whose results haven't been collected."""
+        return [batch for batch in self.batches if not batch.get("collected")]
+
+    def remove(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+class Checkpointer:
+    """Writes finished descriptions to the movie store every `every` items."""
+
+    def __init__(self, every: int):
+        self.every = every
+        self.pending: Dict[str, str] = {}
+        self.saved = 0
+
+    def add(self, title: str, description: str) -> None:
+        self.pending[title] = description
+        if len(self.pending) >= self.every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        with movie_store.transaction() as tx:
+            for title, description in self.pending.items():
+                found = tx.find_movie(title)
+                if found and not found[1].get('description'):
+                    tx.update_movie(title, {"description": description})
+        self.saved += len(self.pending)
+        logger.info(f"Checkpoint: saved {len(self.pending)} descriptions ({self.saved} total)")
+        self.pending = {}
+
+def _titles_without_description() -> List[str]:
+    """Return each title that has no description yet, once."""
     data = load_movies()
-    
-    # Process each list
-    lists = ['watched', 'want_to_watch', 'not_interested', 'undecided']
-    total_movies = sum(len(data[lst]) for lst in lists)
-    processed = 0
-
-    for list_name in lists:
-        logger.info(f"Processing {list_name} list...")
-        
-        for movie in data[list_name]:
-            if not movie.get('description'):  # Only process movies without descriptions
-                title = movie['title']
-                logger.info(f"Generating description for {title} ({processed + 1}/{total_movies})")
-                
-                description = get_movie_description(title)
-                if description:
-                    movie['description'] = description
-                    # Save after each successful description in case of interruption
-                    save_movies(data)
-                    logger.info(f"Saved description for {title}")
-                
-                # Sleep to avoid hitting API rate limits
-                time.sleep(1)
-            
-            processed += 1
-
-    logger.info("Finished generating descriptions")
+    titles = (movie['title'] for list_name in MOVIE_LISTS for movie in data[list_name] if not movie.get('description'))
+    return list(dict.fromkeys(titles))
+
+async def generate_concurrently(titles: List[str], journal: DescriptionJournal, checkpointer: Checkpointer, concurrency: int, rate_per_minute: float, max_retries: int = 3) -> None:
+    """Generate descriptions with up to concurrency requests in flight."""
+    async_client = get_client("anthropic", asynchronous=True)
+    bucket = TokenBucket(rate_per_minute)
+    queue: asyncio.Queue = asyncio.Queue()
+    for title in titles:
+        queue.put_nowait(title)
+    started = time.perf_counter()
+    done = 0
+
+    async def worker():
+        nonlocal done
+        while not queue.empty():
+            title = queue.get_nowait()
+            for attempt in range(max_retries):
+                await bucket.acquire()
+                try:
+                    message = await async_client.messages.create(**_description_params(title))
+                    description = message.content[0].text.strip()
+                    journal.add_description(title, description)
+                    checkpointer.add(title, description)
+                    break
+                except Exception as e:
+                    logger.error(f"Error generating description for {title} (attempt {attempt + 1}): {str(e)}")
+                    await asyncio.sleep(2 ** attempt)
+            done += 1
+            if done % 25 == 0 or done == len(titles):
+                elapsed = time.perf_counter() - started
+                logger.info(f"Progress: {done}/{len(titles)} ({done / elapsed:.1f}/s)")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+async def _wait_for_batch(http: httpx.AsyncClient, batch_id: str, poll_interval: float) -> Dict:
+    while True:
+        response = await http.get(f"/v1/messages/batches/{batch_id}")
+        response.raise_for_status()
+        batch = response.json()
+        if batch["processing_status"] == "ended":
+            return batch
+        logger.info(f"Batch {batch_id}: {batch.get('request_counts')}")
+        await asyncio.sleep(poll_interval)
+
+async def generate_with_batches(titles: List[str], journal: DescriptionJournal, checkpointer: Checkpointer, poll_interval: float) -> None:
+    """Generate descriptions through the Message Batches API.
+
+    Batches already submitted by an interrupted run (recorded in the
+    journal) are collected instead of being sent again.
+    """
+    headers = {
+        "x-api-key": os.getenv('ANTHROPIC_API_KEY') or "",
+        "anthropic-version": "2023-06-01",
+        "content-type": "application/json",
+    }
+    async with httpx.AsyncClient(base_url=ANTHROPIC_BASE_URL, headers=headers, timeout=120) as http:
+        submitted = {title for batch in journal.pending_batches for title in batch["custom_ids"].values()}
+        remaining = [title for title in titles if title not in submitted]
+        for start in range(0, len(remaining), BATCH_MAX_REQUESTS):
+            chunk = remaining[start:start + BATCH_MAX_REQUESTS]
+            custom_ids = {f"movie-{start + i}": title for i, title in enumerate(chunk)}
+            response = await http.post("/v1/messages/batches", json={"requests": [
+                {"custom_id": custom_id, "params": _description_params(title)} for custom_id, title in custom_ids.items()
+            ]})
+            response.raise_for_status()
+            batch_id = response.json()["id"]
+            journal.add_batch(batch_id, custom_ids)
+            logger.info(f"Submitted batch {batch_id} with {len(chunk)} requests")
+
+        for entry in journal.pending_batches:
+            custom_ids = entry["custom_ids"]
+            batch = await _wait_for_batch(http, entry["batch_id"], poll_interval)
+            response = await http.get(batch["results_url"])
+            response.raise_for_status()
+            failed = 0
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                title = custom_ids.get(result["custom_id"])
+                if title is None or title in journal.descriptions:
+                    continue
+                if result["result"]["type"] != "succeeded":
+                    failed += 1
+                    continue
+                description = result["result"]["message"]["content"][0]["text"].strip()
+                journal.add_description(title, description)
+                checkpointer.add(title, description)
+            checkpointer.flush()
+            journal.mark_collected(entry["batch_id"])
+            retry_note = f", {failed} failed requests are retried on the next run" if failed else ""
+            logger.info(f"Batch {entry['batch_id']} done{retry_note}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate missing movie descriptions")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    parser.add_argument("--rpm", type=float, default=50, help="requests per minute")
+    parser.add_argument("--checkpoint-every", type=int, default=25, help="descriptions per write to movies.yaml")
+    parser.add_argument("--batch", action="store_true", help="use the Message Batches API (half price, results within 24h)")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between batch status checks")
+    args = parser.parse_args()
+
+    journal = DescriptionJournal()
+    checkpointer = Checkpointer(args.checkpoint_every)
+    # Descriptions generated before an interruption are written first
+    for title, description in journal.descriptions.items():
+        checkpointer.add(title, description)
+    checkpointer.flush()
+
+    titles = [title for title in _titles_without_description() if title not in journal.descriptions]
+    logger.info(f"{len(titles)} movies need a description")
+    started = time.perf_counter()
+    try:
+        if args.batch:
+            asyncio.run(generate_with_batches(titles, journal, checkpointer, args.poll_interval))
+        else:
+            asyncio.run(generate_concurrently(titles, journal, checkpointer, args.concurrency, args.rpm))
+    finally:
+        checkpointer.flush()
+    if not journal.pending_batches:
+        journal.remove()
+
+    logger.info(f"Finished generating descriptions in {time.perf_counter() - started:.1f}s")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,104 @@
-from typing import Dict, List, Counter as CounterType, Deque
+from typing import Dict, Iterable, List, Optional, Counter as CounterType, Deque
 from collections import Counter, deque
-from config import logger
+from functools import lru_cache
+import threading
+from config import logger, log_sampled
+
+MOVIE_LISTS = ["watched", "want_to_watch", "not_interested", "undecided"]
 
 # Track the last 5 duplicate movies to avoid re-suggesting them
 recent_duplicates: Deque[tuple[str, str]] = deque(maxlen=5)  # (title, reason)
 
+LIKED_SCORE = 7  # Watched movies scored at least this count as liked
+
+def _watched_movies(data: Dict) -> List[Dict]:
+    """Return the watched movies, accepting the older {"movies": [...]} shape too."""
+    watched = data.get("watched") or []
+    if isinstance(watched, dict):
+        watched = watched.get("movies") or []
+    return watched
+
+class KeywordStats:
+    """Keyword counts over watched movies, split by liked and disliked scores.
+
+    Built once from the movie data, then kept current with apply() as
+    movies are added, re-scored, moved or deleted. The ranking of each side
+    is sorted on first read after a change, so reads between writes only
+    slice a list.
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, CounterType[str]] = {"liked": Counter(), "disliked": Counter()}
+        self._ranked: Dict[str, Optional[List[tuple[str, int]]]] = {"liked": None, "disliked": None}
+        self._lock = threading.Lock()  # Readers sort while request threads apply changes
+
+    @classmethod
+    def from_data(cls, data: Dict) -> "KeywordStats":
+        """Build the statistics over every watched movie in data."""
+        stats = cls()
+        for movie in _watched_movies(data):
+            stats._update(movie, 1)
+        return stats
+
+    @staticmethod
+    def _side(movie: Dict) -> str:
+        return "liked" if (movie.get("score") or 0) >= LIKED_SCORE else "disliked"
+
+    def _update(self, movie: Dict, sign: int) -> None:
+        keywords = movie.get("keywords")
+        if not keywords:
+            return
+        side = self._side(movie)
+        counts = self.counts[side]
+        with self._lock:
+            for keyword in keywords:
+                counts[keyword] += sign
+                if counts[keyword] <= 0:
+                    del counts[keyword]
+            self._ranked[side] = None
+
+    def add(self, list_name: str, movie: Dict) -> None:
+        """Count a movie added to list_name."""
+        if list_name == "watched":
+            self._update(movie, 1)
+
+    def remove(self, list_name: str, movie: Dict) -> None:
+        """Uncount a movie removed from list_name."""
+        if list_name == "watched":
+            self._update(movie, -1)
+
+    def apply(self, changes: Iterable[tuple[Optional[tuple[str, Dict]], Optional[tuple[str, Dict]]]]) -> None:
+        """Apply (old, new) movie changes recorded by a storage transaction.
+
+        Each side is a (list_name, movie) pair, or None for additions and
+        removals. A re-score or a move is the old movie replaced by the new one.
+        """
+        for old, new in changes:
+            if old:
+                self.remove(*old)
+            if new:
+                self.add(*new)
+
+    def top(self, side: str, limit: Optional[int] = None) -> List[tuple[str, int]]:
+        """Return (keyword, count) pairs of one side, most frequent first."""
+        with self._lock:
+            ranked = self._ranked[side]
+            if ranked is None:
+                ranked = sorted(self.counts[side].items(), key=lambda item: (-item[1], item[0]))
+                self._ranked[side] = ranked
+        return ranked if limit is None else ranked[:limit]
+
+    def as_dict(self, limit: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Return {"liked": {...}, "disliked": {...}}, most frequent keywords first."""
+        return {side: dict(self.top(side, limit)) for side in self.counts}
+
 def analyze_keywords(data: Dict) -> Dict[str, Dict[str, int]]:
-    """Analyze keyword frequency across watched movies with scores >= 7."""
-    keyword_counts = Counter()
-    disliked_keywords = Counter()
-    
-    if "watched" in data and isinstance(data["watched"], dict) and "movies" in data["watched"]:
-        for movie in data["watched"]["movies"]:
-            if movie.get("keywords"):
-                if movie.get("score", 0) >= 7:
-                    keyword_counts.update(movie["keywords"])
-                else:
-                    disliked_keywords.update(movie["keywords"])
-    
-    return {
-        "liked": dict(keyword_counts),
-        "disliked": dict(disliked_keywords)
-    }
+    """Analyze keyword frequency across watched movies with scores >= 7.
+
+    Storage engines keep a KeywordStats current; use their keyword_stats
+    instead when analyzing the stored data.
+    """
+    return KeywordStats.from_data(data).as_dict()
 
 def extract_year(title: str) -> tuple[str, str | None]:
     """Extract year from title if present."""
@@ -55,57 +132,135 @@ def normalize_title(title: str) -> str:
     
     return normalized.strip()
 
-def is_duplicate_movie(title: str | Dict, data: Dict, queued_movies: List[str]) -> tuple[bool, str | None]:
-    """Check if a movie is already in any list or queue."""
+@lru_cache(maxsize=16384)
+def title_keys(title: str) -> tuple[str, str]:
+    """Return (normalized title, normalized title without year) used for duplicate matching."""
+    base_title, _ = extract_year(title)
+    return normalize_title(title), normalize_title(base_title)
+
+class TitleIndex:
+    """Hash index from normalized titles to the lists holding them.
+
+    Keeps both the exact normalized title and the year-stripped base title,
+    so a duplicate check is two dict lookups instead of a scan over every
+    list. Built once from the movie data, then kept current with add(),
+    remove() and move() as movies change.
+    """
+
+    def __init__(self):
+        self.exact: Dict[str, CounterType[str]] = {}
+        self.base: Dict[str, CounterType[str]] = {}
+
+    @classmethod
+    def from_data(cls, data: Dict, list_names: Iterable[str] = MOVIE_LISTS) -> "TitleIndex":
+        """Build an index over every movie in data."""
+        index = cls()
+        for list_name in list_names:
+            for movie in data.get(list_name) or []:
+                index.add(movie["title"] if isinstance(movie, dict) else movie, list_name)
+        return index
+
+    def add(self, title: str, list_name: str) -> None:
+        """Record that list_name holds title."""
+        normalized, base = title_keys(title)
+        self.exact.setdefault(normalized, Counter())[list_name] += 1
+        self.base.setdefault(base, Counter())[list_name] += 1
+
+    def remove(self, title: str, list_name: str) -> None:
+        """Forget one occurrence of title in list_name."""
+        normalized, base = title_keys(title)
+        for table, key in ((self.exact, normalized), (self.base, base)):
+            lists = table.get(key)
+            if lists is None:
+                continue
+            lists[list_name] -= 1
+            if lists[list_name] <= 0:
+                del lists[list_name]
+            if not lists:
+                del table[key]
+
+    def move(self, title: str, old_list: str, new_list: str) -> None:
+        """Record that title moved from old_list to new_list."""
+        self.remove(title, old_list)
+        self.add(title, new_list)
+
+    def apply(self, changes: Iterable[tuple[str, Optional[str], Optional[str]]]) -> None:
+        """Apply (title, old_list, new_list) changes recorded by a storage transaction.
+
+        old_list is None for additions and new_list is None for removals.
+        """
+        for title, old_list, new_list in changes:
+            if old_list:
+                self.remove(title, old_list)
+            if new_list:
+                self.add(title, new_list)
+
+    def find_exact(self, title: str) -> Optional[str]:
+        """Return a list holding a movie with the same normalized title."""
+        lists = self.exact.get(title_keys(title)[0])
+        return next(iter(lists)) if lists else None
+
+    def find_similar(self, title: str) -> Optional[str]:
+        """Return a list holding a movie with the same title, ignoring the year."""
+        lists = self.base.get(title_keys(title)[1])
+        return next(iter(lists)) if lists else None
+
+    def contains(self, title: str) -> bool:
+        """Whether any list holds this movie or one with the same base title."""
+        normalized, base = title_keys(title)
+        return normalized in self.exact or base in self.base
+
+    def __len__(self) -> int:
+        return sum(sum(lists.values()) for lists in self.exact.values())
+
+def is_duplicate_movie(title: str | Dict, data: Dict, queued_movies: List[str], index: Optional[TitleIndex] = None) -> tuple[bool, str | None]:
+    """Check if a movie is already in any list or queue.
+
+    Pass the storage engine's maintained index to avoid building one from data.
+    """
     if isinstance(title, dict):
         title_str = title["title"]
     else:
         title_str = title
+    if index is None:
+        index = TitleIndex.from_data(data)
         
-    normalized_title = normalize_title(title_str)
-    base_title, year = extract_year(title_str)
-    logger.info(f"Checking for duplicate: {title} (normalized: {normalized_title})")
+    normalized_title, base_normalized = title_keys(title_str)
+    logger.debug(f"Checking for duplicate: {title} (normalized: {normalized_title})")
     
     def add_to_recent_duplicates(reason_msg: str) -> tuple[bool, str]:
         """Helper to track duplicate and return result."""
         recent_duplicates.append((title_str, reason_msg))
-        logger.info("Recent duplicate movies:")
-        for idx, (dup_title, dup_reason) in enumerate(recent_duplicates, 1):
-            logger.info(f"{idx}. {dup_title} - {dup_reason}")
+        log_sampled("recent_duplicates", f"{len(recent_duplicates)} recent duplicate movies, latest: {title_str} - {reason_msg}")
         return True, reason_msg
     
     # First check if it's in recent duplicates
     for dup_title, dup_reason in recent_duplicates:
-        if normalize_title(dup_title) == normalized_title:
+        if title_keys(dup_title)[0] == normalized_title:
             logger.info(f"Found in recent duplicates: {dup_title}")
             return True, f"Movie was recently rejected: {dup_reason}"
     
     # Check exact matches
-    for list_name in ["watched", "want_to_watch", "not_interested", "undecided"]:
-        for movie in data[list_name]:
-            if normalize_title(movie["title"]) == normalized_title:
-                logger.info(f"Exact match found: {movie['title']} in {list_name}")
-                return add_to_recent_duplicates(f"Movie already exists in {list_name} list")
+    list_name = index.find_exact(title_str)
+    if list_name:
+        logger.info(f"Exact match found: {title_str} in {list_name}")
+        return add_to_recent_duplicates(f"Movie already exists in {list_name} list")
     
     # Check queue
     for queued in queued_movies:
-        if normalize_title(queued) == normalized_title:
+        if title_keys(queued)[0] == normalized_title:
             logger.info(f"Exact match found in queue: {queued}")
             return add_to_recent_duplicates("Movie already exists in suggestion queue")
     
     # Check for similar titles (same name, different year)
-    base_normalized = normalize_title(base_title)
-    for list_name in ["watched", "want_to_watch", "not_interested", "undecided"]:
-        for movie in data[list_name]:
-            movie_base, _ = extract_year(movie["title"])
-            if normalize_title(movie_base) == base_normalized:
-                logger.info(f"Similar title found: {movie['title']} in {list_name}")
-                return add_to_recent_duplicates(f"Similar movie exists in {list_name} list")
+    list_name = index.find_similar(title_str)
+    if list_name:
+        logger.info(f"Similar title found: {title_str} in {list_name}")
+        return add_to_recent_duplicates(f"Similar movie exists in {list_name} list")
     
     # Check queue for similar titles
     for queued in queued_movies:
-        queued_base, _ = extract_year(queued)
-        if normalize_title(queued_base) == base_normalized:
+        if title_keys(queued)[1] == base_normalized:
             logger.info(f"Similar title found in queue: {queued}")
             return add_to_recent_duplicates("Similar movie exists in suggestion queue")
     
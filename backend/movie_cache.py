@@ -1,98 +1,589 @@
+import asyncio
+import atexit
 import json
 import os
 import hashlib
-from typing import Dict, List, Optional, Tuple
+import sqlite3
+import threading
+import sys
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from config import logger
+from movie_analysis import normalize_title, title_keys
+from movie_metrics import cache_lookup, timed
 
-CACHE_DIR = "cache/recommendations"
-REJECTS_FILE = "cache/recent_rejects.json"
+CACHE_DIR = "cache/recommendations"  # Per-title JSON files used before RECOMMENDATIONS_DB, migrated on startup
+RECOMMENDATIONS_DB = os.getenv("RECOMMENDATIONS_DB", "cache/recommendations.db")
+REJECTS_FILE = "cache/recent_rejects.json"  # Used before REJECTS_DB, imported on startup
+REJECTS_DB = os.getenv("REJECTS_DB", "cache/recent_rejects.db")
 MAX_RECENT_REJECTS = 50
+# Seconds between exchanging recent rejects with the other workers; negative keeps them per worker
+REJECTS_SYNC_INTERVAL = float(os.getenv("REJECTS_SYNC_INTERVAL", "2"))
+DETAILS_CACHE_DB = os.getenv("DETAILS_CACHE_DB", "cache/details.db")
+DETAILS_CACHE_TTL = float(os.getenv("DETAILS_CACHE_TTL", str(30 * 24 * 3600)))
+DETAILS_CACHE_SIZE = int(os.getenv("DETAILS_CACHE_SIZE", "5000"))
 
 def get_cache_path(title: str) -> str:
-    """Get the cache file path for a movie's recommendations."""
+    """Get the legacy cache file path for a movie's recommendations."""
     # Create hash of title for filename
     title_hash = hashlib.md5(title.encode()).hexdigest()
     return os.path.join(CACHE_DIR, f"{title_hash}.json")
 
 def ensure_cache_dir():
     """Ensure the cache directory exists."""
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    os.makedirs(os.path.dirname(REJECTS_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(REJECTS_DB), exist_ok=True)
 
-def load_recent_rejects() -> List[Tuple[str, str]]:
-    """Load the list of recently rejected movies."""
-    if not os.path.exists(REJECTS_FILE):
-        return []
-    try:
-        with open(REJECTS_FILE, 'r') as f:
-            rejects = json.load(f)
-            return [(r['title'], r['normalized']) for r in rejects]
-    except Exception as e:
-        logger.error(f"Error loading recent rejects: {str(e)}")
-        return []
+class _SqliteCache:
+    """Base for caches kept in an SQLite file shared by all workers."""
 
-def save_recent_rejects(rejects: List[Tuple[str, str]]):
-    """Save the list of recently rejected movies."""
-    try:
-        # Convert to list of dicts for JSON serialization
-        rejects_json = [{'title': title, 'normalized': norm} for title, norm in rejects]
-        with open(REJECTS_FILE, 'w') as f:
-            json.dump(rejects_json, f)
-    except Exception as e:
-        logger.error(f"Error saving recent rejects: {str(e)}")
+    SCHEMA = ""
 
-def add_to_recent_rejects(title: str, normalized: str):
-    """Add a movie to the recent rejects list."""
-    rejects = load_recent_rejects()
-    rejects.append((title, normalized))
-    if len(rejects) > MAX_RECENT_REJECTS:
-        rejects.pop(0)  # Remove oldest reject
-    save_recent_rejects(rejects)
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+class RecommendationStore(_SqliteCache):
+    """Related-movie recommendations for each source title, in one SQLite file.
+
+    Adding a recommendation is a single indexed insert, and a recommendation
+    is stored once per source title. The per-title JSON files in CACHE_DIR
+    are imported the first time the store is opened.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS recommendations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_title TEXT NOT NULL,
+        title TEXT NOT NULL,
+        data TEXT NOT NULL,
+        UNIQUE (source_title, title)
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path: str = RECOMMENDATIONS_DB, legacy_dir: Optional[str] = CACHE_DIR):
+        super().__init__(path)
+        if legacy_dir and os.path.isdir(legacy_dir):
+            self.migrate_directory(legacy_dir)
+
+    def get(self, source_title: str) -> List[Dict]:
+        """Return the recommendations for source_title, oldest first."""
+        rows = self._connect().execute(
+            "SELECT data FROM recommendations WHERE source_title = ? ORDER BY id", (source_title,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_unused(self, source_title: str, used_titles: Iterable[str]) -> List[Dict]:
+        """Return the recommendations for source_title whose titles aren't in used_titles."""
+        used = set(used_titles)
+        rows = self._connect().execute(
+            "SELECT title, data FROM recommendations WHERE source_title = ? ORDER BY id", (source_title,)
+        ).fetchall()
+        return [json.loads(data) for title, data in rows if title not in used]
+
+    def state(self) -> Tuple[int, int]:
+        """Return (highest id, row count), which changes whenever recommendations do."""
+        max_id, count = self._connect().execute("SELECT MAX(id), COUNT(*) FROM recommendations").fetchone()
+        return max_id or 0, count
+
+    def rows_after(self, after_id: int = 0) -> List[Tuple[int, Dict]]:
+        """Return (id, recommendation) for every recommendation added after after_id, oldest first."""
+        rows = self._connect().execute(
+            "SELECT id, data FROM recommendations WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+        return [(row_id, json.loads(data)) for row_id, data in rows]
+
+    def add(self, source_title: str, recommendation: Dict) -> None:
+        """Add a recommendation for source_title, ignoring titles it already has."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO recommendations (source_title, title, data) VALUES (?, ?, ?)",
+                (source_title, recommendation["title"], json.dumps(recommendation))
+            )
+
+    def replace(self, source_title: str, recommendations: List[Dict]) -> None:
+        """Replace all recommendations for source_title."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM recommendations WHERE source_title = ?", (source_title,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO recommendations (source_title, title, data) VALUES (?, ?, ?)",
+                [(source_title, r["title"], json.dumps(r)) for r in recommendations]
+            )
+
+    def compact(self, max_per_title: Optional[int] = None) -> int:
+        """Drop all but the newest max_per_title recommendations per title and reclaim space.
+
+        Returns the number of recommendations removed.
+        """
+        conn = self._connect()
+        removed = 0
+        if max_per_title is not None:
+            with conn:
+                removed = conn.execute(
+                    "DELETE FROM recommendations WHERE id IN ("
+                    "SELECT id FROM (SELECT id, ROW_NUMBER() OVER "
+                    "(PARTITION BY source_title ORDER BY id DESC) AS rank FROM recommendations) "
+                    "WHERE rank > ?)",
+                    (max_per_title,)
+                ).rowcount
+        conn.execute("VACUUM")
+        logger.info(f"Compacted {self.path}: removed {removed} recommendations")
+        return removed
+
+    def migrate_directory(self, directory: str) -> int:
+        """Import the per-title JSON files from directory once.
+
+        Returns the number of recommendations imported.
+        """
+        count = 0
+        marker = f"migrated:{os.path.abspath(directory)}"
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # Only one worker imports
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directory, filename), 'r') as f:
+                        cache = json.load(f)
+                    rows = [(cache['title'], r['title'], json.dumps(r)) for r in cache['recommendations']]
+                except Exception as e:
+                    logger.error(f"Skipping unreadable recommendation cache {filename}: {str(e)}")
+                    continue
+                count += conn.executemany(
+                    "INSERT OR IGNORE INTO recommendations (source_title, title, data) VALUES (?, ?, ?)", rows
+                ).rowcount
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(time.time())))
+        logger.info(f"Migrated {count} recommendations from {directory} to {self.path}; the directory can be deleted")
+        return count
 
 def load_cached_recommendations(title: str) -> Optional[List[Dict]]:
     """Load cached recommendations for a movie."""
-    cache_path = get_cache_path(title)
-    if not os.path.exists(cache_path):
-        return None
-    
-    try:
-        with open(cache_path, 'r') as f:
-            cache = json.load(f)
-            logger.info(f"Loaded {len(cache['recommendations'])} cached recommendations for {title}")
-            return cache['recommendations']
-    except Exception as e:
-        logger.error(f"Error loading cache for {title}: {str(e)}")
+    with timed("recommendations_read"):
+        recommendations = get_recommendation_store().get(title)
+    cache_lookup("recommendations", bool(recommendations))
+    if not recommendations:
         return None
+    logger.info(f"Loaded {len(recommendations)} cached recommendations for {title}")
+    return recommendations
 
 def save_recommendations(title: str, recommendations: List[Dict]):
     """Save recommendations to cache."""
-    ensure_cache_dir()
-    cache_path = get_cache_path(title)
-    
     try:
-        cache = {
-            'title': title,
-            'recommendations': recommendations
-        }
-        with open(cache_path, 'w') as f:
-            json.dump(cache, f, indent=2)
+        with timed("recommendations_write"):
+            get_recommendation_store().replace(title, recommendations)
         logger.info(f"Saved {len(recommendations)} recommendations for {title} to cache")
     except Exception as e:
         logger.error(f"Error saving cache for {title}: {str(e)}")
 
 def get_unused_recommendations(title: str, used_titles: List[str]) -> List[Dict]:
     """Get recommendations that haven't been used yet."""
-    cached = load_cached_recommendations(title)
-    if not cached:
-        return []
-    
-    # Filter out used recommendations
-    unused = [r for r in cached if r['title'] not in used_titles]
+    with timed("recommendations_read"):
+        unused = get_recommendation_store().get_unused(title, used_titles)
+    cache_lookup("recommendations", bool(unused))
     logger.info(f"Found {len(unused)} unused recommendations for {title}")
     return unused
 
 def add_recommendation(title: str, recommendation: Dict):
     """Add a single recommendation to the cache."""
-    cached = load_cached_recommendations(title) or []
-    cached.append(recommendation)
-    save_recommendations(title, cached)
+    try:
+        with timed("recommendations_write"):
+            get_recommendation_store().add(title, recommendation)
+    except Exception as e:
+        logger.error(f"Error saving cache for {title}: {str(e)}")
+
+async def aget_unused_recommendations(title: str, used_titles: List[str]) -> List[Dict]:
+    """Async version of get_unused_recommendations; SQLite is read in a worker thread."""
+    return await asyncio.to_thread(get_unused_recommendations, title, used_titles)
+
+async def aadd_recommendation(title: str, recommendation: Dict) -> None:
+    """Async version of add_recommendation; SQLite is written in a worker thread."""
+    await asyncio.to_thread(add_recommendation, title, recommendation)
+
+class RecentRejects(_SqliteCache):
+    """Ring buffer of the most recently rejected suggestions.
+
+    Checks and adds work on an in-memory deque with counts of the normalized
+    and year-stripped titles it holds, so a lookup is two dict lookups. The
+    buffer is persisted in an SQLite file: new rejects are written after
+    sync_interval seconds (and at exit), and the rejects written by other
+    workers are read back in when the buffer is used at least sync_interval
+    seconds after the last sync. Syncs run on a timer thread, so checks and
+    adds never wait on SQLite. With a negative sync_interval the rejects
+    are only loaded on startup and saved at exit.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rejects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        normalized TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path: str = REJECTS_DB, maxlen: int = MAX_RECENT_REJECTS, sync_interval: float = REJECTS_SYNC_INTERVAL, legacy_file: Optional[str] = REJECTS_FILE):
+        super().__init__(path)
+        self.maxlen = maxlen
+        self.sync_interval = sync_interval
+        self._rejects: deque[Tuple[str, str]] = deque()
+        self._keys: Counter[str] = Counter()  # Normalized and base titles in _rejects
+        self._pending: List[Tuple[str, str]] = []  # Not yet written to the database
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._synced_at = time.monotonic()
+        if legacy_file and os.path.exists(legacy_file):
+            self._migrate_file(legacy_file)
+        with self._lock:
+            self._reload()
+
+    def _append(self, title: str, normalized: str) -> None:
+        if len(self._rejects) >= self.maxlen:
+            old_title, old_normalized = self._rejects.popleft()
+            self._keys -= Counter((old_normalized, title_keys(old_title)[1]))  # Drops keys that reach zero
+        self._rejects.append((title, normalized))
+        self._keys.update((normalized, title_keys(title)[1]))
+
+    def _reload(self) -> None:
+        """Replace the buffer with the newest rejects in the database."""
+        rows = self._connect().execute(
+            "SELECT id, title, normalized FROM rejects ORDER BY id DESC LIMIT ?", (self.maxlen,)
+        ).fetchall()
+        self._rejects.clear()
+        self._keys.clear()
+        for _, title, normalized in reversed(rows):
+            self._append(title, normalized)
+        self._last_id = rows[0][0] if rows else 0
+
+    def _migrate_file(self, path: str) -> None:
+        """Import the rejects from the JSON file used before the database, once."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # Only one worker imports
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                return
+            try:
+                with open(path, 'r') as f:
+                    rows = [(r['title'], r['normalized']) for r in json.load(f)]
+            except Exception as e:
+                logger.error(f"Error loading recent rejects from {path}: {str(e)}")
+                rows = []
+            conn.executemany("INSERT INTO rejects (title, normalized) VALUES (?, ?)", rows[-self.maxlen:])
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (path,))
+        logger.info(f"Imported {len(rows)} recent rejects from {path}")
+
+    def _schedule_sync(self, delay: float) -> None:
+        """Start the timer thread that syncs, unless one is pending; the lock must be held."""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _maybe_sync(self) -> None:
+        """Sync in the background now if the last sync is sync_interval old; the caller uses the buffer as it is."""
+        if self.sync_interval >= 0 and time.monotonic() - self._synced_at >= self.sync_interval:
+            with self._lock:
+                self._schedule_sync(0)
+
+    def items(self) -> List[Tuple[str, str]]:
+        """Return the (title, normalized title) pairs, oldest first."""
+        self._maybe_sync()
+        with self._lock:
+            return list(self._rejects)
+
+    def titles(self) -> List[str]:
+        """Return the rejected titles, oldest first."""
+        return [title for title, _ in self.items()]
+
+    def contains(self, title: str) -> bool:
+        """Whether title or its year-stripped base title was recently rejected."""
+        normalized, base_normalized = title_keys(title)
+        self._maybe_sync()
+        with self._lock:
+            return self._keys[normalized] > 0 or self._keys[base_normalized] > 0
+
+    def add(self, title: str, normalized: str) -> None:
+        """Add a rejected title and schedule writing it."""
+        with self._lock:
+            self._append(title, normalized)
+            self._pending.append((title, normalized))
+            del self._pending[:-self.maxlen]  # Only the newest maxlen are ever kept
+            if self.sync_interval >= 0:
+                self._schedule_sync(self.sync_interval)
+
+    def sync(self, share: Optional[bool] = None) -> None:
+        """Write pending rejects and, when sharing, read the other workers' new ones."""
+        share = self.sync_interval >= 0 if share is None else share
+        with self._lock:
+            self._timer = None
+            self._synced_at = time.monotonic()
+            pending, self._pending = self._pending, []
+            try:
+                with timed("rejects_sync"), self._connect() as conn:
+                    conn.executemany("INSERT INTO rejects (title, normalized) VALUES (?, ?)", pending)
+                    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM rejects").fetchone()[0]
+                    conn.execute("DELETE FROM rejects WHERE id <= ?", (last_id - self.maxlen,))
+            except sqlite3.Error as e:
+                logger.error(f"Error saving recent rejects: {str(e)}")
+                self._pending = pending + self._pending
+                return
+            if share and last_id - self._last_id != len(pending):
+                self._reload()  # Another worker added rejects
+            else:
+                self._last_id = last_id
+
+    def flush(self) -> None:
+        """Write pending rejects without reading the other workers' ones."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self.sync(share=False)
+
+def load_recent_rejects() -> List[Tuple[str, str]]:
+    """Load the list of recently rejected movies."""
+    return get_recent_rejects().items()
+
+def add_to_recent_rejects(title: str, normalized: str):
+    """Add a movie to the recent rejects list."""
+    get_recent_rejects().add(title, normalized)
+
+class DetailsCache(_SqliteCache):
+    """Durable cache of AI-generated movie details, keyed by normalized title.
+
+    Entries live in an SQLite file shared by all workers, with the most
+    recently used ones also kept in memory so a hit doesn't touch the disk.
+    Entries expire after ttl seconds, and the least recently used ones are
+    evicted once there are more than max_entries. Concurrent misses for the
+    same title within a worker share one generation.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS details (
+        key TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_details_last_used ON details (last_used);
+    """
+
+    def __init__(self, path: str = DETAILS_CACHE_DB, ttl: float = DETAILS_CACHE_TTL, max_entries: int = DETAILS_CACHE_SIZE):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, Tuple[float, Dict]] = OrderedDict()  # key -> (expires_at, details)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "evicted": 0}
+
+    @staticmethod
+    def key(title: str) -> str:
+        """Return the cache key for a title."""
+        return hashlib.sha256(normalize_title(title).encode()).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, details: Dict) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, details)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_memory(self, key: str, now: float) -> Optional[Dict]:
+        """Return the details held in memory for key, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    cache_lookup("details", True)
+                    return entry[1]
+                del self._memory[key]
+        return None
+
+    def get(self, title: str) -> Optional[Dict]:
+        """Return the cached details for title, or None."""
+        key = self.key(title)
+        now = time.time()
+        details = self._get_memory(key, now)
+        if details is not None:
+            return details
+        return self._get_disk(title, key, now)
+
+    async def aget(self, title: str) -> Optional[Dict]:
+        """Async version of get; only a lookup that misses the memory waits on SQLite, in a worker thread."""
+        key = self.key(title)
+        now = time.time()
+        details = self._get_memory(key, now)
+        if details is not None:
+            return details
+        return await asyncio.to_thread(self._get_disk, title, key, now)
+
+    def _get_disk(self, title: str, key: str, now: float) -> Optional[Dict]:
+        """Look key up in the database and keep a hit in memory."""
+        conn = self._connect()
+        try:
+            with timed("details_cache_read"):
+                row = conn.execute("SELECT data, expires_at FROM details WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                with conn:
+                    conn.execute("DELETE FROM details WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                row = None
+            if row is not None:
+                with conn:
+                    conn.execute("UPDATE details SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error(f"Error reading details cache for {title}: {str(e)}")
+            row = None
+        if row is None:
+            self.stats["misses"] += 1
+            cache_lookup("details", False)
+            return None
+        details = json.loads(row[0])
+        self._remember(key, row[1], details)
+        self.stats["disk_hits"] += 1
+        cache_lookup("details", True)
+        return details
+
+    def put(self, title: str, details: Dict) -> None:
+        """Store details for title and evict the least recently used entries."""
+        key = self.key(title)
+        now = time.time()
+        self._remember(key, now + self.ttl, details)
+        self._put_disk(title, key, details, now)
+
+    async def aput(self, title: str, details: Dict) -> None:
+        """Async version of put; the details are served from memory at once and written to SQLite in a worker thread."""
+        key = self.key(title)
+        now = time.time()
+        self._remember(key, now + self.ttl, details)
+        await asyncio.to_thread(self._put_disk, title, key, details, now)
+
+    def _put_disk(self, title: str, key: str, details: Dict, now: float) -> None:
+        expires_at = now + self.ttl
+        conn = self._connect()
+        try:
+            with timed("details_cache_write"), conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO details (key, title, data, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, title, json.dumps(details), expires_at, now)
+                )
+                evicted = conn.execute(
+                    "DELETE FROM details WHERE key IN "
+                    "(SELECT key FROM details ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+            self.stats["evicted"] += evicted
+        except sqlite3.Error as e:
+            logger.error(f"Error saving details cache for {title}: {str(e)}")
+
+    async def get_or_create(self, title: str, generate: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Return the cached details for title, generating and storing them on a miss.
+
+        Callers missing on the same title at the same time await one shared
+        generation. Failed generations aren't cached.
+        """
+        details = await self.aget(title)
+        if details is not None:
+            return details
+
+        key = self.key(title)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(title, generate))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"Waiting for in-flight details of {title}")
+        # A cancelled caller (e.g. a closed connection) doesn't cancel the shared generation
+        return await asyncio.shield(future)
+
+    async def _generate(self, title: str, generate: Callable[[], Awaitable[Dict]]) -> Dict:
+        details = await generate()
+        await self.aput(title, details)
+        return details
+
+    def get_stats(self) -> Dict:
+        """Return hit/miss counters and the current size."""
+        stats = dict(self.stats)
+        with self._lock:
+            stats["memory_size"] = len(self._memory)
+        try:
+            stats["size"] = self._connect().execute("SELECT COUNT(*) FROM details").fetchone()[0]
+        except sqlite3.Error:
+            stats["size"] = None
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else None
+        stats["ttl"] = self.ttl
+        stats["max_entries"] = self.max_entries
+        return stats
+
+# Opened on first use, so importing the backend creates no files
+_caches: Dict[str, _SqliteCache] = {}
+_caches_lock = threading.Lock()
+
+def _get_cache(name: str, create: Callable[[], _SqliteCache]) -> _SqliteCache:
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = _caches[name] = create()
+    return cache
+
+def get_recommendation_store() -> RecommendationStore:
+    """Return the shared recommendation store, opening it on first use."""
+    return _get_cache("recommendations", RecommendationStore)
+
+def _create_recent_rejects() -> RecentRejects:
+    rejects = RecentRejects()
+    atexit.register(rejects.flush)
+    return rejects
+
+def get_recent_rejects() -> RecentRejects:
+    """Return the shared recent rejects buffer, loading it on first use."""
+    return _get_cache("recent_rejects", _create_recent_rejects)
+
+def get_details_cache() -> DetailsCache:
+    """Return the shared details cache, opening it on first use."""
+    return _get_cache("details", DetailsCache)
+
+def main(argv: List[str]) -> None:
+    command = argv[1] if len(argv) > 1 else "compact"
+    if command == "migrate":
+        directory = argv[2] if len(argv) > 2 else CACHE_DIR
+        count = get_recommendation_store().migrate_directory(directory)  # 0 if already imported
+        print(f"Imported {count} recommendations from {directory} into {RECOMMENDATIONS_DB}")
+    elif command == "compact":
+        max_per_title = int(argv[2]) if len(argv) > 2 else None
+        removed = get_recommendation_store().compact(max_per_title)
+        print(f"Removed {removed} recommendations, {RECOMMENDATIONS_DB} compacted")
+    else:
+        print("Usage: python movie_cache.py migrate [directory] | compact [max_per_title]")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,53 +1,432 @@
+import asyncio
 import json
 import os
-import random
+import time
 import traceback
-from datetime import datetime
-from typing import Dict, List, Tuple
-import openai
-import anthropic
-from config import logger
-from movie_analysis import analyze_keywords, normalize_title, extract_year
-
-# AI Provider Configuration
-AI_PROVIDER = "openai"  # Options: "anthropic" or "openai"
-
-# Load environment variables
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from config import logger, log_prompt
+from ai_providers import AI_PROVIDER, get_client, require_provider
+from movie_analysis import KeywordStats, title_keys, TitleIndex
+from movie_metrics import inc, observe, timed
+from movie_prompts import CHARS_PER_TOKEN, SuggestionPrompt, details_prompt
+from movie_ranking import candidate_ranker
+from movie_stream import JSONFieldParser, estimate_savings, record_complete, record_request, record_savings
+
+# Model used with each provider
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-
-# Initialize clients based on provider
-if AI_PROVIDER == "openai":
-    if not OPENAI_API_KEY:
-        raise ValueError("OPENAI_API_KEY environment variable is required when using OpenAI")
-    openai.api_key = OPENAI_API_KEY
-    openai.base_url = OPENAI_BASE_URL
-elif AI_PROVIDER == "anthropic":
-    if not ANTHROPIC_API_KEY:
-        raise ValueError("ANTHROPIC_API_KEY environment variable is required when using Anthropic")
-    anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-else:
-    raise ValueError("AI_PROVIDER must be either 'anthropic' or 'openai'")
-
-# Ensure logs directory exists
-os.makedirs('logs', exist_ok=True)
-
-def _log_prompt(prompt: str) -> None:
-    """Log the prompt to a file with timestamp."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"logs/prompt_{timestamp}.txt"
+ANTHROPIC_MODEL = "claude-3-7-sonnet-20250219"
+# Concurrent provider requests per attempt round (async path), and candidates
+# requested per provider call. The first valid candidate is returned; the
+# other valid ones are handed to the caller's on_leftover callback.
+SUGGESTION_FANOUT = int(os.getenv("SUGGESTION_FANOUT", "1"))
+SUGGESTION_BATCH_SIZE = int(os.getenv("SUGGESTION_BATCH_SIZE", "1"))
+# Whether single-candidate requests with duplicate rejection stream the
+# response, so a duplicate title stops the generation as soon as it is
+# parsed. 0 waits for complete responses.
+SUGGESTION_STREAMING = int(os.getenv("SUGGESTION_STREAMING", "1"))
+
+# Fail on startup rather than on the first suggestion; the provider's SDK
+# is only imported when its client is first needed (see ai_providers)
+require_provider(AI_PROVIDER)
+
+from movie_cache import get_recent_rejects, add_to_recent_rejects
+
+def _prompt_builder(data: Dict, title: str = None, previous_suggestions: List[str] = None, reject_duplicates: bool = False, keyword_stats: KeywordStats = None, shortlist: List[str] = None) -> Callable[[], str]:
+    """Return a function building each attempt's prompt; the static part is built once per call."""
+    if title and not previous_suggestions:
+        # For specific movie details
+        prompt = details_prompt(title)
+        return lambda: prompt
+    # For generating related movies or suggestions
+    with timed("prompt_build"):
+        suggestion_prompt = SuggestionPrompt(data, title, previous_suggestions, keyword_stats, shortlist=shortlist)
+    logger.info(f"Suggestion prompt: {suggestion_prompt.summary()}")
+
+    def build() -> str:
+        # Recent rejects are re-read on each attempt to explicitly tell the AI not to suggest them
+        with timed("prompt_render"):
+            return suggestion_prompt.render(get_recent_rejects().titles() if reject_duplicates else ())
+    return build
+
+def _batch_prompt(prompt: str, count: int) -> str:
+    """Ask for count candidates instead of one."""
+    if count <= 1:
+        return prompt
+    return prompt + f"""
+
+Instead of a single object, return a raw JSON array of {count} different movies, each object in the format above."""
+
+def _request_kwargs(prompt: str, count: int = 1) -> Dict:
+    """Return the arguments for the configured provider's create() call."""
+    if AI_PROVIDER == "anthropic":
+        return {
+            "model": ANTHROPIC_MODEL,
+            "max_tokens": 500 * count,
+            "temperature": 0.7,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+    return {
+        "model": OPENAI_MODEL,
+        "temperature": 0.7,
+        "messages": [{
+            "role": "user",
+            "content": prompt
+        }]
+    }
+
+def _create(client, prompt: str, count: int = 1, **options):
+    """Call the provider's create() on client (a coroutine for async clients)."""
+    if AI_PROVIDER == "anthropic":
+        return client.messages.create(**_request_kwargs(prompt, count), **options)
+    if options.get("stream"):
+        # Have the last chunk report the usage (passed as extra_body for older SDKs)
+        options["extra_body"] = {"stream_options": {"include_usage": True}}
+    return client.chat.completions.create(**_request_kwargs(prompt, count), **options)
+
+def _usage_tokens(usage) -> Tuple[int, int]:
+    """Return the (prompt, completion) tokens of a provider's usage report."""
+    if usage is None:
+        return 0, 0
+    if AI_PROVIDER == "anthropic":
+        return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+def _record_tokens(prompt_tokens: int, completion_tokens: int) -> None:
+    if prompt_tokens:
+        inc("movie_tracker_llm_tokens_total", prompt_tokens, provider=AI_PROVIDER, direction="prompt")
+    if completion_tokens:
+        inc("movie_tracker_llm_tokens_total", completion_tokens, provider=AI_PROVIDER, direction="completion")
+
+def _response_text(message) -> str:
+    """Extract the completion text from a provider response."""
+    usage = getattr(message, "usage", None)
+    _record_tokens(*_usage_tokens(usage))
+    if AI_PROVIDER == "anthropic":
+        prompt_tokens = getattr(usage, "input_tokens", None)
+        logger.info(f"Received Anthropic response for suggestion. Content length: {len(message.content[0].text)}, prompt tokens: {prompt_tokens}")
+        return message.content[0].text.strip()
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    logger.info(f"Received OpenAI response for suggestion. Content length: {len(message.choices[0].message.content)}, prompt tokens: {prompt_tokens}")
+    return message.choices[0].message.content.strip()
+
+def _complete(prompt: str, count: int = 1) -> str:
+    """Send the prompt to the configured provider and return the response text."""
+    log_prompt(prompt, provider=AI_PROVIDER)
+    logger.info(f"Sending AI request for suggestion with prompt length: {len(prompt)}")
+    with timed("llm"):
+        message = _create(get_client(), prompt, count)
+    return _response_text(message)
+
+async def _acomplete(prompt: str, count: int = 1) -> str:
+    """Async version of _complete using the shared async client, whose HTTP connections are pooled."""
+    log_prompt(prompt, provider=AI_PROVIDER)
+    logger.info(f"Sending async AI request for suggestion with prompt length: {len(prompt)}")
+    with timed("llm"):
+        message = await _create(get_client(asynchronous=True), prompt, count)
+    return _response_text(message)
+
+def _event_text(event) -> str:
+    """Return the text a provider stream event adds to the response."""
+    if AI_PROVIDER == "anthropic":
+        return (getattr(event.delta, "text", None) or "") if event.type == "content_block_delta" else ""
+    return (event.choices[0].delta.content or "") if event.choices else ""
+
+class _StreamUsage:
+    """Time and tokens of a streamed request.
+
+    Tokens are taken from the provider's usage reports; a stream closed
+    before they arrive (an abandoned duplicate) is counted from the length
+    of the prompt and of the text received.
+    """
+
+    def __init__(self, prompt: str):
+        self.prompt_chars = len(prompt)
+        self.chars = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.start = time.perf_counter()
+
+    def add(self, event, text: str) -> None:
+        self.chars += len(text)
+        if AI_PROVIDER == "anthropic":
+            if event.type == "message_start":
+                self.prompt_tokens = _usage_tokens(event.message.usage)[0]
+            elif event.type == "message_delta":
+                self.completion_tokens = _usage_tokens(event.usage)[1]
+        elif getattr(event, "usage", None) is not None:
+            self.prompt_tokens, self.completion_tokens = _usage_tokens(event.usage)
+
+    def record(self) -> None:
+        observe("movie_tracker_stage_duration_seconds", time.perf_counter() - self.start, stage="llm_stream")
+        _record_tokens(self.prompt_tokens or -(-self.prompt_chars // CHARS_PER_TOKEN),
+                       self.completion_tokens or -(-self.chars // CHARS_PER_TOKEN))
+
+def _stream(prompt: str) -> Iterator[str]:
+    """Send the prompt with the provider's streaming API and yield the response text as it arrives.
+
+    Closing the generator early closes the upstream response, which stops
+    the generation.
+    """
+    log_prompt(prompt, provider=AI_PROVIDER)
+    logger.info(f"Sending streaming AI request for suggestion with prompt length: {len(prompt)}")
+    usage = _StreamUsage(prompt)
+    stream = _create(get_client(), prompt, stream=True)
+    try:
+        for event in stream:
+            text = _event_text(event)
+            usage.add(event, text)
+            if text:
+                yield text
+    finally:
+        stream.close()
+        usage.record()
+
+async def _astream(prompt: str) -> AsyncIterator[str]:
+    """Async version of _stream using the shared async client."""
+    log_prompt(prompt, provider=AI_PROVIDER)
+    logger.info(f"Sending async streaming AI request for suggestion with prompt length: {len(prompt)}")
+    usage = _StreamUsage(prompt)
+    stream = await _create(get_client(asynchronous=True), prompt, stream=True)
+    try:
+        async for event in stream:
+            text = _event_text(event)
+            usage.add(event, text)
+            if text:
+                yield text
+    finally:
+        await stream.close()
+        usage.record()
+
+def _parse_suggestion(response_text: str) -> Dict | List[Dict]:
+    """Parse the JSON suggestion (or array of suggestions) out of a response."""
+    # Remove markdown code blocks if present
+    if response_text.startswith("```") and "```" in response_text[3:]:
+        # Extract content between first ``` and last ```
+        first_marker = response_text.find("```")
+        last_marker = response_text.rfind("```")
+        # Skip the first line if it contains language specification (e.g., ```json)
+        content_start = response_text.find("\n", first_marker) + 1
+        content_end = last_marker
+        response_text = response_text[content_start:content_end].strip()
+    
+    # Try to parse the JSON
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {str(e)}")
+        logger.error(f"Response text: {response_text}")
+        raise
+
+def _duplicate_reason(suggested_title: str, title_index: TitleIndex) -> Optional[str]:
+    """Return why a suggested title is a duplicate, or None if it isn't."""
+    with timed("duplicate_check"):
+        # First check recent rejects, both exact matches and similar titles
+        if get_recent_rejects().contains(suggested_title):
+            reason = "recently rejected"
+            logger.warning(f"AI suggested a recently rejected movie: {suggested_title}")
+        # Then check all user lists
+        elif title_index.contains(suggested_title):
+            reason = "already in your lists"
+            logger.warning(f"AI suggested a movie that's already in user's lists: {suggested_title}")
+        else:
+            return None
+    inc("movie_tracker_suggestion_rejections_total", reason=reason)
+    return reason
+
+def _accept_suggestion(suggestion: Dict, data: Dict, title: str, reject_duplicates: bool, title_index: TitleIndex) -> bool:
+    """Check a suggestion against the duplicate and keyword rules.
+
+    Rejected suggestions are added to the recent rejects.
+    """
+    suggested_title = suggestion['title']
+    logger.info(f"AI suggested movie: {suggested_title}")
+
+    if reject_duplicates:
+        # Check if this movie was recently rejected or exists in any list
+        suggested_normalized = title_keys(suggested_title)[0]
+        if _duplicate_reason(suggested_title, title_index):
+            # Add to recent rejects if it's not already in the list
+            add_to_recent_rejects(suggested_title, suggested_normalized)
+            return False
+
+    if not title and reject_duplicates:  # Only validate keywords for suggestions with duplicate rejection
+        # Verify keywords match preferences if any are specified
+        preferred_keywords = data["preferences"]["keywords"]
+        if preferred_keywords and not any(k in suggestion['keywords'] for k in preferred_keywords):
+            logger.warning(f"Suggested movie {suggestion['title']} doesn't match any preferred keywords")
+            inc("movie_tracker_suggestion_rejections_total", reason="no preferred keyword")
+            add_to_recent_rejects(suggested_title, suggested_normalized)  # Add to rejects since it didn't match requirements
+            return False
+
+    return True
+
+def _known_candidate(data: Dict, title_index: TitleIndex, keyword_stats: Optional[KeywordStats]) -> Tuple[Optional[Dict], List[str], KeywordStats]:
+    """Look for a suggestion among the cached recommendations before asking the AI provider.
+
+    Returns (movie to serve, shortlist for the prompt, keyword stats used).
+    """
+    keyword_stats = keyword_stats or KeywordStats.from_data(data)
+    preferred_keywords = data["preferences"]["keywords"]
+
+    def accept(movie: Dict) -> bool:
+        if get_recent_rejects().contains(movie["title"]) or title_index.contains(movie["title"]):
+            return False
+        return not preferred_keywords or any(k in movie.get("keywords", []) for k in preferred_keywords)
+
+    known, shortlist = candidate_ranker.pick(keyword_stats, accept)
+    return known, shortlist, keyword_stats
+
+def _record_outcome(title: Optional[str], previous_suggestions: Optional[List[str]], outcome: str, attempts: int = 0) -> None:
+    """Count how a generation ended and, when the AI provider was asked, the retries it took."""
+    kind = "details" if title and not previous_suggestions else "related" if title else "suggestion"
+    inc("movie_tracker_suggestions_total", kind=kind, outcome=outcome)
+    if attempts:
+        observe("movie_tracker_suggestion_retries", attempts - 1, kind=kind, outcome=outcome)
+
+def _parse_candidates(response_text: str) -> List[Dict]:
+    """Parse a response into a list of candidate suggestions."""
+    parsed = _parse_suggestion(response_text)
+    return parsed if isinstance(parsed, list) else [parsed]
+
+class _StreamedCandidate:
+    """A candidate being streamed: parses its fields as they arrive and stops at a duplicate title."""
+
+    def __init__(self, reject_duplicates: bool, title_index: Optional[TitleIndex]):
+        self.reject_duplicates = reject_duplicates
+        self.title_index = title_index
+        self.parser = JSONFieldParser()
+        self.title: Optional[str] = None
+        self.duplicate: Optional[str] = None  # Why the title is a duplicate
+        self._chars = 0
+        self._first_chunk: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the rest of the response isn't needed."""
+        return self.duplicate is not None or self.parser.done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Parse streamed text and return the (name, value) of the fields it completed, up to a duplicate title."""
+        if self._first_chunk is None:
+            self._first_chunk = time.perf_counter()
+        self._chars += len(chunk)
+        fields = []
+        for _, name, value in self.parser.feed(chunk):
+            if name == "title":
+                self.title = value
+                if self.reject_duplicates:
+                    self.duplicate = _duplicate_reason(value, self.title_index)
+                    if self.duplicate:
+                        break
+            fields.append((name, value))
+        return fields
+
+    def _progress(self) -> Tuple[int, float]:
+        """Return the (output tokens, ms since the first chunk) received so far."""
+        ms = (time.perf_counter() - self._first_chunk) * 1000 if self._first_chunk else 0.0
+        return -(-self._chars // CHARS_PER_TOKEN), ms
+
+    def abandon(self, saved: Dict) -> None:
+        """Reject the duplicate and add what finishing it would have cost to saved."""
+        add_to_recent_rejects(self.title, title_keys(self.title)[0])
+        tokens, ms = estimate_savings(*self._progress())
+        saved["aborted"] += 1
+        saved["tokens"] += tokens
+        saved["ms"] += ms
+        logger.info(f"Abandoned duplicate {self.title} ({self.duplicate}) after {self._progress()[0]} output tokens")
+
+    def value(self) -> Any:
+        """Parse the complete response, recording its length and generation time."""
+        value = self.parser.value()
+        record_complete(*self._progress())
+        return value
+
+def _stream_candidates(prompt: str, title_index: TitleIndex, saved: Dict) -> List[Dict]:
+    """Request one candidate with the streaming API, abandoning it as soon as its title is a duplicate.
+
+    Returns the candidate in a list like _parse_candidates, or an empty list
+    for a duplicate.
+    """
+    candidate = _StreamedCandidate(True, title_index)
+    chunks = _stream(prompt)
+    try:
+        for chunk in chunks:
+            candidate.feed(chunk)
+            if candidate.finished:
+                break
+    finally:
+        chunks.close()
+    if candidate.duplicate:
+        candidate.abandon(saved)
+        return []
+    value = candidate.value()
+    return value if isinstance(value, list) else [value]
+
+async def _astream_candidates(prompt: str, title_index: TitleIndex, saved: Dict) -> List[Dict]:
+    """Async version of _stream_candidates."""
+    candidate = _StreamedCandidate(True, title_index)
+    chunks = _astream(prompt)
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(prompt)
-        logger.info(f"Prompt logged to {filename}")
-    except Exception as e:
-        logger.error(f"Failed to log prompt: {str(e)}")
+        async for chunk in chunks:
+            candidate.feed(chunk)
+            if candidate.finished:
+                break
+    finally:
+        await chunks.aclose()
+    if candidate.duplicate:
+        candidate.abandon(saved)
+        return []
+    value = candidate.value()
+    return value if isinstance(value, list) else [value]
+
+class _CandidatePicker:
+    """Keeps the first valid candidate and hands later valid ones to on_leftover."""
+
+    def __init__(self, data: Dict, title: str, reject_duplicates: bool, title_index: TitleIndex, on_leftover: Optional[Callable[[Dict], None]]):
+        self.data = data
+        self.title = title
+        self.reject_duplicates = reject_duplicates
+        self.title_index = title_index
+        self.on_leftover = on_leftover
+        self.result: Optional[Dict] = None
+        self._seen: set[str] = set()
 
-from movie_cache import load_recent_rejects, add_to_recent_rejects
+    def offer(self, candidates: List[Dict]) -> None:
+        for candidate in candidates:
+            normalized = title_keys(candidate['title'])[0]
+            if normalized in self._seen:
+                continue
+            if self.result is not None and self.on_leftover is None:
+                return
+            if not _accept_suggestion(candidate, self.data, self.title, self.reject_duplicates, self.title_index):
+                continue
+            self._seen.add(normalized)
+            if self.result is None:
+                self.result = candidate
+            else:
+                logger.info(f"Keeping leftover suggestion: {candidate['title']}")
+                try:
+                    self.on_leftover(candidate)
+                except Exception as e:
+                    logger.error(f"Error keeping leftover suggestion: {str(e)}")
+
+    def offer_task(self, task: asyncio.Task) -> None:
+        """Done-callback for provider requests still running after a result was found."""
+        _background_tasks.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        try:
+            self.offer(task.result())
+        except Exception as e:
+            logger.error(f"Error in background suggestion attempt: {str(e)}")
+
+# Keeps outstanding provider requests alive after their round returned
+_background_tasks: set[asyncio.Task] = set()
 
-def generate_single_suggestion(data: Dict, max_retries: int = 30, title: str = None, previous_suggestions: List[str] = None, reject_duplicates: bool = False) -> Dict:
+def generate_single_suggestion(data: Dict, max_retries: int = 30, title: str = None, previous_suggestions: List[str] = None, reject_duplicates: bool = False, title_index: TitleIndex = None, keyword_stats: KeywordStats = None, batch_size: int = SUGGESTION_BATCH_SIZE, on_leftover: Callable[[Dict], None] = None) -> Dict:
     """Generate a single movie suggestion or get details for a specific movie.
     
     Args:
@@ -56,237 +435,209 @@ def generate_single_suggestion(data: Dict, max_retries: int = 30, title: str = N
         title: Optional specific movie title to get details for
         previous_suggestions: Optional list of previously suggested movies to avoid
         reject_duplicates: Whether to reject movies that are duplicates or in user's lists
+        title_index: Optional maintained index of the titles in data, built from data if omitted
+        keyword_stats: Optional maintained keyword statistics of data, built from data if omitted
+        batch_size: Candidates to request per provider call (ignored for movie details)
+        on_leftover: Called with each valid candidate after the first
+
+    With reject_duplicates and one candidate per call, responses are
+    streamed (see SUGGESTION_STREAMING): a duplicate title ends its
+    generation as soon as it is parsed and the next attempt starts, and the
+    output tokens and time that saved are recorded.
     """
     logger.info("Starting suggestion generation")
+    if reject_duplicates and title_index is None:
+        title_index = TitleIndex.from_data(data)
+    if title and not previous_suggestions:
+        batch_size = 1
+    picker = _CandidatePicker(data, title, reject_duplicates, title_index, on_leftover)
+    shortlist = []
+    if reject_duplicates and not title:
+        known, shortlist, keyword_stats = _known_candidate(data, title_index, keyword_stats)
+        if known:
+            _record_outcome(title, previous_suggestions, "local")
+            return known
+    build_prompt = _prompt_builder(data, title, previous_suggestions, reject_duplicates, keyword_stats, shortlist)
+    streaming = SUGGESTION_STREAMING and reject_duplicates and batch_size == 1
+    saved = {"aborted": 0, "tokens": 0, "ms": 0.0}
     
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Attempt {attempt + 1} of {max_retries}")
-            
-            if title and not previous_suggestions:
-                # For specific movie details
-                prompt = f"""You are a movie expert. For the movie "{title}", provide detailed information as a raw JSON object (not in markdown code blocks) in this exact format:
-{{
-  "title": "Movie Title (YEAR)",
-  "description": "2-3 sentence description focusing on what makes this movie special",
-  "keywords": ["keyword1", "keyword2", "keyword3"],
-  "credits": {{
-    "directors": ["name1", "name2"],
-    "cast": ["name1", "name2", "name3", "name4"],
-    "writers": ["name1", "name2"]
-  }}
-}}
-
-Requirements:
-1. Include the year in the title (e.g., "The Matrix (1999)")
-2. The description should highlight key aspects like plot elements, themes, or stylistic choices
-3. The keywords must accurately describe the movie's themes, genres, and notable elements
-4. Include all major cast and crew members"""
-            else:
-                # For generating related movies or suggestions
-                keyword_analysis = analyze_keywords(data)
-                
-                # Add previous suggestions to avoid duplicates
-                previous_suggestions_str = ""
-                if previous_suggestions:
-                    previous_suggestions_str = f"\n\nIMPORTANT: DO NOT suggest any of these previously suggested related movies:\n{', '.join(previous_suggestions)}"
-                
-                # Helper function to shuffle a list while preserving the original
-                def shuffled_copy(items):
-                    items_copy = items.copy()
-                    random.shuffle(items_copy)
-                    return items_copy
-                
-                logger.info(f"Keyword analysis - Liked: {len(keyword_analysis['liked'])}, Disliked: {len(keyword_analysis['disliked'])}")
-                
-                # Get user preferences
-                preferred_genres = data["preferences"]["genres"]
-                preferred_keywords = data["preferences"]["keywords"]
-                user_comments = data["preferences"].get("comments")
-
-                # Build preference strings
-                genre_str = f"\nPreferred Genres: {', '.join(preferred_genres)}" if preferred_genres else ""
-                keyword_str = f"\nPreferred Keywords: {', '.join(preferred_keywords)}" if preferred_keywords else ""
-                comments_str = f"\nUser Comments: {user_comments}" if user_comments else ""
-
-                # Build keyword requirements string
-                keyword_requirements = ""
-                if preferred_keywords:
-                    keyword_requirements = f"\nIMPORTANT: The suggested movie MUST include at least one of these keywords: {', '.join(preferred_keywords)}"
-
-                # Get recent rejects to explicitly tell AI not to suggest them if rejecting duplicates
-                recent_rejects_str = ""
-                if reject_duplicates:
-                    recent_rejects = load_recent_rejects()
-                    recent_reject_titles = [title for title, _ in recent_rejects]
-                    if recent_reject_titles:
-                        recent_rejects_str = f"\n\nCRITICAL - DO NOT SUGGEST THESE RECENTLY REJECTED MOVIES:\n{', '.join(recent_reject_titles)}"
-
-                # Create shuffled copies of all movie lists
-                watched_shuffled = shuffled_copy([m for m in data["watched"] if m.get("score") is not None])
-                want_to_watch_shuffled = shuffled_copy(data["want_to_watch"])
-                undecided_shuffled = shuffled_copy(data["undecided"])
-                not_interested_shuffled = shuffled_copy(data["not_interested"])
-                
-                # Randomize the order of keywords
-                liked_keywords = list(keyword_analysis['liked'].items())
-                disliked_keywords = list(keyword_analysis['disliked'].items())
-                random.shuffle(liked_keywords)
-                random.shuffle(disliked_keywords)
-                liked_keywords_dict = dict(liked_keywords)
-                disliked_keywords_dict = dict(disliked_keywords)
-                
-                prompt = f"""You are a movie expert. Based on the user's movie preferences:
-
-IMPORTANT: You must NOT suggest any movies that were recently rejected.{recent_rejects_str}{previous_suggestions_str}
-
-{f'For a movie similar to "{title}", suggest a related movie based on these preferences:' if title else 'Based on these preferences, suggest a movie that matches the user\'s interests.'}
-
-Movie History:
-- Watched Movies (with scores):
-{', '.join(f"{m['title']} ({m['score']}/10)" for m in watched_shuffled)}
-- Want to Watch: {', '.join(m["title"] for m in want_to_watch_shuffled)}
-- Undecided About: {', '.join(m["title"] for m in undecided_shuffled)}
-- Not Interested In: {', '.join(m["title"] for m in not_interested_shuffled)}
-{genre_str}{keyword_str}
-
-Keyword Analysis:
-- Keywords from Highly Rated Movies: {json.dumps(liked_keywords_dict)}
-- Keywords from Lower Rated Movies: {json.dumps(disliked_keywords_dict)}{keyword_requirements}
-
-Based on these preferences, suggest a movie that matches the user's interests. Return ONLY a raw JSON object (not in markdown code blocks) in this exact format:
-{{
-  "title": "Movie Title (YEAR)",
-  "description": "2-3 sentence description focusing on what makes this movie special",
-  "keywords": ["keyword1", "keyword2", "keyword3"],
-  "credits": {{
-    "directors": ["name1", "name2"],
-    "cast": ["name1", "name2", "name3", "name4"],
-    "writers": ["name1", "name2"]
-  }}
-}}
-
-Requirements:
-1. Include the year in the title (e.g., "The Matrix (1999)")
-2. Do not suggest any movies from the lists above
-3. If preferred keywords are specified, the movie MUST match at least one of them
-4. Weight the user's preferences:
-   - Highly rated watched movies are strong positive indicators
-   - Movies in "Want to Watch" suggest interest in similar films
-   - Movies in "Not Interested" indicate strong negative preferences
-   - "Undecided" movies should be considered neutral
-   - Preferred genres should heavily influence suggestions
-5. The keywords you provide must be accurate and descriptive, as they will be used for future matching"""
-
-            # Log the prompt before sending
-            _log_prompt(prompt)
-            logger.info(f"Sending AI request for suggestion with prompt length: {len(prompt)}")
-            if AI_PROVIDER == "anthropic":
-                message = anthropic_client.messages.create(
-                    model="claude-3-7-sonnet-20250219",
-                    max_tokens=500,
-                    temperature=0.7,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }]
-                )
-                logger.info(f"Received Anthropic response for suggestion. Content length: {len(message.content[0].text)}")
-                response_text = message.content[0].text.strip()
-            else:  # OpenAI
-                message = openai.chat.completions.create(
-                    model=OPENAI_MODEL,
-                    temperature=0.7,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }]
-                )
-                logger.info(f"Received OpenAI response for suggestion. Content length: {len(message.choices[0].message.content)}")
-                response_text = message.choices[0].message.content.strip()
-            
-            # Remove markdown code blocks if present
-            if response_text.startswith("```") and "```" in response_text[3:]:
-                # Extract content between first ``` and last ```
-                first_marker = response_text.find("```")
-                last_marker = response_text.rfind("```")
-                # Skip the first line if it contains language specification (e.g., ```json)
-                content_start = response_text.find("\n", first_marker) + 1
-                content_end = last_marker
-                response_text = response_text[content_start:content_end].strip()
-            
-            # Try to parse the JSON
+    try:
+        for attempt in range(max_retries):
             try:
-                suggestion = json.loads(response_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parsing error: {str(e)}")
-                logger.error(f"Response text: {response_text}")
-                raise
-            suggested_title = suggestion['title']
-            logger.info(f"AI suggested movie: {suggested_title}")
-
-            if reject_duplicates:
-                # Check if this movie was recently rejected or exists in any list
-                suggested_normalized = normalize_title(suggested_title)
-                suggested_base, _ = extract_year(suggested_title)
-                suggested_base_normalized = normalize_title(suggested_base)
-                
-                # First check recent rejects
-                is_duplicate = False
-                recent_rejects = load_recent_rejects()
-                for rejected_title, rejected_normalized in recent_rejects:
-                    rejected_base, _ = extract_year(rejected_title)
-                    rejected_base_normalized = normalize_title(rejected_base)
-                    
-                    # Check both exact matches and similar titles
-                    if suggested_normalized == rejected_normalized or suggested_base_normalized == rejected_base_normalized:
-                        logger.warning(f"AI suggested a recently rejected movie: {suggested_title} (matches {rejected_title})")
-                        is_duplicate = True
-                        break
-                
-                # Then check all user lists
-                if not is_duplicate:
-                    # Helper function to check if movie exists in a list
-                    def movie_exists_in_list(movie_list):
-                        for m in movie_list:
-                            m_title = m.get('title', '')  # Handle both dict and string formats
-                            if isinstance(m, str):
-                                m_title = m
-                            m_normalized = normalize_title(m_title)
-                            m_base, _ = extract_year(m_title)
-                            m_base_normalized = normalize_title(m_base)
-                            
-                            if suggested_normalized == m_normalized or suggested_base_normalized == m_base_normalized:
-                                return True
-                        return False
-                    
-                    # Check each list
-                    if (movie_exists_in_list(data["watched"]) or
-                        movie_exists_in_list(data["want_to_watch"]) or
-                        movie_exists_in_list(data["undecided"]) or
-                        movie_exists_in_list(data["not_interested"])):
-                        logger.warning(f"AI suggested a movie that's already in user's lists: {suggested_title}")
-                        is_duplicate = True
-                
-                if is_duplicate:
-                    # Add to recent rejects if it's not already in the list
-                    add_to_recent_rejects(suggested_title, suggested_normalized)
+                logger.info(f"Attempt {attempt + 1} of {max_retries}")
+                prompt = _batch_prompt(build_prompt(), batch_size)
+                if streaming:
+                    picker.offer(_stream_candidates(prompt, title_index, saved))
+                else:
+                    picker.offer(_parse_candidates(_complete(prompt, batch_size)))
+                if picker.result is None:
                     continue
 
-            if not title and reject_duplicates:  # Only validate keywords for suggestions with duplicate rejection
-                # Verify keywords match preferences if any are specified
-                if preferred_keywords and not any(k in suggestion['keywords'] for k in preferred_keywords):
-                    logger.warning(f"Suggested movie {suggestion['title']} doesn't match any preferred keywords")
-                    add_to_recent_rejects(suggested_title, suggested_normalized)  # Add to rejects since it didn't match requirements
-                    continue
+                logger.info(f"Successfully completed suggestion generation for {picker.result['title']}")
+                _record_outcome(title, previous_suggestions, "generated", attempt + 1)
+                return picker.result
 
-            logger.info(f"Successfully completed suggestion generation for {suggestion['title']}")
-            return suggestion
+            except Exception as e:
+                logger.error(f"Error in attempt {attempt + 1}: {str(e)}\n{traceback.format_exc()}")
+                if attempt == max_retries - 1:
+                    _record_outcome(title, previous_suggestions, "failed", max_retries)
+                    raise
+    finally:
+        if streaming:
+            record_request(**saved)
 
-        except Exception as e:
-            logger.error(f"Error in attempt {attempt + 1}: {str(e)}\n{traceback.format_exc()}")
-            if attempt == max_retries - 1:
-                raise
+    logger.error("Failed to generate unique suggestion after max retries")
+    _record_outcome(title, previous_suggestions, "failed", max_retries)
+    raise Exception("Could not generate unique movie suggestion")
+
+async def agenerate_single_suggestion(data: Dict, max_retries: int = 30, title: str = None, previous_suggestions: List[str] = None, reject_duplicates: bool = False, title_index: TitleIndex = None, keyword_stats: KeywordStats = None, batch_size: int = SUGGESTION_BATCH_SIZE, on_leftover: Callable[[Dict], None] = None, fanout: int = SUGGESTION_FANOUT) -> Dict:
+    """Async version of generate_single_suggestion.
+
+    Uses the provider's async SDK client, so waiting on the provider doesn't
+    hold a threadpool thread. Each round sends fanout requests at once and
+    returns as soon as any of them yields a valid candidate; requests still
+    running keep going in the background and feed on_leftover. Every request
+    counts as one of the max_retries attempts. Single-candidate requests with
+    reject_duplicates are streamed as in generate_single_suggestion.
+    """
+    logger.info("Starting async suggestion generation")
+    if reject_duplicates and title_index is None:
+        title_index = TitleIndex.from_data(data)
+    if title and not previous_suggestions:
+        batch_size = fanout = 1
+    picker = _CandidatePicker(data, title, reject_duplicates, title_index, on_leftover)
+    shortlist = []
+    if reject_duplicates and not title:
+        known, shortlist, keyword_stats = await asyncio.to_thread(_known_candidate, data, title_index, keyword_stats)
+        if known:
+            _record_outcome(title, previous_suggestions, "local")
+            return known
+    build_prompt = _prompt_builder(data, title, previous_suggestions, reject_duplicates, keyword_stats, shortlist)
+    streaming = SUGGESTION_STREAMING and reject_duplicates and batch_size == 1
+    saved = {"aborted": 0, "tokens": 0, "ms": 0.0}
+    recorded = dict(saved)  # The part of saved already counted in the stream stats
+
+    def record_late_savings(_: asyncio.Task) -> None:
+        """Count what a request left running in the background saved after this call returned."""
+        record_savings(**{key: saved[key] - recorded[key] for key in saved})
+        recorded.update(saved)
+
+    async def request_candidates() -> List[Dict]:
+        prompt = _batch_prompt(build_prompt(), batch_size)
+        if streaming:
+            return await _astream_candidates(prompt, title_index, saved)
+        return _parse_candidates(await _acomplete(prompt, batch_size))
+
+    try:
+        attempts = 0
+        last_error = None
+        while attempts < max_retries:
+            round_size = max(1, min(fanout, max_retries - attempts))
+            logger.info(f"Attempts {attempts + 1}-{attempts + round_size} of {max_retries}")
+            attempts += round_size
+            pending = {asyncio.create_task(request_candidates()) for _ in range(round_size)}
+            while pending and picker.result is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        if task.exception() is not None:
+                            raise task.exception()
+                        picker.offer(task.result())
+                    except Exception as e:
+                        last_error = e
+                        logger.error(f"Error in suggestion attempt: {str(e)}")
+
+            if picker.result is not None:
+                for task in pending:
+                    if on_leftover is None:
+                        task.cancel()
+                    else:
+                        _background_tasks.add(task)
+                        task.add_done_callback(picker.offer_task)
+                        if streaming:
+                            task.add_done_callback(record_late_savings)
+                logger.info(f"Successfully completed suggestion generation for {picker.result['title']}")
+                _record_outcome(title, previous_suggestions, "generated", attempts)
+                return picker.result
+    finally:
+        if streaming:
+            recorded.update(saved)
+            record_request(**saved)
+
+    logger.error("Failed to generate unique suggestion after max retries")
+    _record_outcome(title, previous_suggestions, "failed", attempts)
+    if last_error is not None:
+        raise last_error
+    raise Exception("Could not generate unique movie suggestion")
+
+async def replay_suggestion(suggestion: Dict) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield the events of astream_suggestion for a suggestion that is already complete."""
+    for name, value in suggestion.items():
+        yield "field", {name: value}
+    yield "done", suggestion
+
+async def astream_suggestion(data: Dict, max_retries: int = 30, title: str = None, reject_duplicates: bool = False, title_index: TitleIndex = None, keyword_stats: KeywordStats = None) -> AsyncIterator[Tuple[str, Any]]:
+    """Streaming version of agenerate_single_suggestion, for one suggestion or a movie's details.
+
+    Uses the provider's streaming API and yields (event, payload) pairs:
+    ("field", {name: value}) for each field of the candidate as soon as it
+    is parsed, ("retry", {"title", "reason"}) when a candidate whose fields
+    were already yielded is dropped, and ("done", suggestion) once a
+    candidate is complete and valid. With reject_duplicates the title is
+    checked the moment it is parsed, before any field is yielded, and the
+    generation of a duplicate is abandoned.
+    """
+    logger.info("Starting streamed suggestion generation")
+    if reject_duplicates and title_index is None:
+        title_index = TitleIndex.from_data(data)
+    shortlist = []
+    if reject_duplicates and not title:
+        known, shortlist, keyword_stats = await asyncio.to_thread(_known_candidate, data, title_index, keyword_stats)
+        if known:
+            _record_outcome(title, None, "local")
+            async for event in replay_suggestion(known):
+                yield event
+            return
+    build_prompt = _prompt_builder(data, title, None, reject_duplicates, keyword_stats, shortlist)
+
+    saved = {"aborted": 0, "tokens": 0, "ms": 0.0}
+    last_error = None
+    try:
+        for attempt in range(max_retries):
+            logger.info(f"Streamed attempt {attempt + 1} of {max_retries}")
+            candidate = _StreamedCandidate(reject_duplicates, title_index)
+            chunks = _astream(build_prompt())
+            try:
+                async for chunk in chunks:
+                    for name, value in candidate.feed(chunk):
+                        yield "field", {name: value}
+                    if candidate.finished:
+                        break
+                if candidate.duplicate:
+                    candidate.abandon(saved)
+                    continue
+                suggestion = candidate.value()
+            except Exception as e:
+                last_error = e
+                logger.error(f"Error in streamed attempt {attempt + 1}: {str(e)}")
+                if candidate.title is not None:
+                    yield "retry", {"title": candidate.title, "reason": "error"}
+                continue
+            finally:
+                await chunks.aclose()
+
+            if isinstance(suggestion, dict) and "title" in suggestion and _accept_suggestion(suggestion, data, title, reject_duplicates, title_index):
+                logger.info(f"Successfully completed streamed suggestion generation for {suggestion['title']}")
+                _record_outcome(title, None, "generated", attempt + 1)
+                yield "done", suggestion
+                return
+            yield "retry", {"title": candidate.title, "reason": "rejected"}
+    finally:
+        if reject_duplicates:
+            record_request(**saved)
 
     logger.error("Failed to generate unique suggestion after max retries")
+    _record_outcome(title, None, "failed", max_retries)
+    if last_error is not None:
+        raise last_error
     raise Exception("Could not generate unique movie suggestion")
@@ -0,0 +1,188 @@
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import logger
+
+METRICS_DB = os.getenv("METRICS_DB", "cache/metrics.db")
+# Seconds a worker keeps its measurements in memory before adding them to METRICS_DB
+METRICS_SYNC_INTERVAL = float(os.getenv("METRICS_SYNC_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 30)
+
+# name -> (type, help, histogram buckets)
+METRICS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    "movie_tracker_http_request_duration_seconds": (
+        "histogram", "Time to handle an HTTP request, by route", LATENCY_BUCKETS),
+    "movie_tracker_stage_duration_seconds": (
+        "histogram", "Time spent in each stage of a request", LATENCY_BUCKETS),
+    "movie_tracker_suggestion_retries": (
+        "histogram", "Attempts after the first needed to generate a suggestion", RETRY_BUCKETS),
+    "movie_tracker_suggestions_total": (
+        "counter", "Suggestion generations, by outcome", ()),
+    "movie_tracker_suggestion_rejections_total": (
+        "counter", "Candidates rejected by the AI provider's answer checks, by reason", ()),
+    "movie_tracker_cache_requests_total": (
+        "counter", "Cache lookups, by cache and result", ()),
+    "movie_tracker_llm_tokens_total": (
+        "counter", "Tokens used by AI provider requests, by provider and direction", ()),
+}
+# Derived from movie_tracker_cache_requests_total when rendering
+CACHE_HIT_RATIO = "movie_tracker_cache_hit_ratio"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]  # (sample name, sorted label pairs)
+
+_pending: Dict[_Key, float] = {}  # Increments not yet added to METRICS_DB
+_pending_lock = threading.Lock()
+_timer: Optional[threading.Timer] = None
+_local = threading.local()
+
+def _key(name: str, labels: Dict[str, object]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _add(key: _Key, amount: float) -> None:
+    global _timer
+    with _pending_lock:
+        _pending[key] = _pending.get(key, 0) + amount
+        if _timer is None:
+            _timer = threading.Timer(METRICS_SYNC_INTERVAL, flush)
+            _timer.daemon = True
+            try:
+                _timer.start()
+            except RuntimeError:  # At interpreter shutdown; the flush registered with atexit writes it
+                _timer = None
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    """Add amount to a counter."""
+    _add(_key(name, labels), amount)
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a value in a histogram."""
+    buckets = METRICS[name][2]
+    index = bisect_left(buckets, value)
+    le = repr(float(buckets[index])) if index < len(buckets) else "+Inf"
+    _add(_key(f"{name}_bucket", {**labels, "le": le}), 1)
+    _add(_key(f"{name}_sum", labels), value)
+    _add(_key(f"{name}_count", labels), 1)
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the time the block takes as a stage of the request, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("movie_tracker_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    """Count a lookup in cache."""
+    inc("movie_tracker_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+def _connect() -> sqlite3.Connection:
+    """Return this thread's connection to METRICS_DB, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(METRICS_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(METRICS_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS samples (name TEXT NOT NULL, labels TEXT NOT NULL, "
+                     "value REAL NOT NULL, PRIMARY KEY (name, labels))")
+        _local.conn = conn
+    return conn
+
+def flush() -> None:
+    """Add this worker's pending measurements to the totals in METRICS_DB."""
+    global _timer
+    with _pending_lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                [(name, json.dumps(labels), value) for (name, labels), value in pending.items()]
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error saving metrics: {str(e)}")
+        for key, value in pending.items():
+            _add(key, value)
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render() -> str:
+    """Return the totals of all workers in the Prometheus text exposition format."""
+    flush()
+    samples: Dict[str, List[Tuple[List[Tuple[str, str]], float]]] = {}
+    for name, labels, value in _connect().execute("SELECT name, labels, value FROM samples ORDER BY name, labels"):
+        samples.setdefault(name, []).append(([tuple(pair) for pair in json.loads(labels)], value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for labels, value in samples.get(name, []):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+        # Buckets are stored per bucket and reported cumulatively, for every bound
+        counts: Dict[Tuple, Dict[str, float]] = {}
+        for labels, value in samples.get(f"{name}_bucket", []):
+            series = tuple(pair for pair in labels if pair[0] != "le")
+            counts.setdefault(series, {})[dict(labels)["le"]] = value
+        sums = {tuple(labels): value for labels, value in samples.get(f"{name}_sum", [])}
+        totals = {tuple(labels): value for labels, value in samples.get(f"{name}_count", [])}
+        for series in sorted(totals):
+            cumulative = 0.0
+            for le in [repr(float(bound)) for bound in buckets] + ["+Inf"]:
+                cumulative += counts.get(series, {}).get(le, 0)
+                lines.append(f"{name}_bucket{_format_labels(list(series) + [('le', le)])} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(list(series))} {_format_value(sums.get(series, 0))}")
+            lines.append(f"{name}_count{_format_labels(list(series))} {_format_value(totals[series])}")
+
+    lookups: Dict[str, List[float]] = {}  # cache -> [hits, lookups]
+    for labels, value in samples.get("movie_tracker_cache_requests_total", []):
+        labels = dict(labels)
+        cache_counts = lookups.setdefault(labels["cache"], [0.0, 0.0])
+        cache_counts[0] += value if labels["result"] == "hit" else 0
+        cache_counts[1] += value
+    lines += [f"# HELP {CACHE_HIT_RATIO} Share of cache lookups that were hits", f"# TYPE {CACHE_HIT_RATIO} gauge"]
+    for cache, (hits, total) in sorted(lookups.items()):
+        if total:
+            lines.append(f"{CACHE_HIT_RATIO}{_format_labels([('cache', cache)])} {_format_value(hits / total)}")
+    return "\n".join(lines) + "\n"
+
+def reset() -> None:
+    """Delete the totals of all workers."""
+    with _pending_lock:
+        _pending.clear()
+    with _connect() as conn:
+        conn.execute("DELETE FROM samples")
+
+atexit.register(flush)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["reset"]:
+        reset()
+        print(f"Reset the metrics in {METRICS_DB}")
+    else:
+        print(render(), end="")
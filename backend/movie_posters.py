@@ -0,0 +1,345 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import httpx
+import mimetypes
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from fastapi import Response
+from fastapi.responses import FileResponse
+from config import logger, log_sampled
+from movie_metrics import cache_lookup, timed
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails need Pillow
+    Image = None
+    logger.warning("Pillow is not installed, poster thumbnails are disabled and ?size= serves the original")
+
+OMDB_API_KEY = os.getenv('OMDB_API_KEY', 'bf7a5c7b')
+OMDB_BASE_URL = os.getenv('OMDB_BASE_URL', 'https://www.omdbapi.com')
+# Poster lookups and downloads each worker runs at once, over one keep-alive client
+POSTER_CONCURRENCY = int(os.getenv('POSTER_CONCURRENCY', '8'))
+POSTER_TIMEOUT = float(os.getenv('POSTER_TIMEOUT', '20'))
+# OMDB lookups per second per worker; 0 means no limit
+POSTER_RATE_LIMIT = float(os.getenv('POSTER_RATE_LIMIT', '0'))
+CACHE_DIR = Path('cache/posters')
+# Seconds before a title OMDB had no poster for is looked up again
+POSTER_MISSING_TTL = float(os.getenv('POSTER_MISSING_TTL', str(24 * 3600)))
+# Seconds browsers may reuse a poster without asking again
+POSTER_MAX_AGE = int(os.getenv('POSTER_MAX_AGE', str(7 * 24 * 3600)))
+MISSING_SUFFIX = '.missing'  # Marker file for a title without a poster
+THUMBNAIL_FORMAT = 'webp'
+# Widths the poster route resizes to; a requested size is rounded up to one of these
+POSTER_SIZES = sorted(int(w) for w in os.getenv('POSTER_SIZES', '160,320').split(',') if w.strip())
+
+def safe_filename(title: str) -> str:
+    """Return the cache file name (without extension) for a title."""
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return safe_title.replace("/","_")
+
+class PosterCache:
+    """Index of the poster files in a cache directory.
+
+    The directory is scanned once, then lookups are dict lookups. Titles OMDB
+    has no poster for are recorded as empty marker files, so they aren't
+    looked up again for missing_ttl seconds. Files added by other workers are
+    picked up by rescanning when the directory's mtime changes on a miss;
+    the worker's own writes move the mtime it compares with along, so they
+    don't cause rescans.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, missing_ttl: float = POSTER_MISSING_TTL):
+        self.directory = Path(directory)
+        self.missing_ttl = missing_ttl
+        self._files: Dict[str, Path] = {}
+        self._missing: Dict[str, float] = {}  # name -> time the poster was found missing
+        self._scanned_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        """Rebuild the index if the directory changed since the last scan."""
+        mtime = self.directory.stat().st_mtime_ns
+        if mtime == self._scanned_mtime:
+            return
+        files, missing = {}, {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext == MISSING_SUFFIX:
+                    missing[name] = entry.stat().st_mtime
+                elif ext:
+                    files.setdefault(name, Path(entry.path))
+        with self._lock:
+            self._files = files
+            self._missing = missing
+            self._scanned_mtime = mtime
+        logger.info(f"Indexed {len(files)} posters and {len(missing)} missing posters in {self.directory}")
+
+    def get(self, name: str) -> Optional[Path]:
+        """Return the cached poster file for a safe filename."""
+        with self._lock:
+            path = self._files.get(name)
+        if path is None:
+            self._scan()
+            with self._lock:
+                path = self._files.get(name)
+        return path
+
+    def is_missing(self, name: str) -> bool:
+        """Whether OMDB recently had no poster for this safe filename."""
+        with self._lock:
+            found_missing = self._missing.get(name)
+        return found_missing is not None and time.time() - found_missing < self.missing_ttl
+
+    def _own_change(self, change: Callable[[], None]) -> None:
+        """Change the directory without making the next miss rescan it.
+
+        If the index was current before the change, it is still current
+        after it. A file another worker adds at the same moment is then only
+        picked up with a later change, at worst costing a second download.
+        """
+        before = self.directory.stat().st_mtime_ns
+        change()
+        after = self.directory.stat().st_mtime_ns
+        with self._lock:
+            if self._scanned_mtime == before:
+                self._scanned_mtime = after
+
+    def save(self, name: str, ext: str, content: bytes) -> Path:
+        """Write a downloaded poster into the cache and record it; return its path."""
+        path = self.directory / f"{name}{ext}"
+
+        def change() -> None:
+            _write_file_atomic(path, content)
+            (self.directory / f"{name}{MISSING_SUFFIX}").unlink(missing_ok=True)
+
+        self._own_change(change)
+        with self._lock:
+            self._files[name] = path
+            self._missing.pop(name, None)
+        return path
+
+    def add_missing(self, name: str) -> None:
+        """Record that OMDB has no poster for this safe filename."""
+        self._own_change((self.directory / f"{name}{MISSING_SUFFIX}").touch)
+        with self._lock:
+            self._missing[name] = time.time()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+_poster_cache: Optional[PosterCache] = None
+_poster_cache_lock = threading.Lock()
+
+def get_poster_cache() -> PosterCache:
+    """Return the shared poster index, scanning CACHE_DIR on first use."""
+    global _poster_cache
+    if _poster_cache is None:
+        with _poster_cache_lock:
+            if _poster_cache is None:
+                _poster_cache = PosterCache()
+    return _poster_cache
+
+class RateLimiter:
+    """Spaces out calls to at most rate per second (no limit if rate <= 0)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + 1 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+_client: Optional[httpx.AsyncClient] = None
+_fetch_limit = asyncio.Semaphore(POSTER_CONCURRENCY)
+omdb_rate_limit = RateLimiter(POSTER_RATE_LIMIT)
+_inflight: Dict[str, asyncio.Future] = {}
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client for OMDB and poster downloads, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POSTER_CONCURRENCY, max_keepalive_connections=POSTER_CONCURRENCY),
+            timeout=POSTER_TIMEOUT,
+            follow_redirects=True
+        )
+    return _client
+
+def _write_file_atomic(path: Path, content: bytes) -> None:
+    """Write content so other workers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+async def _download_image(url: str, name: str) -> Optional[Path]:
+    """Download image from URL into the poster cache as name; return the saved path."""
+    try:
+        response = await _get_client().get(url)
+        if response.status_code == 200:
+            content_type = response.headers.get('content-type', '')
+            if not content_type.startswith('image/'):
+                return None
+
+            ext = mimetypes.guess_extension(content_type.split(';')[0].strip())
+            if not ext:
+                ext = '.jpg'  # Default to jpg if can't determine type
+
+            return await asyncio.to_thread(get_poster_cache().save, name, ext, response.content)
+    except Exception as e:
+        logger.error(f"Error downloading image: {e}")
+    return None
+
+async def _fetch_poster(title: str, safe_title: str) -> Optional[Path]:
+    """Look the poster up on OMDB and download it into the cache."""
+    # Parse title and year
+    match = title.strip().split('(')
+    movie_title = match[0].strip()
+    year = match[1][:-1] if len(match) > 1 else None
+
+    try:
+        # Make request with title and year
+        params = {
+            'apikey': OMDB_API_KEY,
+            't': movie_title
+        }
+        if year:
+            params['y'] = year
+
+        with timed("poster_fetch"):
+            async with _fetch_limit:
+                await omdb_rate_limit.wait()
+                logger.info(f"Requesting OMDB for title='{movie_title}' year='{year}'")
+                response = await _get_client().get(OMDB_BASE_URL, params=params)
+                data = response.json()
+                logger.debug(f"OMDB response: {data}")
+
+                if data.get('Response') == 'True' and data.get('Poster') and data['Poster'] != 'N/A':
+                    logger.info(f"Found poster URL: {data['Poster']}")
+                    cached_file = await _download_image(data['Poster'], safe_title)
+                    if cached_file:
+                        logger.info(f"Poster downloaded and cached for: {title}")
+                        return cached_file
+                elif response.is_success:
+                    get_poster_cache().add_missing(safe_title)
+
+    except Exception as e:
+        logger.error(f"Error fetching poster for {title}: {e}")
+
+    return None
+
+async def get_movie_poster(title: str) -> Optional[Path]:
+    """Get the movie poster file, downloading it from OMDB if it isn't cached.
+
+    Concurrent requests for the same title share one lookup and download.
+    """
+    # Create safe filename
+    safe_title = safe_filename(title)
+
+    # Check cache
+    poster_cache = get_poster_cache()
+    cached_file = poster_cache.get(safe_title)
+    if cached_file:
+        cache_lookup("posters", True)
+        log_sampled("poster_cache_hit", f"Poster found in cache for: {title}")
+        return cached_file
+    if poster_cache.is_missing(safe_title):
+        cache_lookup("posters", True)  # Known to have no poster
+        log_sampled("poster_missing", f"Poster recently not found for: {title}")
+        return None
+    cache_lookup("posters", False)
+
+    # If not in cache, fetch from OMDB
+    future = _inflight.get(safe_title)
+    if future is None:
+        future = asyncio.ensure_future(_fetch_poster(title, safe_title))
+        _inflight[safe_title] = future
+        future.add_done_callback(lambda _: _inflight.pop(safe_title, None))
+    else:
+        logger.info(f"Waiting for in-flight poster of {title}")
+    # A cancelled request doesn't cancel the shared download
+    return await asyncio.shield(future)
+
+async def find_movie_poster(title: str) -> Optional[Path]:
+    """Get the movie poster file, trying the title without its year if needed."""
+    path = await get_movie_poster(title)
+    if path:
+        return path
+    base_title = title.split('(')[0].strip()
+    return await get_movie_poster(base_title)
+
+def thumbnail_path(path: Path, width: int) -> Path:
+    """Return where the width-pixel-wide variant of a poster file is kept."""
+    return path.parent / f"w{width}" / f"{path.stem}.{THUMBNAIL_FORMAT}"
+
+def make_thumbnail(path: Path, width: int) -> Optional[Path]:
+    """Write a downscaled variant of a poster file if it doesn't exist yet.
+
+    Returns the variant's path, or None if Pillow isn't installed or the
+    image can't be read. Blocks, so run it in a thread from async code.
+    """
+    thumb = thumbnail_path(path, width)
+    if thumb.exists():
+        return thumb
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGB")
+            thumb.parent.mkdir(exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=thumb.parent, prefix=".tmp-")
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, THUMBNAIL_FORMAT, quality=80)
+            os.replace(tmp_path, thumb)
+        return thumb
+    except Exception as e:
+        logger.error(f"Error creating {width}px thumbnail of {path}: {e}")
+        return None
+
+def thumbnail_width(size: int) -> Optional[int]:
+    """Return the configured width to serve for a requested size."""
+    if not POSTER_SIZES:
+        return None
+    return next((width for width in POSTER_SIZES if width >= size), POSTER_SIZES[-1])
+
+async def get_poster_variant(path: Path, size: Optional[int]) -> Path:
+    """Return the resized variant of a poster for size, creating it on first use.
+
+    Falls back to the original if no size is asked for or resizing isn't
+    possible.
+    """
+    width = thumbnail_width(size) if size else None
+    if width is None:
+        return path
+    thumb = thumbnail_path(path, width)
+    if thumb.exists():
+        return thumb
+    return await asyncio.to_thread(make_thumbnail, path, width) or path
+
+def poster_response(path: Path, if_none_match: Optional[str] = None) -> Response:
+    """Serve a poster file with caching headers, or 304 if the client's copy is current."""
+    stat = path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={POSTER_MAX_AGE}"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers, stat_result=stat)
@@ -0,0 +1,189 @@
+import json
+import os
+import random
+from typing import Dict, Iterable, List
+from movie_analysis import KeywordStats
+
+# Estimated tokens a suggestion prompt may use for the user's history and
+# keywords; the most informative part is kept. 0 means no limit.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = 4  # Rough average for English text and titles
+
+# Share of the budget each section gets, in the order they're filled. Space
+# a section doesn't use is passed on to the next one.
+SECTION_SHARES = (
+    ("watched", 0.40),
+    ("liked_keywords", 0.15),
+    ("not_interested", 0.15),
+    ("want_to_watch", 0.15),
+    ("disliked_keywords", 0.10),
+    ("undecided", 0.05),
+)
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens text uses, without a tokenizer."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def details_prompt(title: str) -> str:
+    """Build the prompt asking for the details of one movie."""
+    return f"""You are a movie expert. For the movie "{title}", provide detailed information as a raw JSON object (not in markdown code blocks) in this exact format:
+{{
+  "title": "Movie Title (YEAR)",
+  "description": "2-3 sentence description focusing on what makes this movie special",
+  "keywords": ["keyword1", "keyword2", "keyword3"],
+  "credits": {{
+    "directors": ["name1", "name2"],
+    "cast": ["name1", "name2", "name3", "name4"],
+    "writers": ["name1", "name2"]
+  }}
+}}
+
+Requirements:
+1. Include the year in the title (e.g., "The Matrix (1999)")
+2. The description should highlight key aspects like plot elements, themes, or stylistic choices
+3. The keywords must accurately describe the movie's themes, genres, and notable elements
+4. Include all major cast and crew members"""
+
+def _rank_watched(watched: List[Dict]) -> List[str]:
+    """Return scored watched movies as "Title (score/10)", alternating best-scored and most recent."""
+    scored = [m for m in watched if m.get("score") is not None]
+    by_score = sorted(scored, key=lambda m: -m["score"])
+    ranked = {}
+    for best, recent in zip(by_score, reversed(scored)):
+        for movie in (best, recent):
+            ranked.setdefault(movie["title"], f"{movie['title']} ({movie['score']}/10)")
+    return list(ranked.values())
+
+def _fit(items: List[str], tokens: float, separator: str = ", ") -> List[str]:
+    """Return the leading items whose joined text fits in tokens."""
+    chars = tokens * CHARS_PER_TOKEN
+    fitted = []
+    for item in items:
+        chars -= len(item) + len(separator)
+        if chars < 0:
+            break
+        fitted.append(item)
+    return fitted
+
+class SuggestionPrompt:
+    """Suggestion prompt for one generate call, within a token budget.
+
+    The history and keyword sections are selected and rendered once: the
+    best-scored and most recently watched movies, the most frequent liked
+    and disliked keywords, the latest want-to-watch and undecided titles
+    and a random sample of not-interested ones, each section filling its
+    share of the budget. render() only appends the recently rejected titles,
+    so retries reuse the same static text, which is also kept first for
+    providers that cache prompt prefixes.
+    """
+
+    def __init__(self, data: Dict, title: str = None, previous_suggestions: List[str] = None,
+                 keyword_stats: KeywordStats = None, budget: int = PROMPT_TOKEN_BUDGET, shortlist: List[str] = None):
+        keyword_stats = keyword_stats or KeywordStats.from_data(data)
+        self.budget = budget
+        candidates = {
+            "watched": _rank_watched(data["watched"]),
+            "liked_keywords": [json.dumps({k: n})[1:-1] for k, n in keyword_stats.top("liked")],
+            "not_interested": random.sample([m["title"] for m in data["not_interested"]], len(data["not_interested"])),
+            "want_to_watch": [m["title"] for m in reversed(data["want_to_watch"])],
+            "disliked_keywords": [json.dumps({k: n})[1:-1] for k, n in keyword_stats.top("disliked")],
+            "undecided": [m["title"] for m in reversed(data["undecided"])],
+        }
+
+        preferences = data["preferences"]
+        preferred_keywords = preferences["keywords"]
+        self.preamble = ""
+        if previous_suggestions:
+            self.preamble = f"\n\nIMPORTANT: DO NOT suggest any of these previously suggested related movies:\n{', '.join(previous_suggestions)}"
+        genre_str = f"\nPreferred Genres: {', '.join(preferences['genres'])}" if preferences["genres"] else ""
+        keyword_str = f"\nPreferred Keywords: {', '.join(preferred_keywords)}" if preferred_keywords else ""
+        keyword_requirements = ""
+        if preferred_keywords:
+            keyword_requirements = f"\nIMPORTANT: The suggested movie MUST include at least one of these keywords: {', '.join(preferred_keywords)}"
+        if title:
+            self.request = f'For a movie similar to "{title}", suggest a related movie based on these preferences:'
+        else:
+            self.request = "Based on these preferences, suggest a movie that matches the user's interests."
+        self.extras = f"{genre_str}{keyword_str}"
+        self.keyword_requirements = keyword_requirements
+        self.shortlist = ""
+        if shortlist:
+            self.shortlist = f"\n\nKnown Candidates (movies that fit the keyword profile; suggest one of them if it matches the user's interests, otherwise another movie):\n{', '.join(shortlist)}"
+
+        self.totals = {name: len(items) for name, items in candidates.items()}
+        self.sections = self._select(candidates)
+        self.static = self._render_static(self.sections)
+        self.tokens = estimate_tokens(self.static)
+
+    def _select(self, candidates: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Pick the items of each section that fit in its share of the budget."""
+        if self.budget <= 0:
+            return dict(candidates)
+        empty = self._render_static({name: [] for name in candidates})
+        available = max(0, self.budget - estimate_tokens(empty))
+        sections, carry = {}, 0.0
+        for name, share in SECTION_SHARES:
+            allowance = available * share + carry
+            sections[name] = _fit(candidates[name], allowance)
+            used = sum(len(item) + 2 for item in sections[name]) / CHARS_PER_TOKEN
+            carry = allowance - used
+        return sections
+
+    def _render_static(self, sections: Dict[str, List[str]]) -> str:
+        def note(name: str) -> str:
+            shown, total = len(sections[name]), self.totals[name]
+            return f" ({shown} of {total} shown)" if shown < total else ""
+
+        liked = "{" + ", ".join(sections["liked_keywords"]) + "}"
+        disliked = "{" + ", ".join(sections["disliked_keywords"]) + "}"
+        return f"""You are a movie expert. Based on the user's movie preferences:{self.preamble}
+
+{self.request}
+
+Movie History:
+- Watched Movies (with scores){note("watched")}:
+{', '.join(sections["watched"])}
+- Want to Watch{note("want_to_watch")}: {', '.join(sections["want_to_watch"])}
+- Undecided About{note("undecided")}: {', '.join(sections["undecided"])}
+- Not Interested In{note("not_interested")}: {', '.join(sections["not_interested"])}
+{self.extras}
+
+Keyword Analysis:
+- Keywords from Highly Rated Movies{note("liked_keywords")}: {liked}
+- Keywords from Lower Rated Movies{note("disliked_keywords")}: {disliked}{self.keyword_requirements}{self.shortlist}
+
+Based on these preferences, suggest a movie that matches the user's interests. Return ONLY a raw JSON object (not in markdown code blocks) in this exact format:
+{{
+  "title": "Movie Title (YEAR)",
+  "description": "2-3 sentence description focusing on what makes this movie special",
+  "keywords": ["keyword1", "keyword2", "keyword3"],
+  "credits": {{
+    "directors": ["name1", "name2"],
+    "cast": ["name1", "name2", "name3", "name4"],
+    "writers": ["name1", "name2"]
+  }}
+}}
+
+Requirements:
+1. Include the year in the title (e.g., "The Matrix (1999)")
+2. Do not suggest any movies from the lists above
+3. If preferred keywords are specified, the movie MUST match at least one of them
+4. Weight the user's preferences:
+   - Highly rated watched movies are strong positive indicators
+   - Movies in "Want to Watch" suggest interest in similar films
+   - Movies in "Not Interested" indicate strong negative preferences
+   - "Undecided" movies should be considered neutral
+   - Preferred genres should heavily influence suggestions
+5. The keywords you provide must be accurate and descriptive, as they will be used for future matching"""
+
+    def render(self, rejected_titles: Iterable[str] = ()) -> str:
+        """Return the prompt for one attempt, telling the model which titles were just rejected."""
+        rejected_titles = list(rejected_titles)
+        if not rejected_titles:
+            return self.static
+        return f"{self.static}\n\nCRITICAL - DO NOT SUGGEST THESE RECENTLY REJECTED MOVIES:\n{', '.join(rejected_titles)}"
+
+    def summary(self) -> str:
+        """Describe the prompt's size and what was left out, for the log."""
+        cut = ", ".join(f"{name} {len(self.sections[name])}/{total}" for name, total in self.totals.items() if len(self.sections[name]) < total)
+        return f"~{self.tokens} tokens (budget {self.budget or 'unlimited'}){f', trimmed {cut}' if cut else ''}"
@@ -1,19 +1,72 @@
+import json
+import os
+import time
 from collections import deque
-from threading import Lock
-from typing import Dict, List, Deque
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, List, Deque, Optional, Tuple
 from config import logger
-from movie_analysis import normalize_title, is_duplicate_movie
+from movie_analysis import normalize_title, is_duplicate_movie, title_keys, TitleIndex
+from movie_metrics import cache_lookup
 
-# Queue to store movie suggestions
-suggestion_queue: Deque[Dict] = deque(maxlen=5)
+# Number of suggestions to keep ready; 0 disables prefetching
+QUEUE_DEPTH = int(os.getenv("SUGGESTION_QUEUE_DEPTH", "3"))
+
+# Queue to store movie suggestions, each with the preferences_key of the data it was generated from
+suggestion_queue: Deque[Tuple[str, Dict]] = deque(maxlen=max(QUEUE_DEPTH, 1))
 queue_titles: set[str] = set()  # Track unique titles in queue
 queue_lock = Lock()
+queue_changed = Condition(queue_lock)  # Notified whenever items leave the queue
+queue_generation = 0  # Bumped by clear_queue so in-flight suggestions can be dropped
+
+queue_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stale_dropped": 0,
+    "refills": 0,
+    "refill_rejected": 0,
+    "refill_errors": 0,
+    "refill_seconds_total": 0.0,
+    "refill_seconds_last": 0.0,
+    "refill_seconds_max": 0.0,
+}
+
+def preferences_key(data: Dict) -> str:
+    """Return a key that changes whenever the preferences in data change."""
+    return json.dumps(data["preferences"], sort_keys=True)
+
+def _drop_stale(preferences: str) -> None:
+    """Drop queued suggestions generated for other preferences; queue_lock must be held.
+
+    clear_queue only reaches the worker that changed the preferences, so the
+    other workers find out here, from the preferences they load.
+    """
+    stale = [item for item in suggestion_queue if item[0] != preferences]
+    for item in stale:
+        suggestion_queue.remove(item)
+        queue_titles.discard(normalize_title(item[1]["title"]))
+        queue_stats["stale_dropped"] += 1
+        logger.info(f"Dropped queued suggestion made for other preferences: {item[1]['title']}")
+    if stale:
+        queue_changed.notify_all()
+
+def add_to_queue(suggestion: Dict, data: Dict, index: Optional[TitleIndex] = None, generation: Optional[int] = None) -> bool:
+    """Add suggestion to queue if not duplicate. Return True if added.
 
-def add_to_queue(suggestion: Dict, data: Dict) -> bool:
-    """Add suggestion to queue if not duplicate. Return True if added."""
+    data is the movie data the suggestion was generated from; the suggestion
+    is only served while the preferences are the same. If generation is
+    given and the queue was cleared since, the suggestion is considered stale
+    and dropped.
+    """
     with queue_lock:
+        if generation is not None and generation != queue_generation:
+            logger.info(f"Dropped stale suggestion: {suggestion['title']} (queue was cleared)")
+            return False
+        if len(suggestion_queue) >= suggestion_queue.maxlen:
+            logger.info(f"Dropped suggestion: {suggestion['title']} (queue is full)")
+            return False
+        
         # First check if it's already in any list or the queue
-        is_duplicate, reason = is_duplicate_movie(suggestion["title"], data, [s["title"] for s in suggestion_queue])
+        is_duplicate, reason = is_duplicate_movie(suggestion["title"], data, [s["title"] for _, s in suggestion_queue], index)
         if is_duplicate:
             logger.warning(f"Rejected duplicate: {suggestion['title']} - {reason}")
             return False
@@ -25,23 +78,138 @@ def add_to_queue(suggestion: Dict, data: Dict) -> bool:
             return False
         
         # If we get here, it's definitely not a duplicate
-        suggestion_queue.append(suggestion)
+        suggestion_queue.append((preferences_key(data), suggestion))
         queue_titles.add(normalized_title)
         logger.info(f"Added unique suggestion to queue: {suggestion['title']} (queue size: {len(suggestion_queue)})")
         return True
 
-def remove_from_queue() -> Dict | None:
-    """Remove and return next suggestion from queue."""
+def remove_from_queue(index: Optional[TitleIndex] = None, data: Optional[Dict] = None) -> Dict | None:
+    """Remove and return next suggestion from queue.
+
+    With an index, suggestions that have since been added to a list are
+    skipped and dropped. With the current data, so are suggestions
+    generated for other preferences.
+    """
+    with queue_lock:
+        if data is not None:
+            _drop_stale(preferences_key(data))
+        while suggestion_queue:
+            _, suggestion = suggestion_queue.popleft()
+            queue_titles.discard(normalize_title(suggestion["title"]))
+            queue_changed.notify_all()
+            if index is not None and index.contains(suggestion["title"]):
+                queue_stats["stale_dropped"] += 1
+                logger.info(f"Dropped queued suggestion already in a list: {suggestion['title']}")
+                continue
+            queue_stats["hits"] += 1
+            cache_lookup("suggestion_queue", True)
+            return suggestion
+        queue_stats["misses"] += 1
+        cache_lookup("suggestion_queue", False)
+        return None
+
+def discard_from_queue(title: str) -> None:
+    """Drop queued suggestions for this movie, e.g. because it was just added to a list."""
+    normalized, base = title_keys(title)
     with queue_lock:
-        if not suggestion_queue:
-            return None
-        suggestion = suggestion_queue.popleft()
-        queue_titles.remove(normalize_title(suggestion["title"]))
-        return suggestion
+        stale = [item for item in suggestion_queue if normalized == title_keys(item[1]["title"])[0] or base == title_keys(item[1]["title"])[1]]
+        for item in stale:
+            suggestion_queue.remove(item)
+            suggestion = item[1]
+            queue_titles.discard(normalize_title(suggestion["title"]))
+            queue_stats["stale_dropped"] += 1
+            logger.info(f"Dropped queued suggestion now in a list: {suggestion['title']}")
+        if stale:
+            queue_changed.notify_all()
 
 def clear_queue() -> None:
     """Clear the suggestion queue and title tracking set."""
+    global queue_generation
     with queue_lock:
         suggestion_queue.clear()
         queue_titles.clear()
+        queue_generation += 1
+        queue_changed.notify_all()
         logger.info("Cleared suggestion queue and title tracking set")
+
+def get_queue_stats() -> Dict:
+    """Return queue hit rate and refill latency metrics."""
+    with queue_lock:
+        stats = dict(queue_stats)
+        stats["size"] = len(suggestion_queue)
+    stats["depth"] = QUEUE_DEPTH
+    requests = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / requests if requests else None
+    stats["refill_seconds_avg"] = stats["refill_seconds_total"] / stats["refills"] if stats["refills"] else None
+    return stats
+
+class SuggestionPrefetcher:
+    """Background producer that keeps suggestion_queue topped up to depth.
+
+    Args:
+        generate: Produces one suggestion from (data, title_index, on_leftover),
+            passing any extra valid candidates to on_leftover
+        snapshot: Returns the current (data, title_index)
+        depth: Number of suggestions to keep queued
+    """
+
+    def __init__(self, generate: Callable[[Dict, TitleIndex, Callable[[Dict], bool]], Dict], snapshot: Callable[[], Tuple[Dict, TitleIndex]], depth: int = QUEUE_DEPTH):
+        self.generate = generate
+        self.snapshot = snapshot
+        self.depth = min(depth, suggestion_queue.maxlen)
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._start_lock = Lock()
+
+    def start(self) -> None:
+        """Start the producer thread if it isn't running yet."""
+        if self.depth <= 0:
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = Thread(target=self._run, name="suggestion-prefetcher", daemon=True)
+                self._thread.start()
+                logger.info(f"Started suggestion prefetcher (depth {self.depth})")
+
+    def stop(self) -> None:
+        """Ask the producer thread to exit."""
+        self._stopped.set()
+        with queue_changed:
+            queue_changed.notify_all()
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stopped.is_set():
+            with queue_changed:
+                while len(suggestion_queue) >= self.depth and not self._stopped.is_set():
+                    queue_changed.wait()
+                generation = queue_generation
+            if self._stopped.is_set():
+                break
+
+            start = time.perf_counter()
+            try:
+                data, index = self.snapshot()
+                with queue_lock:
+                    _drop_stale(preferences_key(data))
+                suggestion = self.generate(data, index, lambda s: add_to_queue(s, data, index, generation))
+            except Exception as e:
+                with queue_lock:
+                    queue_stats["refill_errors"] += 1
+                logger.error(f"Suggestion prefetch failed: {str(e)}")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+            backoff = 1.0
+
+            added = add_to_queue(suggestion, data, index, generation)
+            elapsed = time.perf_counter() - start
+            with queue_lock:
+                if added:
+                    queue_stats["refills"] += 1
+                    queue_stats["refill_seconds_total"] += elapsed
+                    queue_stats["refill_seconds_last"] = elapsed
+                    queue_stats["refill_seconds_max"] = max(queue_stats["refill_seconds_max"], elapsed)
+                else:
+                    queue_stats["refill_rejected"] += 1
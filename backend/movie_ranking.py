@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from config import logger
+from movie_analysis import KeywordStats, title_keys
+from movie_cache import RecommendationStore, get_recommendation_store
+
+try:
+    import numpy as np
+except ImportError:  # Scoring falls back to plain Python
+    np = None
+    logger.warning("NumPy is not installed, ranking known candidates uses the slower plain Python fallback")
+
+# Lowest profile affinity (-1 to 1) at which a known candidate is served
+# without asking the AI provider; above 1 never serves locally
+LOCAL_SUGGESTION_MIN_SCORE = float(os.getenv("LOCAL_SUGGESTION_MIN_SCORE", "0.3"))
+# Best known candidates below that score offered to the AI provider as a shortlist
+LOCAL_SHORTLIST_SIZE = int(os.getenv("LOCAL_SHORTLIST_SIZE", "10"))
+LOCAL_SERVED_MEMORY = 500  # Recently served candidates that aren't served again
+
+def _normalize_keyword(keyword: str) -> str:
+    return keyword.strip().lower()
+
+def keyword_weights(stats: KeywordStats) -> Dict[str, float]:
+    """Return each keyword's weight in the user's profile, from -1 (disliked) to 1 (liked).
+
+    A keyword seen in many liked and no disliked movies approaches 1; one
+    seen once weighs 0.5, so rare keywords count for less.
+    """
+    liked, disliked = {}, {}
+    for counts, totals in ((stats.counts["liked"], liked), (stats.counts["disliked"], disliked)):
+        for keyword, count in list(counts.items()):
+            key = _normalize_keyword(keyword)
+            totals[key] = totals.get(key, 0) + count
+    return {
+        keyword: (liked.get(keyword, 0) - disliked.get(keyword, 0)) / (liked.get(keyword, 0) + disliked.get(keyword, 0) + 1)
+        for keyword in liked.keys() | disliked.keys()
+    }
+
+class CandidateRanker:
+    """Ranks the cached recommendation corpus against the user's keyword profile.
+
+    Every known movie is a sparse row of keyword ids, and its score is the
+    mean profile weight of its keywords, computed for the whole corpus at
+    once with NumPy (or in plain Python without it). The corpus is loaded
+    incrementally from the recommendation store as related movies are
+    cached, and reloaded when rows are removed.
+    """
+
+    def __init__(self, store: Optional[RecommendationStore] = None, served_memory: int = LOCAL_SERVED_MEMORY):
+        self._store = store
+        self.served_memory = served_memory
+        self._lock = threading.RLock()
+        self._served: "OrderedDict[str, None]" = OrderedDict()
+        self._reset()
+
+    @property
+    def store(self) -> RecommendationStore:
+        """The store given, or the shared one (opened on first use)."""
+        return self._store or get_recommendation_store()
+
+    def _reset(self) -> None:
+        self._state: Tuple[int, int] = (0, 0)
+        self._movies: List[Dict] = []
+        self._keys: Dict[str, int] = {}  # Normalized title -> row
+        self._vocab: Dict[str, int] = {}
+        self._rows: List[List[int]] = []
+        self._arrays = None  # (keyword ids, row starts, row lengths) for NumPy
+
+    def _refresh(self) -> None:
+        """Load recommendations added since the last refresh."""
+        state = self.store.state()
+        if state == self._state:
+            return
+        last_id, count = self._state
+        rows = self.store.rows_after(last_id)
+        if count + len(rows) != state[1]:
+            self._reset()  # Rows were removed or replaced
+            rows = self.store.rows_after(0)
+        for row_id, movie in rows:
+            keywords = {_normalize_keyword(k) for k in movie.get("keywords") or [] if k.strip()}
+            key = title_keys(movie["title"])[0]
+            if not keywords or key in self._keys:
+                continue
+            self._keys[key] = len(self._movies)
+            self._movies.append(movie)
+            self._rows.append([self._vocab.setdefault(k, len(self._vocab)) for k in sorted(keywords)])
+        self._state = state
+        self._arrays = None
+        logger.info(f"Candidate ranker: {len(self._movies)} known movies, {len(self._vocab)} keywords")
+
+    def _scores(self, weights: Dict[str, float]) -> Sequence[float]:
+        """Return the mean profile weight of each known movie's keywords."""
+        vector = [0.0] * len(self._vocab)
+        for keyword, weight in weights.items():
+            index = self._vocab.get(keyword)
+            if index is not None:
+                vector[index] = weight
+        if np is None:
+            return [sum(vector[i] for i in row) / len(row) for row in self._rows]
+        if self._arrays is None:
+            lengths = np.array([len(row) for row in self._rows], dtype=np.int64)
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            ids = np.fromiter((i for row in self._rows for i in row), dtype=np.int32, count=int(lengths.sum()))
+            self._arrays = (ids, starts, lengths.astype(np.float32))
+        ids, starts, lengths = self._arrays
+        return np.add.reduceat(np.asarray(vector, dtype=np.float32)[ids], starts) / lengths
+
+    @staticmethod
+    def _order(scores: Sequence[float], head: int) -> Iterator[int]:
+        """Yield row numbers best score first, sorting only the best head rows unless more are needed."""
+        if np is None:
+            yield from sorted(range(len(scores)), key=lambda i: -scores[i])
+            return
+        negated = -scores
+        if head >= len(scores):
+            yield from np.argsort(negated, kind="stable")
+            return
+        partition = np.argpartition(negated, head)
+        best = partition[:head]
+        yield from best[np.argsort(negated[best], kind="stable")]
+        rest = partition[head:]
+        yield from rest[np.argsort(negated[rest], kind="stable")]
+
+    def rank(self, stats: KeywordStats, accept: Callable[[Dict], bool], limit: int) -> List[Tuple[float, Dict]]:
+        """Return up to limit (score, movie) pairs for accepted, not recently served movies, best first."""
+        with self._lock:
+            self._refresh()
+            if not self._movies:
+                return []
+            scores = self._scores(keyword_weights(stats))
+            ranked = []
+            for i in self._order(scores, limit * 4):
+                movie = self._movies[i]
+                if title_keys(movie["title"])[0] in self._served or not accept(movie):
+                    continue
+                ranked.append((float(scores[i]), movie))
+                if len(ranked) >= limit:
+                    break
+            return ranked
+
+    def mark_served(self, title: str) -> None:
+        """Keep a served movie from being served again for a while."""
+        with self._lock:
+            self._served[title_keys(title)[0]] = None
+            while len(self._served) > self.served_memory:
+                self._served.popitem(last=False)
+
+    def pick(self, stats: KeywordStats, accept: Callable[[Dict], bool], min_score: float = LOCAL_SUGGESTION_MIN_SCORE,
+             shortlist_size: int = LOCAL_SHORTLIST_SIZE) -> Tuple[Optional[Dict], List[str]]:
+        """Return (movie to serve, shortlist of titles for the AI provider).
+
+        The best accepted movie is served if it scores at least min_score;
+        otherwise the best shortlist_size titles are returned instead.
+        """
+        with self._lock:
+            ranked = self.rank(stats, accept, max(1, shortlist_size))
+            if ranked and ranked[0][0] >= min_score:
+                score, movie = ranked[0]
+                self.mark_served(movie["title"])
+                logger.info(f"Serving known candidate {movie['title']} (score {score:.2f})")
+                return dict(movie), []
+        return None, [movie["title"] for score, movie in ranked[:shortlist_size] if score > 0]
+
+candidate_ranker = CandidateRanker()
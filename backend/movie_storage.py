@@ -1,126 +1,425 @@
 import yaml
 import json
-import requests
-import mimetypes
+import os
+import atexit
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from config import logger
-from fastapi.responses import FileResponse
+from movie_metrics import timed
+from movie_analysis import MOVIE_LISTS, KeywordStats, TitleIndex
 
-OMDB_API_KEY = 'bf7a5c7b'
-OMDB_BASE_URL = 'https://www.omdbapi.com'
-CACHE_DIR = Path('cache/posters')
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-# Create cache directory if it doesn't exist
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# Storage engine: "yaml" (movies.yaml) or "sqlite" (see movie_storage_sqlite.py)
+STORAGE_BACKEND = os.getenv('MOVIE_STORAGE_BACKEND', 'yaml')
+MOVIES_FILE = Path(os.getenv('MOVIES_FILE', 'movies.yaml'))
+# Seconds to wait after the first unsaved change before writing movies.yaml.
+# Every change made inside that window is written out in a single flush.
+# Set it to 0 when several processes share the file (run_server.py does):
+# changes are then written while holding the file lock, so none are lost.
+FLUSH_DELAY = float(os.getenv('MOVIE_STORE_FLUSH_DELAY', '0.5'))
 
-def _download_image(url: str, file_path: Path) -> bool:
-    """Download image from URL and save to file."""
+# Use the libyaml bindings when available; the on-disk format is unchanged
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+class VersionConflictError(Exception):
+    """Raised when a change was based on an outdated version of the movie data."""
+
+    def __init__(self, expected: int, actual: int):
+        super().__init__(f"Movie data is at version {actual}, expected {expected}")
+        self.expected = expected
+        self.actual = actual
+
+def _empty_movies() -> Dict:
+    """Return the structure of an empty movies.yaml."""
+    return {
+        "watched": [], 
+        "want_to_watch": [], 
+        "not_interested": [],
+        "undecided": [],
+        "preferences": {
+            "genres": [],
+            "keywords": [],
+            "comments": None
+        }
+    }
+
+def _copy_movies(data: Dict) -> Dict:
+    """Copy the lists, movies and preferences so they can be changed without touching the original."""
+    copied = {}
+    for key, value in data.items():
+        if isinstance(value, list):
+            copied[key] = [dict(m) if isinstance(m, dict) else m for m in value]
+        elif isinstance(value, dict):
+            copied[key] = dict(value)
+        else:
+            copied[key] = value
+    return copied
+
+class MovieTransaction:
+    """Row-level operations on a working copy of the movie data.
+
+    Yielded by MovieStore.transaction(). The SQLite engine provides the same
+    methods on top of its tables.
+    """
+
+    def __init__(self, data: Dict):
+        self.data = data
+        # (title, old_list, new_list) for the title index, applied on commit
+        self.changes: List[Tuple[str, Optional[str], Optional[str]]] = []
+        # (old, new) (list_name, movie) snapshots for the keyword stats, applied on commit
+        self.movie_changes: List[Tuple[Optional[Tuple[str, Dict]], Optional[Tuple[str, Dict]]]] = []
+
+    def find_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Return (list_name, movie) for the movie with this exact title."""
+        return _find_movie(self.data, title)
+
+    def add_movie(self, list_name: str, movie: Dict) -> None:
+        """Append a movie to a list."""
+        self.data[list_name].append(movie)
+        self.changes.append((movie["title"], None, list_name))
+        self.movie_changes.append((None, (list_name, dict(movie))))
+
+    def remove_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Remove a movie from whichever list holds it and return (list_name, movie)."""
+        for list_name in MOVIE_LISTS:
+            for i, movie in enumerate(self.data[list_name]):
+                if movie["title"] == title:
+                    self.changes.append((title, list_name, None))
+                    self.movie_changes.append(((list_name, dict(movie)), None))
+                    return list_name, self.data[list_name].pop(i)
+        return None
+
+    def update_movie(self, title: str, changes: Dict) -> None:
+        """Update fields of a movie in place."""
+        found = self.find_movie(title)
+        if found:
+            list_name, movie = found
+            if changes.get("title", title) != title:
+                self.changes.append((title, list_name, None))
+                self.changes.append((changes["title"], None, list_name))
+            old_movie = dict(movie)
+            movie.update(changes)
+            self.movie_changes.append(((list_name, old_movie), (list_name, dict(movie))))
+
+    def set_preferences(self, preferences: Dict) -> None:
+        """Replace the user's preferences."""
+        self.data["preferences"] = dict(preferences)
+
+def _find_movie(data: Dict, title: str) -> Optional[Tuple[str, Dict]]:
+    for list_name in MOVIE_LISTS:
+        for movie in data[list_name]:
+            if movie["title"] == title:
+                return list_name, movie
+    return None
+
+class FileLock:
+    """Re-entrant, cross-process advisory lock on a lock file next to the data file.
+
+    The lock file also holds a short token that changes on every commit, so a
+    process holding the lock can tell whether its copy of the data is current.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+    def read_token(self) -> str:
+        """Return the commit token stored in the lock file."""
+        try:
+            with open(self.path, "r") as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def write_token(self, token: str) -> None:
+        """Store a new commit token; the lock must be held."""
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(token)
+        self._file.flush()
+
+class MovieStore:
+    """Resident copy of movies.yaml with debounced write-behind persistence.
+
+    The file is parsed once and served from memory afterwards. It is only
+    parsed again when its mtime or size changes behind our back. Changes are
+    written out atomically, through a temporary file and os.replace(), while
+    holding an advisory lock on ``<file>.lock``.
+
+    Every committed change increments the ``version`` stored in the file.
+    Callers may pass the version they based a change on to transaction() and
+    get a VersionConflictError instead of silently overwriting someone else's
+    change.
+    """
+
+    def __init__(self, path: Path, flush_delay: float = FLUSH_DELAY):
+        self.path = Path(path)
+        self.flush_delay = flush_delay
+        self.file_lock = FileLock(self.path.with_name(self.path.name + ".lock"))
+        self._lock = threading.RLock()
+        self._data: Optional[Dict] = None
+        self._title_index: Optional[TitleIndex] = None
+        self._keyword_stats: Optional[KeywordStats] = None
+        self._file_state: Optional[Tuple[int, int]] = None
+        self._token: Optional[str] = None
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def write_through(self) -> bool:
+        """Whether changes are written immediately instead of batched."""
+        return self.flush_delay <= 0
+
+    @property
+    def version(self) -> int:
+        """Version of the data currently held in memory."""
+        return self.load_movies().get("version", 0)
+
+    @property
+    def title_index(self) -> TitleIndex:
+        """Normalized-title index over the current data, kept up to date on every change."""
+        with self._lock:
+            self.load_movies()
+            return self._title_index
+
+    @property
+    def keyword_stats(self) -> KeywordStats:
+        """Liked/disliked keyword counts over the current data, kept up to date on every change."""
+        with self._lock:
+            self.load_movies()
+            return self._keyword_stats
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of the YAML file, or None if it doesn't exist."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Dict:
+        """Parse the YAML file from disk."""
+        try:
+            with timed("yaml_load"), open(self.path, "r") as file:
+                data = yaml.load(file, Loader=_YamlLoader) or _empty_movies()
+        except FileNotFoundError:
+            return _empty_movies()
+        except Exception as e:
+            logger.error(f"Error loading movies: {e}", exc_info=True)
+            return _empty_movies()
+        # Ensure preferences and every list exist in older files
+        if "preferences" not in data:
+            data["preferences"] = _empty_movies()["preferences"]
+        for list_name in MOVIE_LISTS:
+            if data.get(list_name) is None:
+                data[list_name] = []
+        return data
+
+    def load_movies(self) -> Dict:
+        """Return the current movie data.
+
+        The returned dict is shared with other readers and must not be
+        modified; use transaction() or save_movies() to make changes.
+        """
+        with self._lock:
+            if self._data is None or (not self._dirty and self._stat() != self._file_state):
+                if self._data is not None:
+                    logger.info(f"{self.path} changed on disk, reloading")
+                self._reload()
+            return self._data
+
+    def _reload(self) -> None:
+        # Read the token first: if a commit lands in between, we merely reload again later
+        self._token = self.file_lock.read_token()
+        self._file_state = self._stat()
+        self._set_data(self._read())
+
+    def _set_data(self, data: Dict) -> None:
+        """Replace the resident data wholesale and rebuild the title index and keyword stats."""
+        self._data = data
+        self._title_index = TitleIndex.from_data(data)
+        self._keyword_stats = KeywordStats.from_data(data)
+
+    def find_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Return (list_name, movie) for the movie with this exact title."""
+        return _find_movie(self.load_movies(), title)
+
+    def save_movies(self, data: Dict) -> None:
+        """Replace the movie data and schedule a flush.
+
+        Like transaction(), this holds the file lock in write-through mode,
+        so the new version follows the latest one written by any process.
+        """
+        with self._committing():
+            data["version"] = self.load_movies().get("version", 0) + 1
+            self._set_data(data)
+            self._mark_dirty()
+
+    @contextmanager
+    def _committing(self) -> Iterator[None]:
+        """Hold the locks a change needs; in write-through mode also catch up with other processes' commits."""
+        with self._lock, (self.file_lock if self.write_through else nullcontext()):
+            if self.write_through and self.file_lock.read_token() != self._token:
+                self._reload()
+            yield
+
+    @contextmanager
+    def transaction(self, expected_version: Optional[int] = None) -> Iterator[MovieTransaction]:
+        """Yield a MovieTransaction over a private copy of the movie data.
+
+        The copy replaces the resident data when the block exits normally.
+        If the block raises, the copy is discarded and nothing changes. In
+        write-through mode the file lock is held for the whole block, so the
+        copy always starts from the latest data written by any process.
+        """
+        with self._committing():
+            current = self.load_movies()
+            version = current.get("version", 0)
+            if expected_version is not None and expected_version != version:
+                raise VersionConflictError(expected_version, version)
+            tx = MovieTransaction(_copy_movies(current))
+            yield tx
+            tx.data["version"] = version + 1
+            self._data = tx.data
+            self._title_index.apply(tx.changes)
+            self._keyword_stats.apply(tx.movie_changes)
+            self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if self.write_through:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes to disk.
+
+        In write-through mode a failed write is raised, so the change that
+        triggered it fails instead of being reported as saved.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            try:
+                with self.file_lock:
+                    if self.file_lock.read_token() != self._token or self._stat() != self._file_state:
+                        self._resolve_conflict()
+                    else:
+                        _write_yaml_atomic(self.path, self._data)
+                        self._token = uuid.uuid4().hex
+                        self.file_lock.write_token(self._token)
+                        logger.info("Movies saved successfully")
+                    self._dirty = False
+                    self._file_state = self._stat()
+            except Exception as e:
+                logger.error(f"Error saving movies: {e}", exc_info=True)
+                if self.write_through:
+                    # Nothing was committed: go back to what is on disk and fail the change
+                    self._dirty = False
+                    self._reload()
+                    raise
+
+    def _resolve_conflict(self) -> None:
+        """Handle another process having written the file while we held unsaved changes.
+
+        Only possible in write-behind mode. The other process's data is kept
+        and ours is saved next to it for manual recovery instead of being lost.
+        """
+        ours = self._data
+        theirs = self._read()
+        conflict_path = self.path.with_name(f"{self.path.name}.conflict-{ours.get('version', 0)}")
+        _write_yaml_atomic(conflict_path, ours)
+        logger.error(
+            f"{self.path} was changed by another process (version {theirs.get('version', 0)}); "
+            f"unsaved changes were written to {conflict_path}. "
+            "Set MOVIE_STORE_FLUSH_DELAY=0 when running several workers."
+        )
+        self._set_data(theirs)
+        self._token = self.file_lock.read_token()
+
+def _write_yaml_atomic(path: Path, data: Dict) -> None:
+    """Write data to path via a temporary file so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
     try:
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                return False
-            
-            ext = mimetypes.guess_extension(content_type)
-            if not ext:
-                ext = '.jpg'  # Default to jpg if can't determine type
-            
-            file_path = file_path.with_suffix(ext)
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            return True
-    except Exception as e:
-        logger.error(f"Error downloading image: {e}")
-    return False
+        with timed("yaml_save"), os.fdopen(fd, "w") as file:
+            yaml.dump(data, file, Dumper=_YamlDumper, default_flow_style=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def create_store(backend: str = STORAGE_BACKEND):
+    """Create the storage engine selected by MOVIE_STORAGE_BACKEND."""
+    if backend == "sqlite":
+        from movie_storage_sqlite import MOVIES_DB, SqliteMovieStore
+        return SqliteMovieStore(MOVIES_DB, migrate_from=MOVIES_FILE)
+    if backend != "yaml":
+        raise ValueError("MOVIE_STORAGE_BACKEND must be either 'yaml' or 'sqlite'")
+    return MovieStore(MOVIES_FILE)
+
+movie_store = create_store()
+atexit.register(movie_store.flush)
 
 def load_movies() -> Dict:
-    """Load movies data from YAML file."""
-    try:
-        with open("movies.yaml", "r") as file:
-            data = yaml.safe_load(file) or {
-                "watched": [], 
-                "want_to_watch": [], 
-                "not_interested": [],
-                "undecided": [],
-                "preferences": {
-                    "genres": [],
-                    "keywords": [],
-                    "comments": None
-                }
-            }
-            # Ensure preferences exist in older files
-            if "preferences" not in data:
-                data["preferences"] = {
-                    "genres": [],
-                    "keywords": [],
-                    "comments": None
-                }
-            return data
-    except Exception as e:
-        logger.error(f"Error loading movies: {e}", exc_info=True)
-        return {
-            "watched": [], 
-            "want_to_watch": [], 
-            "not_interested": [],
-            "undecided": [],
-            "preferences": {
-                "genres": [],
-                "keywords": []
-            }
-        }
+    """Load movies data from the resident store."""
+    return movie_store.load_movies()
 
 def save_movies(data: Dict) -> None:
-    """Save movies data to YAML file."""
-    try:
-        with open("movies.yaml", "w") as file:
-            yaml.dump(data, file, default_flow_style=False)
-        logger.info("Movies saved successfully")
-    except Exception as e:
-        logger.error(f"Error saving movies: {e}", exc_info=True)
-
-def get_movie_poster(title: str) -> Optional[FileResponse]:
-    """Get movie poster image with caching."""
-    # Parse title and year
-    match = title.strip().split('(')
-    movie_title = match[0].strip()
-    year = match[1][:-1] if len(match) > 1 else None
-    
-    # Create safe filename
-    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    safe_title = safe_title.replace("/","_")
-    
-    # Check cache
-    existing_files = list(CACHE_DIR.glob(f"{safe_title}.*"))
-    if existing_files:
-        logger.info(f"Poster found in cache for: {title}")
-        return FileResponse(existing_files[0])
-    
-    # If not in cache, fetch from OMDB
-    try:
-        # Make request with title and year
-        params = {
-            'apikey': OMDB_API_KEY,
-            't': movie_title
-        }
-        if year:
-            params['y'] = year
-            
-        logger.info(f"Requesting OMDB for title='{movie_title}' year='{year}'")
-        response = requests.get(OMDB_BASE_URL, params=params)
-        data = response.json()
-        logger.info(f"OMDB response: {data}")
-        
-        if data.get('Response') == 'True' and data.get('Poster') and data['Poster'] != 'N/A':
-            logger.info(f"Found poster URL: {data['Poster']}")
-            if _download_image(data['Poster'], CACHE_DIR / safe_title):
-                cached_file = next(CACHE_DIR.glob(f"{safe_title}.*"))
-                logger.info(f"Poster downloaded and cached for: {title}")
-                return FileResponse(cached_file)
-            
-    except Exception as e:
-        logger.error(f"Error fetching poster for {title}: {e}")
-        
-    return None
+    """Save movies data; with the YAML engine it is written to movies.yaml shortly after."""
+    movie_store.save_movies(data)
@@ -0,0 +1,289 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import logger
+from movie_metrics import timed
+from movie_analysis import MOVIE_LISTS, KeywordStats, TitleIndex, normalize_title
+from movie_storage import VersionConflictError, _empty_movies
+
+MOVIES_DB = Path(os.getenv('MOVIES_DB', 'movies.db'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    normalized_title TEXT NOT NULL,
+    list_name TEXT NOT NULL,
+    score INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_movies_title ON movies (title);
+CREATE INDEX IF NOT EXISTS idx_movies_normalized_title ON movies (normalized_title);
+CREATE INDEX IF NOT EXISTS idx_movies_list ON movies (list_name, id);
+CREATE INDEX IF NOT EXISTS idx_movies_score ON movies (score);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def _movie_row(list_name: str, movie: Dict) -> Tuple:
+    """Return the column values for a movie dict."""
+    return (
+        movie["title"],
+        normalize_title(movie["title"]),
+        list_name,
+        movie.get("score"),
+        json.dumps(movie),
+    )
+
+class SqliteTransaction:
+    """Row-level operations inside an open SQLite write transaction.
+
+    Provides the same methods as movie_storage.MovieTransaction.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        # (title, old_list, new_list) for the title index, applied on commit
+        self.changes: List[Tuple[str, Optional[str], Optional[str]]] = []
+        # (old, new) (list_name, movie) pairs for the keyword stats, applied on commit
+        self.movie_changes: List[Tuple[Optional[Tuple[str, Dict]], Optional[Tuple[str, Dict]]]] = []
+
+    def find_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Return (list_name, movie) for the movie with this exact title."""
+        return _find_movie(self.conn, title)
+
+    def add_movie(self, list_name: str, movie: Dict) -> None:
+        """Append a movie to a list."""
+        if list_name not in MOVIE_LISTS:
+            raise KeyError(list_name)
+        self.conn.execute(
+            "INSERT INTO movies (title, normalized_title, list_name, score, data) VALUES (?, ?, ?, ?, ?)",
+            _movie_row(list_name, movie)
+        )
+        self.changes.append((movie["title"], None, list_name))
+        self.movie_changes.append((None, (list_name, dict(movie))))
+
+    def remove_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Remove a movie from whichever list holds it and return (list_name, movie)."""
+        row = self.conn.execute(
+            "SELECT id, list_name, data FROM movies WHERE title = ? ORDER BY id LIMIT 1", (title,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("DELETE FROM movies WHERE id = ?", (row[0],))
+        movie = json.loads(row[2])
+        self.changes.append((title, row[1], None))
+        self.movie_changes.append(((row[1], movie), None))
+        return row[1], movie
+
+    def update_movie(self, title: str, changes: Dict) -> None:
+        """Update fields of a movie in place."""
+        row = self.conn.execute(
+            "SELECT id, list_name, data FROM movies WHERE title = ? ORDER BY id LIMIT 1", (title,)
+        ).fetchone()
+        if row is None:
+            return
+        old_movie = json.loads(row[2])
+        movie = {**old_movie, **changes}
+        if movie["title"] != title:
+            self.changes.append((title, row[1], None))
+            self.changes.append((movie["title"], None, row[1]))
+        self.movie_changes.append(((row[1], old_movie), (row[1], movie)))
+        self.conn.execute(
+            "UPDATE movies SET title = ?, normalized_title = ?, list_name = ?, score = ?, data = ? WHERE id = ?",
+            (*_movie_row(row[1], movie), row[0])
+        )
+
+    def set_preferences(self, preferences: Dict) -> None:
+        """Replace the user's preferences."""
+        _set_meta(self.conn, "preferences", json.dumps(preferences))
+
+def _find_movie(conn: sqlite3.Connection, title: str) -> Optional[Tuple[str, Dict]]:
+    row = conn.execute(
+        "SELECT list_name, data FROM movies WHERE title = ? ORDER BY id LIMIT 1", (title,)
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+def _get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        (key, value)
+    )
+
+class SqliteMovieStore:
+    """Movie storage engine backed by an SQLite database.
+
+    Movies are rows indexed by title, normalized title, list and score, so
+    lookups and single-movie changes don't touch the rest of the library.
+    The database runs in WAL mode: readers in any worker are never blocked
+    by a writer, and writers serialize on SQLite's own lock.
+
+    Offers the same interface as movie_storage.MovieStore.
+    """
+
+    def __init__(self, path: Path, migrate_from: Optional[Path] = None):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._data: Optional[Dict] = None
+        self._data_version: Optional[int] = None
+        self._title_index: Optional[TitleIndex] = None
+        self._keyword_stats: Optional[KeywordStats] = None
+        self._index_version: Optional[int] = None
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        if migrate_from is not None and _get_meta(conn, "version") is None and Path(migrate_from).exists():
+            migrate_yaml(Path(migrate_from), self)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def version(self) -> int:
+        """Version of the data in the database."""
+        return int(_get_meta(self._connect(), "version") or 0)
+
+    def _indexes(self) -> Tuple[TitleIndex, KeywordStats]:
+        """Return the title index and keyword stats over the current data.
+
+        Updated in place by this process's transactions and rebuilt when
+        another process has changed the database.
+        """
+        version = self.version
+        with self._lock:
+            if self._title_index is not None and self._index_version == version:
+                return self._title_index, self._keyword_stats
+        data = self.load_movies()
+        index, stats = TitleIndex.from_data(data), KeywordStats.from_data(data)
+        with self._lock:
+            self._title_index, self._keyword_stats = index, stats
+            self._index_version = data["version"]
+        return index, stats
+
+    @property
+    def title_index(self) -> TitleIndex:
+        """Normalized-title index over the current data."""
+        return self._indexes()[0]
+
+    @property
+    def keyword_stats(self) -> KeywordStats:
+        """Liked/disliked keyword counts over the current data."""
+        return self._indexes()[1]
+
+    def load_movies(self) -> Dict:
+        """Return the current movie data as the movies.yaml-shaped dict.
+
+        The dict is rebuilt only when the version changes and is shared with
+        other readers, so it must not be modified.
+        """
+        conn = self._connect()
+        version = self.version
+        with self._lock:
+            if self._data is not None and self._data_version == version:
+                return self._data
+        with timed("sqlite_load"):
+            conn.execute("BEGIN")
+            try:
+                version = int(_get_meta(conn, "version") or 0)
+                data = {list_name: [] for list_name in MOVIE_LISTS}
+                for list_name, movie_json in conn.execute("SELECT list_name, data FROM movies ORDER BY id"):
+                    data.setdefault(list_name, []).append(json.loads(movie_json))
+                preferences = _get_meta(conn, "preferences")
+                data["preferences"] = json.loads(preferences) if preferences else _empty_movies()["preferences"]
+                data["version"] = version
+            finally:
+                conn.execute("COMMIT")
+        with self._lock:
+            self._data = data
+            self._data_version = version
+        return data
+
+    def find_movie(self, title: str) -> Optional[Tuple[str, Dict]]:
+        """Return (list_name, movie) for the movie with this exact title."""
+        return _find_movie(self._connect(), title)
+
+    def save_movies(self, data: Dict) -> None:
+        """Replace all movies and preferences with the contents of data."""
+        with self.transaction() as tx:
+            tx.conn.execute("DELETE FROM movies")
+            tx.conn.executemany(
+                "INSERT INTO movies (title, normalized_title, list_name, score, data) VALUES (?, ?, ?, ?, ?)",
+                [_movie_row(list_name, movie) for list_name in MOVIE_LISTS for movie in data.get(list_name) or []]
+            )
+            tx.set_preferences(data.get("preferences") or _empty_movies()["preferences"])
+        with self._lock:
+            self._title_index = None  # Rebuilt on next use
+        logger.info("Movies saved successfully")
+
+    @contextmanager
+    def transaction(self, expected_version: Optional[int] = None) -> Iterator[SqliteTransaction]:
+        """Yield a SqliteTransaction inside an immediate write transaction.
+
+        Changes are committed when the block exits normally and rolled back
+        if it raises.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = int(_get_meta(conn, "version") or 0)
+            if expected_version is not None and expected_version != version:
+                raise VersionConflictError(expected_version, version)
+            tx = SqliteTransaction(conn)
+            yield tx
+            _set_meta(conn, "version", str(version + 1))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        with self._lock:
+            if self._title_index is not None and self._index_version == version:
+                self._title_index.apply(tx.changes)
+                self._keyword_stats.apply(tx.movie_changes)
+                self._index_version = version + 1
+
+    def flush(self) -> None:
+        """Nothing to do: every transaction is committed immediately."""
+
+def migrate_yaml(yaml_path: Path, store: SqliteMovieStore) -> int:
+    """Copy the lists and preferences from a movies.yaml file into store.
+
+    Returns the number of movies imported.
+    """
+    from movie_storage import MovieStore
+
+    data = MovieStore(yaml_path).load_movies()
+    store.save_movies(data)
+    count = sum(len(data.get(list_name) or []) for list_name in MOVIE_LISTS)
+    logger.info(f"Migrated {count} movies from {yaml_path} to {store.path}")
+    return count
+
+def main(argv: List[str]) -> None:
+    yaml_path = Path(argv[1]) if len(argv) > 1 else Path('movies.yaml')
+    db_path = Path(argv[2]) if len(argv) > 2 else MOVIES_DB
+    count = migrate_yaml(yaml_path, SqliteMovieStore(db_path))
+    print(f"Imported {count} movies from {yaml_path} into {db_path}")
+    print("Set MOVIE_STORAGE_BACKEND=sqlite to use the database")
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,161 @@
+import json
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from config import logger
+
+# Length of a complete answer, in tokens, assumed until one has been streamed
+ANSWER_TOKENS_ESTIMATE = 150
+
+# Cost of the candidates abandoned mid-stream because their title was a
+# duplicate, estimated from the complete answers streamed so far
+stream_stats = {
+    "completed": 0,
+    "completed_tokens": 0,
+    "completed_ms": 0.0,  # Generation time after the first chunk
+    "requests": 0,
+    "aborted": 0,
+    "tokens_saved": 0,
+    "ms_saved": 0.0,
+}
+stream_stats_lock = Lock()
+
+def record_complete(tokens: int, ms: float) -> None:
+    """Record a streamed answer that was received in full."""
+    with stream_stats_lock:
+        stream_stats["completed"] += 1
+        stream_stats["completed_tokens"] += tokens
+        stream_stats["completed_ms"] += ms
+
+def estimate_savings(tokens: int, ms: float) -> Tuple[int, float]:
+    """Return the (output tokens, milliseconds) an answer abandoned after tokens and ms would still have taken."""
+    with stream_stats_lock:
+        completed, completed_tokens, completed_ms = (
+            stream_stats["completed"], stream_stats["completed_tokens"], stream_stats["completed_ms"])
+    if completed and completed_tokens:
+        expected, ms_per_token = completed_tokens / completed, completed_ms / completed_tokens
+    else:
+        expected, ms_per_token = ANSWER_TOKENS_ESTIMATE, ms / max(tokens, 1)
+    remaining = max(0, round(expected - tokens))
+    return remaining, remaining * ms_per_token
+
+def record_request(aborted: int, tokens: int, ms: float) -> None:
+    """Record what one suggestion request saved by abandoning aborted candidates."""
+    with stream_stats_lock:
+        stream_stats["requests"] += 1
+    record_savings(aborted, tokens, ms)
+
+def record_savings(aborted: int, tokens: int, ms: float) -> None:
+    """Record abandoned candidates, also those of a request already recorded (e.g. fan-out requests still running)."""
+    if not aborted:
+        return
+    with stream_stats_lock:
+        stream_stats["aborted"] += aborted
+        stream_stats["tokens_saved"] += tokens
+        stream_stats["ms_saved"] += ms
+    logger.info(f"Abandoned {aborted} duplicate candidates mid-stream, saving ~{tokens} output tokens and ~{ms:.0f} ms")
+
+def get_stream_stats() -> Dict:
+    """Return the early-abort counters, with the savings per request."""
+    with stream_stats_lock:
+        stats = dict(stream_stats)
+    requests = stats["requests"]
+    stats["tokens_saved_per_request"] = stats["tokens_saved"] / requests if requests else None
+    stats["ms_saved_per_request"] = stats["ms_saved"] / requests if requests else None
+    return stats
+
+class JSONFieldParser:
+    """Incremental parser reporting the fields of a streamed JSON answer as they complete.
+
+    Text is fed in chunks as the AI provider generates it. The answer is
+    either one object or an array of objects, possibly wrapped in a markdown
+    code block or other text, which is skipped. feed() returns the
+    (object index, key, value) of each top-level field completed by the new
+    text, so a title can be checked while the rest of the object is still
+    being generated; value() parses the whole answer once it is complete.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0  # Next character to scan
+        self._start: Optional[int] = None  # Where the answer's outermost { or [ is
+        self._end: Optional[int] = None  # Just past its closing } or ]
+        self._fields_depth = 1  # Nesting depth of the objects whose fields are reported
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._index = 0
+
+    @property
+    def done(self) -> bool:
+        """Whether the outermost object or array has been closed."""
+        return self._end is not None
+
+    def feed(self, chunk: str) -> List[Tuple[int, str, Any]]:
+        """Add streamed text and return the fields it completed."""
+        self._text += chunk
+        fields = []
+        text = self._text
+        while self._pos < len(text) and self._end is None:
+            i = self._pos
+            char = text[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == self._fields_depth:
+                        if self._value_start is None:
+                            self._key = json.loads(text[self._string_start:i + 1])
+                        else:
+                            self._complete(i + 1, fields)
+                continue
+            if self._start is None:
+                if char in "{[":
+                    self._start = i
+                    self._fields_depth = 1 if char == "{" else 2
+                    self._depth = 1
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ":" and self._depth == self._fields_depth and self._key is not None:
+                self._value_start = i + 1
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == self._fields_depth and self._value_start is not None:
+                    self._complete(i, fields)  # Number, true, false or null ended by the brace
+                self._depth -= 1
+                if self._depth == self._fields_depth and self._value_start is not None:
+                    self._complete(i + 1, fields)  # Nested object or array closed
+                elif self._depth == self._fields_depth - 1 and self._fields_depth == 2:
+                    self._index += 1  # Next object of an array
+                if self._depth == 0:
+                    self._end = i + 1
+            elif char == "," and self._depth == self._fields_depth and self._value_start is not None:
+                self._complete(i, fields)
+        return fields
+
+    def _complete(self, end: int, fields: List[Tuple[int, str, Any]]) -> None:
+        """Parse the current field's value, ending just before end."""
+        raw = self._text[self._value_start:end].strip()
+        self._value_start = None
+        key, self._key = self._key, None
+        if not raw:
+            return
+        try:
+            fields.append((self._index, key, json.loads(raw)))
+        except json.JSONDecodeError:
+            pass  # value() reports the malformed answer
+
+    def value(self) -> Any:
+        """Parse the complete answer; raises json.JSONDecodeError if it is incomplete or malformed."""
+        if self._start is None:
+            return json.loads(self._text)
+        return json.loads(self._text[self._start:self._end])
@@ -1,10 +1,14 @@
+import os
 import uvicorn
 
 if __name__ == "__main__":
+    # Several workers share movies.yaml, so every change must be written
+    # under the file lock right away instead of being batched in memory
+    os.environ.setdefault("MOVIE_STORE_FLUSH_DELAY", "0")
     uvicorn.run(
         "api:app",
         host="0.0.0.0",
         port=8000,
         workers=32,
         reload=False
-    )
\ No newline at end of file
+    )
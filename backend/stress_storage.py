@@ -0,0 +1,188 @@
+"""Stress test for the movie storage layer under several uvicorn workers.
+
+Starts the API with several workers in a scratch directory, hammers it from
+many client processes with adds, score updates and moves, and then checks
+that every single write made it into storage.
+
+Alongside them, versioned clients increment a shared counter (a movie's
+score, which cycles through 1-10) by reading it and writing it back with
+If-Match set to the version they read, retrying on 409. Each also resends
+a write with the version from before its last increment, which must be
+rejected with 409. Ordered by the version they read, the accepted
+increments must each start from the score the previous one wrote, and the
+counter must end at the last one: a lost update breaks that chain.
+
+Usage:
+    python stress_storage.py [--workers 8] [--clients 16] [--movies 25] [--versioned-clients 8] [--increments 20] [--backend yaml]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+def wait_for_server(base_url: str, timeout: float = 30) -> None:
+    """Wait until the API answers or raise after timeout seconds."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+def run_client(args) -> dict:
+    """Add, re-score and move a batch of movies; return request counts."""
+    base_url, client_id, movie_count = args
+    session = requests.Session()
+    stats = {"requests": 0, "errors": 0, "conflicts": 0}
+
+    def call(method, url, **kwargs):
+        for _ in range(5):  # Retry on optimistic-lock conflicts
+            response = session.request(method, url, **kwargs)
+            stats["requests"] += 1
+            if response.status_code != 409:
+                break
+            stats["conflicts"] += 1
+        if not response.ok:
+            stats["errors"] += 1
+
+    for i in range(movie_count):
+        title = f"Stress Movie {client_id}-{i} (2000)"
+        call("POST", f"{base_url}/movies/watched", json={"title": title, "score": 1})
+        call("PUT", f"{base_url}/movies", json={"title": title, "new_score": 7})
+        if i % 2:
+            call("PUT", f"{base_url}/movies", json={"title": title, "new_list": "want_to_watch"})
+    return stats
+
+COUNTER_TITLE = "Stress Counter (2000)"
+
+def run_versioned_client(args) -> dict:
+    """Increment the shared counter with If-Match, checking stale versions are rejected; return counts."""
+    base_url, increments = args
+    session = requests.Session()
+    stats = {"requests": 0, "errors": 0, "conflicts": 0, "increments": 0, "stale_rejected": 0, "stale_accepted": 0,
+             "writes": []}  # (version read, score read, score written) of each accepted increment
+
+    def read_counter() -> tuple:
+        response = session.get(f"{base_url}/movies", params={"list": "watched", "q": COUNTER_TITLE, "fields": "score"})
+        stats["requests"] += 1
+        response.raise_for_status()
+        return response.headers["ETag"], response.json()["watched"][0]["score"]
+
+    def write_counter(etag: str, score: int) -> int:
+        response = session.put(f"{base_url}/movies", json={"title": COUNTER_TITLE, "new_score": score},
+                               headers={"If-Match": etag})
+        stats["requests"] += 1
+        return response.status_code
+
+    for _ in range(increments):
+        for _ in range(100):
+            etag, score = read_counter()
+            status = write_counter(etag, score % 10 + 1)
+            if status != 409:
+                break
+            stats["conflicts"] += 1
+        if status == 200:
+            stats["increments"] += 1
+            stats["writes"].append((int(etag.strip('"')), score, score % 10 + 1))
+        else:
+            stats["errors"] += 1
+            continue
+        # The version read before this increment is now stale: writing it back must fail
+        status = write_counter(etag, score)
+        stats["stale_rejected" if status == 409 else "stale_accepted"] += 1
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="uvicorn worker processes")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client processes")
+    parser.add_argument("--movies", type=int, default=25, help="movies added per client")
+    parser.add_argument("--versioned-clients", type=int, default=8, help="client processes incrementing a counter with If-Match")
+    parser.add_argument("--increments", type=int, default=20, help="counter increments per versioned client")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--backend", choices=["yaml", "sqlite"], default="yaml", help="storage engine")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    work_dir = Path(tempfile.mkdtemp(prefix="movie_stress_"))
+    env = {
+        **os.environ,
+        "MOVIE_STORE_FLUSH_DELAY": "0",
+        "MOVIE_STORAGE_BACKEND": args.backend,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stress-test"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--app-dir", str(BACKEND_DIR),
+         "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=work_dir, env=env,
+    )
+    try:
+        wait_for_server(base_url)
+        requests.post(f"{base_url}/movies/watched", json={"title": COUNTER_TITLE, "score": 1}).raise_for_status()
+        start = time.perf_counter()
+        with Pool(args.clients + args.versioned_clients) as pool:
+            versioned = pool.map_async(run_versioned_client, [(base_url, args.increments)] * args.versioned_clients)
+            results = pool.map(run_client, [(base_url, c, args.movies) for c in range(args.clients)])
+            versioned_results = versioned.get()
+        elapsed = time.perf_counter() - start
+        data = requests.get(f"{base_url}/movies").json()
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    lost = []
+    for client_id in range(args.clients):
+        for i in range(args.movies):
+            title = f"Stress Movie {client_id}-{i} (2000)"
+            expected_list = "want_to_watch" if i % 2 else "watched"
+            movie = next((m for m in data[expected_list] if m["title"] == title), None)
+            if movie is None or movie.get("score") != 7:
+                lost.append(title)
+
+    counter = next((m.get("score") for m in data["watched"] if m["title"] == COUNTER_TITLE), None)
+    increments = sum(r["increments"] for r in versioned_results)
+    writes = sorted(write for r in versioned_results for write in r["writes"])
+    broken = [(prev, write) for prev, write in zip([(None, None, 1)] + writes, writes)
+              if write[1] != prev[2] or write[0] == prev[0]]
+    expected_counter = writes[-1][2] if writes else 1
+    stale_accepted = sum(r["stale_accepted"] for r in versioned_results)
+
+    total_requests = sum(r["requests"] for r in results + versioned_results)
+    print(f"Backend: {args.backend}, workers: {args.workers}, clients: {args.clients}, movies per client: {args.movies}")
+    print(f"Requests: {total_requests} in {elapsed:.2f}s ({total_requests / elapsed:.0f} req/s)")
+    print(f"Errors: {sum(r['errors'] for r in results)}, conflicts retried: {sum(r['conflicts'] for r in results)}")
+    print(f"Versioned clients: {args.versioned_clients}, increments: {increments}/{args.versioned_clients * args.increments}, "
+          f"If-Match conflicts retried: {sum(r['conflicts'] for r in versioned_results)}, "
+          f"stale writes rejected: {sum(r['stale_rejected'] for r in versioned_results)}, accepted: {stale_accepted}")
+    print(f"Counter: {counter} (expected {expected_counter})")
+    print(f"Final version: {data.get('version', 0)}")
+    failed = False
+    if lost:
+        print(f"LOST WRITES: {len(lost)} (e.g. {lost[:5]})")
+        failed = True
+    if broken or counter != expected_counter:
+        print(f"LOST COUNTER UPDATES: counter is {counter}, {len(broken)} increments not based on the previous one "
+              f"(e.g. {broken[:3]})")
+        failed = True
+    if stale_accepted:
+        print(f"STALE WRITES ACCEPTED: {stale_accepted} writes with an outdated If-Match did not get 409")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("No lost writes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Local stand-in for the OpenAI and Anthropic APIs, for benchmarks.
+
+Answers chat completion (``/v1/chat/completions``) and messages
+(``/v1/messages``) requests with a unique movie suggestion after a fixed
+delay. When the prompt asks for a JSON array of N movies, N suggestions are
+returned, and prompts asking for only a description get plain text. A
+share of the suggestions can be a fixed duplicate title (DUPLICATE_TITLE)
+to exercise the retry path. Streaming requests (``"stream": true``) get
+the answer as server-sent events in chunks of about one token, each after
+TOKEN_DELAY, as the real APIs stream them. Message batches (``/v1/messages/batches``)
+are accepted too and end after the same delay. No real model is called.
+
+Usage:
+    python stub_llm_server.py [--port 8900] [--latency 0.5] [--token-delay 0] [--duplicate-rate 0]
+
+Then point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(os.getenv("STUB_LLM_LATENCY", "0.5"))
+DUPLICATE_RATE = float(os.getenv("STUB_LLM_DUPLICATE_RATE", "0"))
+# Seconds per generated token (about 4 characters); complete responses wait for all of them
+TOKEN_DELAY = float(os.getenv("STUB_LLM_TOKEN_DELAY", "0"))
+DUPLICATE_TITLE = "Stub Duplicate (1999)"
+
+app = FastAPI()
+_counter = itertools.count(1)
+_batches: dict = {}  # id -> (submitted at, requests)
+
+def stub_movie() -> dict:
+    """Return a new suggestion, unique unless it is picked as a duplicate."""
+    n = next(_counter)
+    return {
+        "title": DUPLICATE_TITLE if random.random() < DUPLICATE_RATE else f"Stub Movie {n} ({1950 + n % 70})",
+        "description": "A placeholder movie produced by the stub LLM server.",
+        "keywords": ["stub", "benchmark"],
+        "credits": {"directors": ["Jane Doe"], "cast": ["John Roe"], "writers": ["Jane Doe"]}
+    }
+
+def stub_suggestion(body: dict) -> str:
+    """Return the JSON text answering the request body's prompt."""
+    prompt = str(body.get("messages", [{}])[-1].get("content", ""))
+    if "Return ONLY the description text" in prompt:
+        return "A placeholder description produced by the stub LLM server."
+    batch = re.search(r"JSON array of (\d+)", prompt)
+    if batch:
+        return json.dumps([stub_movie() for _ in range(int(batch.group(1)))])
+    return json.dumps(stub_movie())
+
+def token_chunks(text: str) -> list:
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+def prompt_tokens(body: dict) -> int:
+    return sum(len(token_chunks(str(message.get("content", "")))) for message in body.get("messages", []))
+
+async def stream_events(events):
+    """Send server-sent events, the first after LATENCY and each further one after TOKEN_DELAY."""
+    await asyncio.sleep(LATENCY)
+    for event in events:
+        yield event
+        await asyncio.sleep(TOKEN_DELAY)
+
+def chat_chunk(body: dict, delta: dict, finish_reason=None) -> str:
+    return "data: " + json.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }) + "\n\n"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    text = stub_suggestion(body)
+    if body.get("stream"):
+        events = [chat_chunk(body, {"role": "assistant", "content": ""})]
+        events += [chat_chunk(body, {"content": piece}) for piece in token_chunks(text)]
+        events += [chat_chunk(body, {}, "stop")]
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": prompt_tokens(body), "completion_tokens": len(token_chunks(text))}
+            events.append("data: " + json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "stub"), "choices": [],
+                "usage": {**usage, "total_tokens": sum(usage.values())}
+            }) + "\n\n")
+        events.append("data: [DONE]\n\n")
+        return StreamingResponse(stream_events(events), media_type="text/event-stream")
+    await asyncio.sleep(LATENCY + TOKEN_DELAY * len(token_chunks(text)))
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": prompt_tokens(body), "completion_tokens": len(token_chunks(text)),
+                  "total_tokens": prompt_tokens(body) + len(token_chunks(text))}
+    }
+
+def stub_message(body: dict, text: str = None) -> dict:
+    text = stub_suggestion(body) if text is None else text
+    return {
+        "id": f"msg_stub_{time.time_ns()}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "stub"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": prompt_tokens(body), "output_tokens": len(token_chunks(text))}
+    }
+
+def message_event(event_type: str, **data) -> str:
+    return f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n"
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    text = stub_suggestion(body)
+    if body.get("stream"):
+        chunks = token_chunks(text)
+        start = {**stub_message(body, ""), "content": [], "stop_reason": None}
+        events = [message_event("message_start", message=start),
+                  message_event("content_block_start", index=0, content_block={"type": "text", "text": ""})]
+        events += [message_event("content_block_delta", index=0, delta={"type": "text_delta", "text": piece}) for piece in chunks]
+        events += [message_event("content_block_stop", index=0),
+                   message_event("message_delta", delta={"stop_reason": "end_turn", "stop_sequence": None},
+                                 usage={"output_tokens": len(chunks)}),
+                   message_event("message_stop")]
+        return StreamingResponse(stream_events(events), media_type="text/event-stream")
+    await asyncio.sleep(LATENCY + TOKEN_DELAY * len(token_chunks(text)))
+    return stub_message(body, text)
+
+def batch_status(request: Request, batch_id: str) -> dict:
+    if batch_id not in _batches:
+        raise HTTPException(status_code=404, detail="batch not found")
+    submitted, requests = _batches[batch_id]
+    ended = time.time() - submitted >= LATENCY
+    return {
+        "id": batch_id,
+        "type": "message_batch",
+        "processing_status": "ended" if ended else "in_progress",
+        "request_counts": {"processing": 0 if ended else len(requests), "succeeded": len(requests) if ended else 0,
+                           "errored": 0, "canceled": 0, "expired": 0},
+        "results_url": f"{request.base_url}v1/messages/batches/{batch_id}/results" if ended else None,
+    }
+
+@app.post("/v1/messages/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    batch_id = f"msgbatch_stub_{time.time_ns()}"
+    _batches[batch_id] = (time.time(), body["requests"])
+    return batch_status(request, batch_id)
+
+@app.get("/v1/messages/batches/{batch_id}")
+async def get_batch(request: Request, batch_id: str):
+    return batch_status(request, batch_id)
+
+@app.get("/v1/messages/batches/{batch_id}/results")
+async def get_batch_results(request: Request, batch_id: str):
+    if batch_status(request, batch_id)["processing_status"] != "ended":
+        raise HTTPException(status_code=400, detail="batch is still in progress")
+    lines = [
+        json.dumps({"custom_id": r["custom_id"], "result": {"type": "succeeded", "message": stub_message(r["params"])}})
+        for r in _batches[batch_id][1]
+    ]
+    return Response("\n".join(lines) + "\n", media_type="application/binary")
+
+def main():
+    global LATENCY, TOKEN_DELAY, DUPLICATE_RATE
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds before each response")
+    parser.add_argument("--token-delay", type=float, default=TOKEN_DELAY, help="seconds per generated token")
+    parser.add_argument("--duplicate-rate", type=float, default=DUPLICATE_RATE, help=f"share of suggestions titled {DUPLICATE_TITLE!r}")
+    args = parser.parse_args()
+    LATENCY = args.latency
+    TOKEN_DELAY = args.token_delay
+    DUPLICATE_RATE = args.duplicate_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Fetch the posters of every movie in the library into the poster cache.
+
+Walks all lists, skips posters that are already cached (or that OMDB was
+recently found not to have), and fetches the rest concurrently with at
+most --concurrency requests in flight and --rate OMDB lookups per second.
+Every poster is saved as soon as it is downloaded, so an interrupted run
+picks up where it stopped when started again. With --thumbnails, resized
+variants are created too (needs Pillow).
+
+Usage:
+    python warm_posters.py [--concurrency 8] [--rate 5] [--lists watched,want_to_watch] [--thumbnails 160,320]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("POSTER_CONCURRENCY", "8")),
+                        help="OMDB lookups and downloads in flight")
+    parser.add_argument("--rate", type=float, default=5.0, help="OMDB lookups per second, 0 for no limit")
+    parser.add_argument("--lists", help="comma-separated lists to warm (default: all)")
+    parser.add_argument("--thumbnails", default="", help="comma-separated thumbnail widths to create, e.g. 160,320")
+    args = parser.parse_args()
+
+    # Read by movie_posters on import
+    os.environ["POSTER_CONCURRENCY"] = str(args.concurrency)
+    os.environ["POSTER_RATE_LIMIT"] = str(args.rate)
+    from config import logger
+    from movie_storage import load_movies, MOVIE_LISTS
+    from movie_posters import find_movie_poster, get_poster_cache, make_thumbnail, safe_filename, Image
+
+    poster_cache = get_poster_cache()
+    widths = [int(w) for w in args.thumbnails.split(",") if w.strip()]
+    if widths and Image is None:
+        sys.exit("Creating thumbnails needs Pillow: pip install Pillow")
+    list_names = args.lists.split(",") if args.lists else MOVIE_LISTS
+    data = load_movies()
+    titles = list(dict.fromkeys(movie["title"] for list_name in list_names for movie in data.get(list_name) or []))
+    stats = Counter()
+    done = 0
+    start = time.perf_counter()
+
+    def report(final: bool = False) -> None:
+        elapsed = time.perf_counter() - start
+        fetched = stats["fetched"]
+        print(f"{'Done' if final else 'Progress'}: {done}/{len(titles)} titles in {elapsed:.1f}s | "
+              f"cached {stats['cached']}, fetched {fetched} ({fetched / elapsed if elapsed else 0:.1f}/s), "
+              f"missing {stats['missing']}, failed {stats['failed']}, thumbnails {stats['thumbnails']}", flush=True)
+
+    async def warm(title: str) -> None:
+        nonlocal done
+        names = (safe_filename(title), safe_filename(title.split('(')[0].strip()))
+        was_cached = any(poster_cache.get(name) for name in names)
+        was_missing = not was_cached and all(poster_cache.is_missing(name) for name in names)
+        path = None if was_missing else await find_movie_poster(title)
+        if path:
+            stats["cached" if was_cached else "fetched"] += 1
+            for width in widths:
+                if await asyncio.to_thread(make_thumbnail, path, width):
+                    stats["thumbnails"] += 1
+        elif was_missing or all(poster_cache.is_missing(name) for name in names):
+            stats["missing"] += 1
+        else:
+            stats["failed"] += 1
+            logger.warning(f"Could not fetch poster for {title}, run again to retry")
+        done += 1
+        if done % 25 == 0:
+            report()
+
+    async def run():
+        # Lookups are bounded in movie_posters; this only bounds pending tasks
+        pending = asyncio.Semaphore(args.concurrency * 4)
+
+        async def bounded(title):
+            async with pending:
+                await warm(title)
+
+        await asyncio.gather(*(bounded(title) for title in titles))
+
+    print(f"Warming posters for {len(titles)} titles ({len(poster_cache)} posters cached)")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Interrupted; posters fetched so far are kept")
+    report(final=True)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ import { Movie, Suggestion } from './types'
 function App() {
   const {
     movies,
+    version,
     preferences,
     setPreferences,
     keywordAnalysis,
@@ -125,7 +126,7 @@ function App() {
             <TabPanel>
               <MovieList
                 listName="watched"
-                movies={movies.watched.movies}
+                version={version}
                 searchQuery={searchQuery}
                 selectedGenre={selectedGenre}
                 sortOrder={sortOrder}
@@ -140,7 +141,7 @@ function App() {
             <TabPanel>
               <MovieList
                 listName="want_to_watch"
-                movies={movies.want_to_watch.movies}
+                version={version}
                 searchQuery={searchQuery}
                 selectedGenre={selectedGenre}
                 sortOrder={sortOrder}
@@ -155,7 +156,7 @@ function App() {
             <TabPanel>
               <MovieList
                 listName="undecided"
-                movies={movies.undecided.movies}
+                version={version}
                 searchQuery={searchQuery}
                 selectedGenre={selectedGenre}
                 sortOrder={sortOrder}
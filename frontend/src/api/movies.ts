@@ -1,9 +1,15 @@
 import axios from 'axios'
 import { API_URL } from '../utils/urls'
-import type { AddMovieParams, ApiMovieResponse, Preferences, KeywordAnalysis, Suggestion } from '../types'
+import type { AddMovieParams, ApiMovieResponse, Movie, MovieQuery, Preferences, KeywordAnalysis, Suggestion, SuggestionStreamHandlers } from '../types'
 
-export const fetchMovies = async (): Promise<ApiMovieResponse> => {
-  const response = await axios.get(`${API_URL}/movies`)
+// Without a query the whole library is returned; see MovieQuery for paging, search and fields
+export const fetchMovies = async (query: MovieQuery = {}, signal?: AbortSignal): Promise<ApiMovieResponse> => {
+  const response = await axios.get(`${API_URL}/movies`, { params: query, signal })
+  return response.data
+}
+
+export const fetchMovie = async (title: string): Promise<Movie & { list_name: string }> => {
+  const response = await axios.get(`${API_URL}/movies/lookup`, { params: { title } })
   return response.data
 }
 
@@ -57,6 +63,32 @@ export const getMovieDetails = async (title: string): Promise<Suggestion> => {
   return response.data
 }
 
+// Opens a suggestion stream: each field arrives as soon as the AI has generated it,
+// and a retry means the fields so far belonged to a candidate that was dropped.
+// Returns a function that closes the stream.
+const openSuggestionStream = (path: string, handlers: SuggestionStreamHandlers): (() => void) => {
+  const source = new EventSource(`${API_URL}${path}?stream=true`)
+  source.addEventListener('field', (event) => handlers.onField(JSON.parse((event as MessageEvent).data)))
+  source.addEventListener('retry', () => handlers.onRetry?.())
+  source.addEventListener('done', (event) => {
+    source.close()
+    handlers.onDone(JSON.parse((event as MessageEvent).data))
+  })
+  source.addEventListener('error', (event) => {
+    // Sent by the server with a detail, or raised by the browser when the connection fails
+    source.close()
+    const data = (event as MessageEvent).data
+    handlers.onError(data ? JSON.parse(data).detail : 'Connection to the server was lost')
+  })
+  return () => source.close()
+}
+
+export const streamSuggestion = (handlers: SuggestionStreamHandlers): (() => void) =>
+  openSuggestionStream('/movies/suggest', handlers)
+
+export const streamMovieDetails = (title: string, handlers: SuggestionStreamHandlers): (() => void) =>
+  openSuggestionStream(`/movies/details/${encodeURIComponent(title)}`, handlers)
+
 export const getRelatedMovie = async (title: string, previousSuggestions: string[] = []): Promise<Suggestion> => {
   const response = await axios.post(
     `${API_URL}/movies/related/${encodeURIComponent(title)}`,
@@ -64,3 +96,44 @@ export const getRelatedMovie = async (title: string, previousSuggestions: string
   )
   return response.data
 }
+
+// Streams up to count related movies (newline-delimited JSON), calling onMovie for each as it arrives
+export const streamRelatedMovies = async (
+  title: string,
+  previousSuggestions: string[],
+  count: number,
+  onMovie: (movie: Suggestion) => void,
+  signal?: AbortSignal
+): Promise<void> => {
+  const response = await fetch(
+    `${API_URL}/movies/related/${encodeURIComponent(title)}?count=${count}`,
+    {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ previous_suggestions: previousSuggestions }),
+      signal,
+    }
+  )
+  if (!response.ok || !response.body) {
+    throw new Error(`Related movies request failed: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  const handleLine = (line: string) => {
+    if (!line.trim()) return
+    const item = JSON.parse(line)
+    if (item.error) throw new Error(item.error)
+    onMovie(item)
+  }
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop() ?? ''
+    lines.forEach(handleLine)
+  }
+  handleLine(buffer + decoder.decode())
+}
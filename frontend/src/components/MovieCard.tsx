@@ -16,7 +16,7 @@ import {
   Image,
 } from '@chakra-ui/react'
 import type { Movie } from '../types'
-import { getPosterUrl, getIMDBUrl, getRTUrl } from '../utils/urls'
+import { getPosterUrl, getIMDBUrl, getRTUrl, THUMBNAIL_SIZE } from '../utils/urls'
 
 interface MovieCardProps {
   movie: Movie
@@ -56,7 +56,7 @@ export const MovieCard: React.FC<MovieCardProps> = ({
       <CardBody>
         <Box position="relative" pb="150%">
           <Image
-            src={getPosterUrl(movie.title)}
+            src={getPosterUrl(movie.title, THUMBNAIL_SIZE)}
             alt={movie.title}
             position="absolute"
             top="0"
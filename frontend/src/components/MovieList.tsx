@@ -1,11 +1,16 @@
-import React, { useState, useEffect, useMemo, useRef } from 'react'
+import React, { useState, useEffect, useRef, useCallback } from 'react'
 import { SimpleGrid, Box } from '@chakra-ui/react'
-import type { Movie, MovieData } from '../types'
+import type { ListName, Movie } from '../types'
+import * as api from '../api/movies'
 import { MovieCard } from './MovieCard'
 
+const PAGE_SIZE = 20
+// What the cards show; credits are fetched per movie when its details open
+const CARD_FIELDS = 'title,score,added_date,keywords,description'
+
 interface MovieListProps {
-  listName: keyof MovieData
-  movies: Movie[]
+  listName: ListName
+  version: number
   searchQuery: string
   selectedGenre: string
   sortOrder: 'title' | 'date' | 'score'
@@ -19,7 +24,7 @@ interface MovieListProps {
 
 export const MovieList: React.FC<MovieListProps> = ({
   listName,
-  movies,
+  version,
   searchQuery,
   selectedGenre,
   sortOrder,
@@ -30,69 +35,85 @@ export const MovieList: React.FC<MovieListProps> = ({
   onGenreSelect,
   onMovieClick,
 }) => {
-  const [displayCount, setDisplayCount] = useState(20)
+  const [movies, setMovies] = useState<Movie[]>([])
+  const [total, setTotal] = useState(0)
+  const [loading, setLoading] = useState(false)
   const loadMoreRef = useRef<HTMLDivElement>(null)
+  const controllerRef = useRef<AbortController | null>(null)
+  const loadedRef = useRef(0)
 
-  // Filter and sort movies
-  const filteredAndSortedMovies = useMemo(() => {
-    // Filter
-    const filtered = movies.filter((movie: Movie) => {
-      const matchesSearch = movie.title.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        movie.description?.toLowerCase().includes(searchQuery.toLowerCase()) ||
-        movie.keywords?.some(k => k.toLowerCase().includes(searchQuery.toLowerCase()))
-      
-      const matchesGenre = !selectedGenre || movie.keywords?.includes(selectedGenre)
-      
-      return matchesSearch && matchesGenre
-    })
-
-    // Sort
-    return filtered.sort((a: Movie, b: Movie) => {
-      if (sortOrder === 'title') {
-        return sortDirection === 'asc' 
-          ? a.title.localeCompare(b.title)
-          : b.title.localeCompare(a.title)
-      } else if (sortOrder === 'date') {
-        return sortDirection === 'asc'
-          ? new Date(a.added_date).getTime() - new Date(b.added_date).getTime()
-          : new Date(b.added_date).getTime() - new Date(a.added_date).getTime()
-      } else { // score
-        const scoreA = a.score || 0
-        const scoreB = b.score || 0
-        return sortDirection === 'asc' ? scoreA - scoreB : scoreB - scoreA
+  // Search, filter and sort run on the server, one page at a time
+  const fetchPage = useCallback(async (offset: number, limit: number) => {
+    controllerRef.current?.abort()
+    const controller = new AbortController()
+    controllerRef.current = controller
+    setLoading(true)
+    try {
+      const response = await api.fetchMovies({
+        list: listName,
+        offset,
+        limit,
+        q: searchQuery || undefined,
+        genre: selectedGenre || undefined,
+        sort: sortOrder,
+        order: sortDirection,
+        fields: CARD_FIELDS,
+      }, controller.signal)
+      const page = response[listName]
+      setMovies(prev => {
+        const next = offset === 0 ? page : [...prev, ...page]
+        loadedRef.current = next.length
+        return next
+      })
+      setTotal(response.counts?.[listName] ?? page.length)
+    } catch (error: any) {
+      if (error?.name !== 'CanceledError') {
+        console.error(`Error fetching ${listName}:`, error)
+      }
+    } finally {
+      if (controllerRef.current === controller) {
+        setLoading(false)
       }
-    })
-  }, [movies, searchQuery, selectedGenre, sortOrder, sortDirection])
+    }
+  }, [listName, searchQuery, selectedGenre, sortOrder, sortDirection])
 
-  // Reset display count when filters change
+  // Start over when the filters change
   useEffect(() => {
-    setDisplayCount(20)
+    fetchPage(0, PAGE_SIZE)
     window.scrollTo(0, 0)
-  }, [searchQuery, selectedGenre, sortOrder, sortDirection])
+  }, [fetchPage])
+
+  // Reload what is shown when the data changes, keeping the scroll position
+  useEffect(() => {
+    if (version > 0) {
+      fetchPage(0, Math.max(PAGE_SIZE, loadedRef.current))
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [version])
+
+  useEffect(() => () => controllerRef.current?.abort(), [])
 
   // Handle scroll
   useEffect(() => {
     const handleScroll = () => {
-      if (loadMoreRef.current) {
+      if (loadMoreRef.current && !loading) {
         const rect = loadMoreRef.current.getBoundingClientRect()
         const isVisible = rect.top <= window.innerHeight + 100
 
-        if (isVisible && displayCount < filteredAndSortedMovies.length) {
-          setDisplayCount(prev => Math.min(prev + 20, filteredAndSortedMovies.length))
+        if (isVisible && movies.length < total) {
+          fetchPage(movies.length, PAGE_SIZE)
         }
       }
     }
 
     window.addEventListener('scroll', handleScroll)
     return () => window.removeEventListener('scroll', handleScroll)
-  }, [displayCount, filteredAndSortedMovies.length])
-
-  const visibleMovies = filteredAndSortedMovies.slice(0, displayCount)
+  }, [loading, movies.length, total, fetchPage])
 
   return (
     <Box>
       <SimpleGrid columns={{ base: 1, md: 2, lg: 3, xl: 4 }} spacing={6}>
-        {visibleMovies.map((movie: Movie) => (
+        {movies.map((movie: Movie) => (
           <MovieCard
             key={movie.title}
             movie={movie}
@@ -105,8 +126,8 @@ export const MovieList: React.FC<MovieListProps> = ({
           />
         ))}
       </SimpleGrid>
-      
-      {displayCount < filteredAndSortedMovies.length && (
+
+      {movies.length < total && (
         <Box ref={loadMoreRef} h="20px" mt={6} />
       )}
     </Box>
@@ -13,11 +13,13 @@ import {
 } from '@chakra-ui/react'
 import { motion } from 'framer-motion'
 import { Suggestion } from '../types'
-import { getPosterUrl } from '../utils/urls'
-import { getRelatedMovie } from '../api/movies'
+import { getPosterUrl, THUMBNAIL_SIZE } from '../utils/urls'
+import { streamRelatedMovies } from '../api/movies'
 
 const ChakraBox = chakra(motion.div)
 
+const RELATED_COUNT = 10
+
 interface RelatedMoviesProps {
   movieTitle: string
   onMovieClick: (movie: Suggestion) => void
@@ -33,7 +35,7 @@ export const RelatedMovies: React.FC<RelatedMoviesProps> = ({
   const [isLoadingRelated, setIsLoadingRelated] = useState(true)
 
   useEffect(() => {
-    let isMounted = true;
+    const controller = new AbortController();
 
     const fetchRelated = async () => {
       try {
@@ -42,32 +44,23 @@ export const RelatedMovies: React.FC<RelatedMoviesProps> = ({
         
         const suggestions: Suggestion[] = [];
         
-        // Get 10 suggestions sequentially
-        while (suggestions.length < 10) {
-          if (!isMounted) break;
-
-          try {
-            // Get next suggestion, passing all previous titles
-            const nextSuggestion = await getRelatedMovie(
-              movieTitle,
-              [movieTitle, ...suggestions.map(s => s.title)]
-            );
-            
-            if (!isMounted) break;
-
+        // Get all suggestions in one streamed request, showing each as it arrives
+        await streamRelatedMovies(
+          movieTitle,
+          [movieTitle],
+          RELATED_COUNT,
+          (nextSuggestion) => {
             suggestions.push(nextSuggestion);
-            // Update state as each suggestion comes in
             setRelatedMovies([...suggestions]);
-          } catch (error) {
-            console.error('Error fetching related movie:', error);
-            // Break if we can't get more suggestions
-            break;
-          }
-        }
+          },
+          controller.signal
+        );
       } catch (error) {
-        console.error('Error fetching related movies:', error);
+        if (!controller.signal.aborted) {
+          console.error('Error fetching related movies:', error);
+        }
       } finally {
-        if (isMounted) {
+        if (!controller.signal.aborted) {
           setIsLoadingRelated(false);
         }
       }
@@ -76,7 +69,7 @@ export const RelatedMovies: React.FC<RelatedMoviesProps> = ({
     fetchRelated();
 
     return () => {
-      isMounted = false;
+      controller.abort();
     };
   }, [movieTitle])
 
@@ -113,7 +106,7 @@ export const RelatedMovies: React.FC<RelatedMoviesProps> = ({
               >
                 <VStack spacing={2}>
                   <Image
-                    src={getPosterUrl(movie.title)}
+                    src={getPosterUrl(movie.title, THUMBNAIL_SIZE)}
                     alt={movie.title}
                     fallbackSrc="https://via.placeholder.com/150x225"
                     maxH="225px"
@@ -133,7 +126,7 @@ export const RelatedMovies: React.FC<RelatedMoviesProps> = ({
             </Tooltip>
           ))}
           {/* Add placeholder boxes while loading */}
-          {isLoadingRelated && Array(10 - relatedMovies.length).fill(null).map((_, i) => (
+          {isLoadingRelated && Array(Math.max(RELATED_COUNT - relatedMovies.length, 0)).fill(null).map((_, i) => (
             <Box
               key={`placeholder-${i}`}
               borderRadius="lg"
@@ -1,6 +1,7 @@
 import { useState, useCallback } from 'react'
 import { useDisclosure } from '@chakra-ui/hooks'
 import { Movie } from '../types'
+import * as api from '../api/movies'
 
 export const useMovieUI = () => {
   // Search, filter, and sort state
@@ -79,6 +80,12 @@ export const useMovieUI = () => {
     setSelectedMovie(movie)
     setSelectedListName(listName)
     movieDetailsModal.onOpen()
+    // Lists only carry what the cards show; fetch the rest (credits etc.) now
+    api.fetchMovie(movie.title)
+      .then(details => {
+        setSelectedMovie(prev => prev?.title === movie.title ? { ...prev, ...details } : prev)
+      })
+      .catch(error => console.error('Error fetching movie details:', error))
   }, [movieDetailsModal])
   
 
@@ -3,6 +3,9 @@ import { useToast } from '@chakra-ui/react'
 import type { MovieData, Preferences, KeywordAnalysis, AddMovieParams, Movie } from '../types'
 import * as api from '../api/movies'
 
+// The lists only back membership checks and tab counts; MovieList pages through the full entries
+const LIST_FIELDS = 'title'
+
 // Initialize empty movie lists
 const emptyMovieList = () => ({
   movies: [] as Movie[],
@@ -20,6 +23,7 @@ export const useMovies = () => {
   const [preferences, setPreferences] = useState<Preferences>({ genres: [], keywords: [], comments: '' })
   const [keywordAnalysis, setKeywordAnalysis] = useState<KeywordAnalysis>({ liked: {}, disliked: {} })
   const [availableGenres, setAvailableGenres] = useState<string[]>([])
+  const [version, setVersion] = useState(0)
   const toast = useToast()
 
   // Sort keywords by frequency
@@ -32,7 +36,7 @@ export const useMovies = () => {
 
   const fetchMovies = useCallback(async () => {
     try {
-      const response = await api.fetchMovies()
+      const response = await api.fetchMovies({ fields: LIST_FIELDS })
       const newMovies: MovieData = {
         watched: { movies: response.watched || [], newTitle: '', newScore: 5 },
         want_to_watch: { movies: response.want_to_watch || [], newTitle: '', newScore: 5 },
@@ -40,6 +44,7 @@ export const useMovies = () => {
         undecided: { movies: response.undecided || [], newTitle: '', newScore: 5 }
       }
       setMovies(newMovies)
+      setVersion(response.version ?? 0)
       if (response.preferences) {
         setPreferences(response.preferences)
       }
@@ -171,6 +176,7 @@ export const useMovies = () => {
 
   return {
     movies,
+    version,
     preferences,
     setPreferences,
     keywordAnalysis,
@@ -1,51 +1,77 @@
-import { useState, useCallback } from 'react'
+import { useState, useCallback, useEffect, useRef } from 'react'
 import { useToast } from '@chakra-ui/react'
-import type { Suggestion } from '../types'
+import type { Suggestion, SuggestionStreamHandlers } from '../types'
 import * as api from '../api/movies'
 
 export const useSuggestions = () => {
   const [suggestion, setSuggestion] = useState<Suggestion | null>(null)
   const [suggestionScore, setSuggestionScore] = useState(5)
+  const closeStreamRef = useRef<(() => void) | null>(null)
   const toast = useToast()
 
-  const handleGetSuggestion = useCallback(async () => {
-    try {
-      const response = await api.getSuggestion()
-      setSuggestion(response)
-    } catch (error: any) {
-      toast({
-        title: 'Error getting suggestion',
-        description: error.response?.data?.detail || 'Unknown error',
-        status: 'error',
-        duration: 3000,
-        isClosable: true,
-      })
-    }
-  }, [toast])
-
-  const handleGetMovieDetails = useCallback(async (title: string) => {
-    try {
-      const response = await api.getMovieDetails(title)
-      setSuggestion(response)
-    } catch (error: any) {
-      toast({
-        title: 'Error getting movie details',
-        description: error.response?.data?.detail || 'Unknown error',
-        status: 'error',
-        duration: 3000,
-        isClosable: true,
-      })
-    }
-  }, [toast])
+  const closeStream = useCallback(() => {
+    closeStreamRef.current?.()
+    closeStreamRef.current = null
+  }, [])
+
+  // Show the suggestion field by field as the server streams it
+  const streamInto = useCallback((
+    open: (handlers: SuggestionStreamHandlers) => () => void,
+    errorTitle: string
+  ) => {
+    closeStream()
+    let partial: Partial<Suggestion> = {}
+    closeStreamRef.current = open({
+      onField: (fields) => {
+        partial = { ...partial, ...fields }
+        setSuggestion(partial as Suggestion)
+      },
+      onRetry: () => {
+        partial = {}
+        setSuggestion(null)
+      },
+      onDone: (response) => {
+        closeStreamRef.current = null
+        setSuggestion(response)
+      },
+      onError: (detail) => {
+        closeStreamRef.current = null
+        toast({
+          title: errorTitle,
+          description: detail || 'Unknown error',
+          status: 'error',
+          duration: 3000,
+          isClosable: true,
+        })
+      },
+    })
+  }, [closeStream, toast])
+
+  const handleGetSuggestion = useCallback(() => {
+    streamInto(api.streamSuggestion, 'Error getting suggestion')
+  }, [streamInto])
+
+  const handleGetMovieDetails = useCallback((title: string) => {
+    streamInto(handlers => api.streamMovieDetails(title, handlers), 'Error getting movie details')
+  }, [streamInto])
 
   const clearSuggestion = useCallback(() => {
+    closeStream()
     setSuggestion(null)
     setSuggestionScore(5)
-  }, [])
+  }, [closeStream])
+
+  // A suggestion picked elsewhere replaces the one being streamed
+  const selectSuggestion = useCallback((selected: Suggestion | null) => {
+    closeStream()
+    setSuggestion(selected)
+  }, [closeStream])
+
+  useEffect(() => closeStream, [closeStream])
 
   return {
     suggestion,
-    setSuggestion,
+    setSuggestion: selectSuggestion,
     suggestionScore,
     setSuggestionScore,
     handleGetSuggestion,
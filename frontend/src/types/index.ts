@@ -61,10 +61,33 @@ export interface Suggestion {
   from_recommendation?: boolean
 }
 
+export type ListName = 'watched' | 'want_to_watch' | 'not_interested' | 'undecided'
+
+export interface MovieQuery {
+  list?: ListName
+  offset?: number
+  limit?: number
+  q?: string
+  genre?: string
+  sort?: 'title' | 'date' | 'score'
+  order?: 'asc' | 'desc'
+  fields?: string
+}
+
 export interface ApiMovieResponse {
   watched: Movie[]
   want_to_watch: Movie[]
   not_interested: Movie[]
   undecided: Movie[]
   preferences?: Preferences
+  version?: number
+  counts?: Partial<Record<ListName, number>>
+}
+
+// Callbacks for a suggestion streamed over Server-Sent Events
+export interface SuggestionStreamHandlers {
+  onField: (fields: Partial<Suggestion>) => void
+  onRetry?: () => void
+  onDone: (suggestion: Suggestion) => void
+  onError: (detail: string) => void
 }
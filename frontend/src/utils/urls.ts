@@ -1,7 +1,11 @@
 export const API_URL = `http://${window.location.hostname}:8000`
 
-export const getPosterUrl = (title: string): string => {
-  return `${API_URL}/movies/poster/${encodeURIComponent(title.replace("/","_"))}`
+// Width requested for poster thumbnails in grids (2x their displayed size)
+export const THUMBNAIL_SIZE = 320
+
+export const getPosterUrl = (title: string, size?: number): string => {
+  const url = `${API_URL}/movies/poster/${encodeURIComponent(title.replace("/","_"))}`
+  return size ? `${url}?size=${size}` : url
 }
 
 export const getIMDBUrl = (title: string) => {